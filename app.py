@@ -2,8 +2,6 @@ import os
 import json
 from flask import Flask, request, jsonify, render_template
 from dotenv import load_dotenv
-from bot import bot, get_gemini_response
-from telebot import types as telebot_types
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +18,71 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # In production, use a database like Redis or PostgreSQL
 web_sessions = {}
 
+# bot.py (and with it telebot, the genai SDK and the service modules) is only
+# imported by the routes that need it, so /health answers right after a cold
+# start. Set GUNICORN_PRELOAD / WARM_UP to pay that cost before traffic instead
+# (see gunicorn.conf.py).
+
+def warm_up():
+    """Loads the bot, the Gemini client and all agent tools ahead of the first request."""
+    import bot
+    bot.warm_up()
+
+# Price alerts, video rendering and autonomous monitoring must run in exactly one process, not
+# once per gunicorn worker: the first process to lock BACKGROUND_LOCK_PATH runs
+# them and holds the lock until it exits, so a replacement worker takes over.
+BACKGROUND_LOCK_PATH = os.getenv("BACKGROUND_LOCK_PATH", "/home/ubuntu/my-ai-bot/background.lock")
+_background_lock = None
+
+def start_background_services():
+    """Starts the bot's background services if no other process runs them; returns whether this one does."""
+    global _background_lock
+    import fcntl
+
+    if _background_lock is not None:
+        return True
+    os.makedirs(os.path.dirname(BACKGROUND_LOCK_PATH) or ".", exist_ok=True)
+    lock_file = open(BACKGROUND_LOCK_PATH, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _background_lock = lock_file
+    import bot
+    bot.start_background_services()
+    print(f"Background services running in process {os.getpid()}")
+    return True
+
+# Static agent description served by /api/info (shared with asgi.py)
+AGENT_INFO = {
+    "name": "Super-Agent",
+    "version": "1.0.0",
+    "description": "دستیار هوشمند محمد - معلم، نویسنده، تریدر و محافظ شخصی",
+    "features": [
+        "آموزش تخصصی (ریاضی، فیزیک، برنامه‌نویسی)",
+        "نویسندگی حرفه‌ای",
+        "مشاوره حقوقی",
+        "تحلیل ترید",
+        "تولید رسانه",
+        "تحلیل شخصیت",
+        "مانیتورینگ سخت‌افزار",
+        "شکارچی سود"
+    ],
+    "contact": "https://t.me/my_ai_bot"
+}
+
+def health_payload():
+    """Body of the health check (shared with asgi.py)."""
+    return {
+        "status": "ok",
+        "message": "🤖 Super-Agent is running!",
+        "services": {
+            "telegram": "connected" if TELEGRAM_TOKEN else "not configured",
+            "gemini": "connected" if GEMINI_API_KEY else "not configured"
+        }
+    }
+
 # -----------------------------------------------------------------------
 # 1. Web Routes (Serve HTML and Static Files)
 # -----------------------------------------------------------------------
@@ -32,14 +95,7 @@ def index():
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint."""
-    return jsonify({
-        "status": "ok",
-        "message": "🤖 Super-Agent is running!",
-        "services": {
-            "telegram": "connected" if TELEGRAM_TOKEN else "not configured",
-            "gemini": "connected" if GEMINI_API_KEY else "not configured"
-        }
-    }), 200
+    return jsonify(health_payload()), 200
 
 # -----------------------------------------------------------------------
 # 2. API Endpoints for Web Chat
@@ -51,6 +107,8 @@ def api_chat():
     API endpoint for web chat interface.
     Accepts a message and returns a response from the Super-Agent.
     """
+    from bot import answer_message
+
     try:
         data = request.get_json()
         user_message = data.get('message', '').strip()
@@ -61,11 +119,11 @@ def api_chat():
                 "error": "پیام خالی است."
             }), 400
 
-        # Create a mock Telegram message object for compatibility with get_gemini_response
+        # Create a mock Telegram message object for compatibility with answer_message
         mock_message = MockMessage(user_message)
 
         # Get response from the Super-Agent (Gemini with Tools)
-        response_text = get_gemini_response(mock_message)
+        response_text = answer_message(mock_message)
 
         return jsonify({
             "success": True,
@@ -82,22 +140,7 @@ def api_chat():
 @app.route('/api/info', methods=['GET'])
 def api_info():
     """Get information about the Super-Agent."""
-    return jsonify({
-        "name": "Super-Agent",
-        "version": "1.0.0",
-        "description": "دستیار هوشمند محمد - معلم، نویسنده، تریدر و محافظ شخصی",
-        "features": [
-            "آموزش تخصصی (ریاضی، فیزیک، برنامه‌نویسی)",
-            "نویسندگی حرفه‌ای",
-            "مشاوره حقوقی",
-            "تحلیل ترید",
-            "تولید رسانه",
-            "تحلیل شخصیت",
-            "مانیتورینگ سخت‌افزار",
-            "شکارچی سود"
-        ],
-        "contact": "https://t.me/my_ai_bot"
-    }), 200
+    return jsonify(AGENT_INFO), 200
 
 # -----------------------------------------------------------------------
 # 3. Telegram Webhook Routes (for Telegram integration)
@@ -106,6 +149,9 @@ def api_info():
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Handles incoming Telegram updates via POST request."""
+    from bot import bot
+    from telebot import types as telebot_types
+
     if request.headers.get('content-type') == 'application/json':
         json_string = request.get_data().decode('utf-8')
         update = telebot_types.Update.de_json(json.loads(json_string))
@@ -116,6 +162,8 @@ def webhook():
 @app.route('/setwebhook', methods=['GET'])
 def set_webhook_route():
     """Sets the Telegram webhook URL."""
+    from bot import bot
+
     if WEBHOOK_URL:
         try:
             bot.set_webhook(url=WEBHOOK_URL + "/webhook")
@@ -140,7 +188,7 @@ def set_webhook_route():
 
 class MockMessage:
     """
-    Mock Telegram message object for compatibility with get_gemini_response.
+    Mock Telegram message object for compatibility with answer_message.
     This allows the web interface to use the same response logic as Telegram.
     """
     def __init__(self, text):
@@ -185,6 +233,8 @@ def internal_error(error):
 # -----------------------------------------------------------------------
 
 if __name__ == '__main__':
+    start_background_services()
+
     # Get port from environment or use default
     port = int(os.environ.get("PORT", 8000))
     
@@ -0,0 +1,152 @@
+import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, FileResponse
+from starlette.routing import Route
+from app import AGENT_INFO, WEBHOOK_URL, MockMessage, health_payload, start_background_services
+
+# -----------------------------------------------------------------------
+# Async serving mode (ASGI)
+#
+# Same routes as app.py, served by an asyncio event loop instead of sync
+# gunicorn workers. A chat waiting on Gemini no longer pins a process:
+#
+#   gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+#   (or: uvicorn asgi:app --host 0.0.0.0 --port $PORT)
+# -----------------------------------------------------------------------
+
+# Telegram handlers in bot.py are synchronous, so webhook updates are handed
+# to a bounded thread pool and acknowledged immediately.
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 64))
+update_executor = ThreadPoolExecutor(max_workers=WEBHOOK_WORKERS, thread_name_prefix="tg-update")
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+# -----------------------------------------------------------------------
+# 1. Web Routes
+# -----------------------------------------------------------------------
+
+async def index(request):
+    """Serve the main web chat interface."""
+    return FileResponse(TEMPLATE_PATH, media_type="text/html")
+
+async def health(request):
+    """Health check endpoint."""
+    return JSONResponse(health_payload(), status_code=200)
+
+# -----------------------------------------------------------------------
+# 2. API Endpoints for Web Chat
+# -----------------------------------------------------------------------
+
+async def api_chat(request):
+    """Async web chat endpoint; awaits the agent without blocking other chats."""
+    from bot import answer_message_async
+
+    try:
+        data = await request.json()
+        user_message = data.get('message', '').strip()
+
+        if not user_message:
+            return JSONResponse({
+                "success": False,
+                "error": "پیام خالی است."
+            }, status_code=400)
+
+        response_text = await answer_message_async(MockMessage(user_message))
+
+        return JSONResponse({
+            "success": True,
+            "reply": response_text if response_text else "متأسفانه نتوانستم پاسخی تولید کنم."
+        }, status_code=200)
+
+    except Exception as e:
+        print(f"Error in /api/chat: {e}")
+        return JSONResponse({
+            "success": False,
+            "error": f"خطای سرور: {str(e)}"
+        }, status_code=500)
+
+async def api_info(request):
+    """Get information about the Super-Agent."""
+    return JSONResponse(AGENT_INFO, status_code=200)
+
+# -----------------------------------------------------------------------
+# 3. Telegram Webhook Routes
+# -----------------------------------------------------------------------
+
+async def webhook(request):
+    """Queues incoming Telegram updates and acknowledges them right away."""
+    from bot import bot
+    from telebot import types as telebot_types
+
+    if request.headers.get('content-type') == 'application/json':
+        body = await request.body()
+        update = telebot_types.Update.de_json(json.loads(body.decode('utf-8')))
+        asyncio.get_running_loop().run_in_executor(update_executor, bot.process_new_updates, [update])
+        return PlainTextResponse('OK', status_code=200)
+    return PlainTextResponse('Invalid Content Type', status_code=400)
+
+async def set_webhook_route(request):
+    """Sets the Telegram webhook URL."""
+    from bot import bot
+
+    if WEBHOOK_URL:
+        try:
+            await asyncio.to_thread(bot.set_webhook, url=WEBHOOK_URL + "/webhook")
+            return JSONResponse({
+                "status": "success",
+                "message": "Webhook set successfully!",
+                "url": WEBHOOK_URL + "/webhook"
+            }, status_code=200)
+        except Exception as e:
+            return JSONResponse({
+                "status": "error",
+                "message": f"Failed to set webhook: {str(e)}"
+            }, status_code=500)
+    return JSONResponse({
+        "status": "error",
+        "message": "WEBHOOK_URL environment variable not set."
+    }, status_code=400)
+
+# -----------------------------------------------------------------------
+# 4. Error Handlers
+# -----------------------------------------------------------------------
+
+async def not_found(request, exc):
+    """Handle 404 errors."""
+    return JSONResponse({
+        "status": "error",
+        "message": "صفحه یافت نشد."
+    }, status_code=404)
+
+async def internal_error(request, exc):
+    """Handle 500 errors."""
+    return JSONResponse({
+        "status": "error",
+        "message": "خطای داخلی سرور."
+    }, status_code=500)
+
+# -----------------------------------------------------------------------
+# 5. Application
+# -----------------------------------------------------------------------
+
+routes = [
+    Route('/', index, methods=['GET']),
+    Route('/health', health, methods=['GET']),
+    Route('/api/chat', api_chat, methods=['POST']),
+    Route('/api/info', api_info, methods=['GET']),
+    Route('/webhook', webhook, methods=['POST']),
+    Route('/setwebhook', set_webhook_route, methods=['GET']),
+]
+
+app = Starlette(routes=routes, exception_handlers={404: not_found, 500: internal_error})
+
+if __name__ == '__main__':
+    import uvicorn
+
+    start_background_services()
+
+    port = int(os.environ.get("PORT", 8000))
+    uvicorn.run(app, host="0.0.0.0", port=port)
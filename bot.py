@@ -1,23 +1,32 @@
+import io
 import os
+import time
 import json
+import asyncio
+import threading
 from dotenv import load_dotenv
 from telebot import TeleBot, types
-from google import genai
-from google.genai import types as gemini_types
-from google.genai.errors import APIError
 
 # Import Service Modules
+# Only the light modules the Telegram handlers use directly are imported here.
+# Agent tools are resolved lazily through services.registry, and the Gemini
+# SDK is imported on first use (see get_client), to keep cold starts short.
+from services.registry import TOOL_NAMES, USER_ID_TOOLS, load_tool, select_tool_names
+from services.admin import is_verified, show_auth_buttons, is_mohammad, handle_admin_dashboard, set_user_level, get_user_list, get_user_level, ADMIN_ID
+from services.memory import add_to_memory, get_history, get_personality
 from services.ethics import is_ethical_request, get_ethics_rejection_message
-from services.trader import handle_trader_request
-from services.legal import handle_legal_request
-from services.tutor import handle_tutor_request
-from services.writer import handle_writing_request
-from services.premium import check_access_level, get_premium_features
-from services.image_generator import handle_image_request
-from services.admin import is_verified, show_auth_buttons, is_mohammad, handle_admin_dashboard, set_user_level, get_user_list, ADMIN_ID
-from services.memory import add_to_memory, get_history, handle_personality_analysis, get_personality
-from services.voice import text_to_voice, handle_voice_settings
-from services.self_improve import grok_search, self_upgrade, check_autonomy, update_resources_limit, hardware_stress_test, system_guardian, track_hacker, profit_hunter
+from services.intent import answer_locally, format_intent_stats
+from services.alerts import set_alert_sender, start_alert_engine
+from services.render_queue import set_render_sender, format_job_status, start_render_workers
+from services.speech import submit_voice_message
+from services.voice import handle_voice_settings, format_tts_cache_stats, get_voice_preference, send_voice_reply, VOICE_PROFILES
+from services.self_improve import check_autonomy, hardware_stress_test, system_guardian, start_autonomy
+from services.benchmark import set_agent_turn, format_benchmark_history
+from services.profiler import profiler, toggle_profiler, format_profiler_report, watch_handlers
+from services.gemini import ResilientGemini, CircuitOpenError, should_hedge, format_gemini_stats
+from services.ticker_feed import format_feed_status
+from services.trader import format_price_cache_stats
+from services.model_router import MODEL_PROFILES, classify_request, route_request, record_latency, format_routing_stats
 
 # ----------------------------------------------------------------------
 # 1. Initialization
@@ -32,63 +41,111 @@ if not TELEGRAM_TOKEN or not GEMINI_API_KEY:
     print("Error: TELEGRAM_TOKEN or GEMINI_API_KEY not found in environment variables.")
 
 bot = TeleBot(TELEGRAM_TOKEN)
-client = genai.Client(api_key=GEMINI_API_KEY)
-model_name = "gemini-2.5-flash"
-
-# Map function names to actual functions for execution
-tool_functions = {
-    "handle_trader_request": handle_trader_request,
-    "handle_legal_request": handle_legal_request,
-    "handle_tutor_request": handle_tutor_request,
-    "handle_writing_request": handle_writing_request,
-    "handle_image_request": handle_image_request,
-    "handle_admin_dashboard": handle_admin_dashboard,
-    "handle_personality_analysis": handle_personality_analysis,
-    "grok_search": grok_search,
-    "check_autonomy": check_autonomy,
-    "update_resources_limit": update_resources_limit,
-    "hardware_stress_test": hardware_stress_test,
-    "system_guardian": system_guardian,
-    "track_hacker": track_hacker,
-    "profit_hunter": profit_hunter,
-    "set_user_level": set_user_level,
-    "get_user_list": get_user_list,
-    "check_access_level": check_access_level,
-    "get_premium_features": get_premium_features,
-}
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Creates the Gemini client on first use (the genai SDK is slow to import)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                from services.gemini import http_options
+                _client = genai.Client(api_key=GEMINI_API_KEY, http_options=http_options())
+    return _client
+
+# Price alerts are delivered through the bot; resume persisted alerts after a restart
+set_alert_sender(lambda user_id, text: bot.send_message(user_id, text, parse_mode="Markdown"))
+
+def send_render_result(job):
+    """Delivers a finished render job: the video, or why it failed."""
+    if job["status"] == "done" and job.get("output"):
+        with open(job["output"], 'rb') as video:
+            bot.send_video(job["user_id"], video, caption=f"🎬 ویدیوی «{job['project_name']}» آماده است.")
+    else:
+        bot.send_message(job["user_id"], format_job_status(job))
+
+set_render_sender(send_render_result)
+
+def notify_admin(text):
+    """Sends a background report to the admin (as plain text if the Markdown is rejected)."""
+    from telebot.apihelper import ApiTelegramException
+
+    try:
+        bot.send_message(ADMIN_ID, text, parse_mode="Markdown")
+    except ApiTelegramException:
+        bot.send_message(ADMIN_ID, text)
+
+def start_background_services():
+    """
+    Starts the price-alert engine, the video render slots and the background
+    monitoring (guardian, market watch, daily opportunities; AUTONOMY=0
+    disables it). Not done at
+    import time: exactly one process per deployment should run these (see
+    app.start_background_services).
+    """
+    start_alert_engine()
+    start_render_workers()
+    if os.getenv("AUTONOMY", "1") == "1":
+        start_autonomy(notify_admin)
+
+# Current room per chat, set by the room buttons (used to pick the tool subset)
+chat_rooms = {}
+
+# --- Precomputed Tool Declarations ---
+# Turning a Python callable into a FunctionDeclaration means introspecting its
+# signature and docstring. That is done once per tool, and the resulting
+# GenerateContentConfig is cached per tool subset; each message only copies
+# the cached config with its own system instruction.
+_declarations = {}
+_tool_configs = {}
+_declarations_lock = threading.Lock()
+
+def get_function_declaration(name):
+    """Returns the cached FunctionDeclaration for a tool."""
+    if name not in _declarations:
+        from google.genai import types as gemini_types
+
+        with _declarations_lock:
+            if name not in _declarations:
+                # Built for the Gemini API directly, so no client (or API key) is needed
+                _declarations[name] = gemini_types.FunctionDeclaration.from_callable_with_api_option(
+                    callable=load_tool(name), api_option="GEMINI_API"
+                )
+    return _declarations[name]
+
+def get_tool_config(tool_names):
+    """Returns the cached GenerateContentConfig offering exactly `tool_names`."""
+    if tool_names not in _tool_configs:
+        from google.genai import types as gemini_types
+
+        declarations = [get_function_declaration(name) for name in tool_names]
+        _tool_configs[tool_names] = gemini_types.GenerateContentConfig(
+            tools=[gemini_types.Tool(function_declarations=declarations)] if declarations else None,
+            # Tool calls are executed by our own loop below
+            automatic_function_calling=gemini_types.AutomaticFunctionCallingConfig(disable=True)
+        )
+    return _tool_configs[tool_names]
+
+def warm_up():
+    """Imports the SDK and every tool module, builds all declarations and maps the legal index ahead of the first message."""
+    get_client()
+    for name in TOOL_NAMES:
+        get_function_declaration(name)
+    get_tool_config(TOOL_NAMES)
+    from services.legal_index import get_legal_index
+    get_legal_index()
 
 # ----------------------------------------------------------------------
 # 2. Core Agent Logic (Function Calling)
 # ----------------------------------------------------------------------
 
-def get_gemini_response(message):
-    """Sends prompt to Gemini and handles function calls."""
-    
-    user_id = message.from_user.id
+def build_agent_request(message, with_tools=True):
+    """Builds the prompt (with memory) and the system instruction for a message (shorter without tools)."""
     user_prompt = message.text.strip()
     
-    # All service functions are passed as tools to the model
-    tools = [
-        handle_trader_request,
-        handle_legal_request,
-        handle_tutor_request,
-        handle_writing_request,
-        handle_image_request,
-        handle_admin_dashboard,
-        handle_personality_analysis,
-        grok_search,
-        check_autonomy,
-        update_resources_limit,
-        hardware_stress_test,
-        system_guardian,
-        track_hacker,
-        profit_hunter,
-        set_user_level,
-        get_user_list,
-        check_access_level,
-        get_premium_features,
-    ]
-    
     # Add memory to the prompt for context
     user_history = get_history(message.from_user.id)
     
@@ -106,68 +163,177 @@ def get_gemini_response(message):
         "Your primary language is Farsi (Persian). "
         "The user's personality is analyzed as: "
         f"'{user_personality}'. Respond in a way that is tailored to this personality. "
-        "Use the provided tools to answer specific user requests. "
-        "If a tool is available, you MUST use it. If no tool is relevant, "
-        "answer the user's question directly in Farsi."
     )
+    if with_tools:
+        system_instruction += (
+            "Use the provided tools to answer specific user requests. "
+            "If a tool is available, you MUST use it. If no tool is relevant, "
+            "answer the user's question directly in Farsi."
+        )
+    else:
+        system_instruction += "Answer briefly and naturally in Farsi."
+    return full_prompt, system_instruction
+
+def execute_function_call(function_call, user_id, allowed_tools=TOOL_NAMES):
+    """Executes one model function call locally and wraps the result for the model."""
+    from google.genai import types as gemini_types
+
+    function_name = function_call.name
+    args = dict(function_call.args)
+    
+    if function_name not in allowed_tools:
+        # Handle unknown function call
+        return gemini_types.Part.from_function_response(
+            name=function_name,
+            response={"error": f"Unknown function: {function_name}"}
+        )
+    
+    # Execute the local function
+    local_function = load_tool(function_name)
+    
+    # Special handling for user_id (check_access_level, price alerts, ...)
+    if function_name in USER_ID_TOOLS:
+        args["user_id"] = user_id 
+    
+    # Execute the function with arguments
+    function_result = local_function(**args)
+    
+    # Prepare the tool response for the model
+    return gemini_types.Part.from_function_response(
+        name=function_name,
+        response={"result": function_result}
+    )
+
+def get_gemini_response(message, client=None, track=True):
+    """
+    Sends prompt to Gemini and handles function calls.
+
+    `client` replaces the real one and `track=False` keeps the turn out of the
+    routing log, the latency stats and the shared retry/breaker state (both
+    used by benchmarks).
+    """
+    start = time.perf_counter()
+    user_id = message.from_user.id
+    level = get_user_level(user_id)
+    room = chat_rooms.get(message.chat.id)
+    # Model profile for this message: lite (no tools) for small talk, stronger models for tool work
+    if track:
+        profile, route = route_request(message.text, room, level, user_id)
+        # Retries, circuit breaking and the fallback model; hedged for latency-sensitive levels
+        gemini = ResilientGemini(client or get_client(), fallback_model=route["fallback"], hedge=should_hedge(level))
+    else:
+        profile, _ = classify_request(message.text, room, level)
+        route = MODEL_PROFILES[profile]
+        gemini = (client or get_client()).models
+    full_prompt, system_instruction = build_agent_request(message, with_tools=route["tools"])
+    tool_names = select_tool_names(room, level) if route["tools"] else ()
+    config = get_tool_config(tool_names).model_copy(update={"system_instruction": system_instruction})
 
     # Use generate_content for a single turn with tools
-    response = client.models.generate_content(
-        model=model_name,
+    response = gemini.generate_content(
+        model=route["model"],
         contents=full_prompt,
-        config=gemini_types.GenerateContentConfig(
-            tools=tools,
-            system_instruction=system_instruction
-        )
+        config=config
     )
 
     # Function Calling Loop
     while response.function_calls:
-        tool_responses = []
-        
-        for function_call in response.function_calls:
-            function_name = function_call.name
-            args = dict(function_call.args)
-            
-            if function_name in tool_functions:
-                # Execute the local function
-                local_function = tool_functions[function_name]
-                
-                # Special handling for user_id in check_access_level
-                if function_name == "check_access_level":
-                    args["user_id"] = user_id 
-                
-                # Execute the function with arguments
-                function_result = local_function(**args)
-                
-                # Prepare the tool response for the model
-                tool_responses.append(
-                    gemini_types.Part.from_function_response(
-                        name=function_name,
-                        response={"result": function_result}
-                    )
-                )
-            else:
-                # Handle unknown function call
-                tool_responses.append(
-                    gemini_types.Part.from_function_response(
-                        name=function_name,
-                        response={"error": f"Unknown function: {function_name}"}
-                    )
-                )
+        tool_responses = [
+            execute_function_call(function_call, user_id, tool_names)
+            for function_call in response.function_calls
+        ]
 
         # Send the function results back to the model
-        response = client.models.generate_content(
-            model=model_name,
+        response = gemini.generate_content(
+            model=route["model"],
             contents=[full_prompt, *tool_responses], # Send original prompt + tool results
-            config=gemini_types.GenerateContentConfig(
-                tools=tools,
-                system_instruction=system_instruction
-            )
+            config=config
         )
-        
+
+    if track:
+        record_latency(profile, time.perf_counter() - start)
     return response.text
 
+# Synthetic sender of the benchmark turn (Telegram user ids are positive)
+BENCHMARK_USER_ID = 0
+
+def benchmark_agent_turn():
+    """
+    One representative agent turn (memory, prompt, tool config, one tool call,
+    final answer) against a stubbed Gemini client, for services.benchmark.
+    Runs as a synthetic user and records nothing, so /power_up leaves the
+    routing, latency and Gemini stats (and the admin's routing state) alone.
+    """
+    from types import SimpleNamespace
+
+    replies = [
+        SimpleNamespace(function_calls=[SimpleNamespace(name="get_premium_features", args={})], text=None),
+        SimpleNamespace(function_calls=None, text="✅"),
+    ]
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=lambda **kwargs: replies.pop(0)))
+    user = SimpleNamespace(id=BENCHMARK_USER_ID)
+    message = SimpleNamespace(text="قابلیت‌های اشتراک ویژه چیست؟", chat=user, from_user=user)
+    return get_gemini_response(message, client=client, track=False)
+
+set_agent_turn(benchmark_agent_turn)
+
+async def get_gemini_response_async(message):
+    """
+    Async twin of get_gemini_response for the ASGI front-end (asgi.py).
+    Uses the SDK's async client; the blocking parts (memory file I/O and the
+    service tools) run in worker threads so the event loop stays free.
+    """
+    start = time.perf_counter()
+    user_id = message.from_user.id
+    level = await asyncio.to_thread(get_user_level, user_id)
+    profile, route = route_request(message.text, chat_rooms.get(message.chat.id), level, user_id)
+    gemini = ResilientGemini(get_client(), fallback_model=route["fallback"], hedge=should_hedge(level))
+    full_prompt, system_instruction = await asyncio.to_thread(build_agent_request, message, route["tools"])
+    tool_names = select_tool_names(chat_rooms.get(message.chat.id), level) if route["tools"] else ()
+    config = get_tool_config(tool_names).model_copy(update={"system_instruction": system_instruction})
+
+    response = await gemini.agenerate_content(
+        model=route["model"],
+        contents=full_prompt,
+        config=config
+    )
+
+    while response.function_calls:
+        tool_responses = await asyncio.gather(*(
+            asyncio.to_thread(execute_function_call, function_call, user_id, tool_names)
+            for function_call in response.function_calls
+        ))
+
+        response = await gemini.agenerate_content(
+            model=route["model"],
+            contents=[full_prompt, *tool_responses],
+            config=config
+        )
+
+    record_latency(profile, time.perf_counter() - start)
+    return response.text
+
+def answer_message(message):
+    """
+    Answers a user message: forbidden requests are rejected locally, confident
+    intents are answered by the local fast path, everything else goes to Gemini.
+    """
+    if not is_ethical_request(message.text):
+        return get_ethics_rejection_message()
+    local_answer = answer_locally(message.text)
+    if local_answer is not None:
+        return local_answer
+    return get_gemini_response(message)
+
+async def answer_message_async(message):
+    """Async twin of answer_message (the local handlers run in a worker thread)."""
+    if not is_ethical_request(message.text):
+        return get_ethics_rejection_message()
+    local_answer = await asyncio.to_thread(answer_locally, message.text)
+    if local_answer is not None:
+        return local_answer
+    return await get_gemini_response_async(message)
+
 # ----------------------------------------------------------------------
 # 3. Telegram Message Handler
 # ----------------------------------------------------------------------
@@ -247,6 +413,7 @@ def show_main_menu(chat_id):
 def handle_room_navigation(call):
     room = call.data.split("_")[1]
     chat_id = call.message.chat.id
+    chat_rooms[chat_id] = room
     
     if room == "tutor":
         msg = "👨‍🏫 به اتاق معلم خوش آمدید. سوالات خود را در مورد ریاضی، فیزیک، برنامه‌نویسی یا زبان بپرسید."
@@ -270,14 +437,17 @@ def show_admin_dashboard(call):
         bot.answer_callback_query(call.id, "❌ دسترسی غیرمجاز.", show_alert=True)
         return
     
-    report = handle_admin_dashboard(call.message)
+    report = handle_admin_dashboard(call.message) + "\n\n" + format_intent_stats() + "\n" + format_tts_cache_stats() + "\n" + format_gemini_stats() + "\n" + format_routing_stats() + "\n" + format_price_cache_stats() + "\n" + format_feed_status()
     
     markup = types.InlineKeyboardMarkup()
     btn_status = types.InlineKeyboardButton("🔄 به‌روزرسانی وضعیت", callback_data="admin_dashboard")
     btn_users = types.InlineKeyboardButton("👥 مدیریت کاربران", callback_data="admin_users")
     btn_autonomy = types.InlineKeyboardButton("🚀 گزارش خودکفایی", callback_data="autonomy_mode")
+    btn_benchmarks = types.InlineKeyboardButton("📈 تاریخچه بنچمارک", callback_data="benchmark_history")
+    btn_profiler = types.InlineKeyboardButton("🔬 پروفایلر", callback_data="profiler_view")
     markup.add(btn_status, btn_users)
-    markup.add(btn_autonomy)
+    markup.add(btn_autonomy, btn_benchmarks)
+    markup.add(btn_profiler)
     
     bot.edit_message_text(report, call.message.chat.id, call.message.message_id, reply_markup=markup, parse_mode="Markdown")
     bot.answer_callback_query(call.id)
@@ -295,6 +465,49 @@ def check_autonomy_handler(call):
     bot.edit_message_text(report, call.message.chat.id, call.message.message_id, reply_markup=markup, parse_mode="Markdown")
     bot.answer_callback_query(call.id)
 
+@bot.callback_query_handler(func=lambda call: call.data == "benchmark_history")
+def benchmark_history_handler(call):
+    if not is_mohammad(call.message): return
+    
+    report = format_benchmark_history()
+    
+    markup = types.InlineKeyboardMarkup()
+    btn_back = types.InlineKeyboardButton("🔙 بازگشت به داشبورد", callback_data="admin_dashboard")
+    markup.add(btn_back)
+    
+    bot.edit_message_text(report, call.message.chat.id, call.message.message_id, reply_markup=markup, parse_mode="Markdown")
+    bot.answer_callback_query(call.id)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("profiler_"))
+def profiler_handler(call):
+    if not is_mohammad(call.message): return
+    
+    action = call.data[len("profiler_"):]
+    if action == "toggle":
+        toggle_profiler()
+    elif action == "reset":
+        profiler.reset()
+    elif action == "export":
+        # Collapsed stacks, ready for flamegraph.pl / speedscope
+        collapsed = profiler.collapsed()
+        if collapsed:
+            stacks = io.BytesIO(collapsed.encode("utf-8"))
+            stacks.name = f"stacks-{int(time.time())}.collapsed.txt"
+            bot.send_document(call.message.chat.id, stacks, caption="🔥 پشته‌های فشرده برای flame graph")
+    
+    markup = types.InlineKeyboardMarkup()
+    btn_toggle = types.InlineKeyboardButton("⏹️ توقف" if profiler.running else "▶️ شروع", callback_data="profiler_toggle")
+    btn_refresh = types.InlineKeyboardButton("🔄 به‌روزرسانی", callback_data="profiler_view")
+    btn_export = types.InlineKeyboardButton("📥 دریافت پشته‌ها", callback_data="profiler_export")
+    btn_reset = types.InlineKeyboardButton("🧹 پاک کردن", callback_data="profiler_reset")
+    btn_back = types.InlineKeyboardButton("🔙 بازگشت به داشبورد", callback_data="admin_dashboard")
+    markup.add(btn_toggle, btn_refresh)
+    markup.add(btn_export, btn_reset)
+    markup.add(btn_back)
+    
+    bot.edit_message_text(format_profiler_report(), call.message.chat.id, call.message.message_id, reply_markup=markup, parse_mode="Markdown")
+    bot.answer_callback_query(call.id)
+
 @bot.callback_query_handler(func=lambda call: call.data == "secret_market")
 def secret_market_handler(call):
     markup = types.InlineKeyboardMarkup()
@@ -410,7 +623,9 @@ def voice_settings_handler(call):
     markup = types.InlineKeyboardMarkup()
     btn_male = types.InlineKeyboardButton("👨‍💼 صدای مردانه", callback_data="set_male")
     btn_female = types.InlineKeyboardButton("👩‍💼 صدای زنانه", callback_data="set_female")
+    btn_off = types.InlineKeyboardButton("🔇 بدون صدا", callback_data="set_off")
     markup.add(btn_male, btn_female)
+    markup.add(btn_off)
     
     bot.edit_message_text("محمد جان، دوست داری صدای دستیارت چطوری باشه؟", 
                           call.message.chat.id, call.message.message_id, reply_markup=markup)
@@ -425,6 +640,57 @@ def set_voice_handler(call):
 
 # --- General Message Handler (for Gemini/Tool Calls) ---
 
+@bot.message_handler(commands=['gallery'])
+def gallery_handler(message):
+    """Sends thumbnails of the user's latest gallery items; `/gallery delete <id>` removes one."""
+    from services.gallery import get_gallery, search_gallery, delete_gallery_item
+
+    chat_id = message.chat.id
+    args = message.text.split()[1:]
+    if args and args[0] == "delete":
+        if len(args) < 2 or not args[1].lstrip("#").isdigit():
+            bot.send_message(chat_id, "❌ شماره مورد را بنویس: `/gallery delete 12`", parse_mode="Markdown")
+            return
+        bot.send_message(chat_id, delete_gallery_item(int(args[1].lstrip("#")), chat_id))
+        return
+    bot.send_message(chat_id, search_gallery("", chat_id), parse_mode="Markdown")
+    media = [types.InputMediaPhoto(open(row["thumbnail"], 'rb'), caption=f"#{row['id']} {row['prompt']}"[:1024])
+             for row in get_gallery().list_user_media(chat_id, limit=10)
+             if row["thumbnail"] and os.path.exists(row["thumbnail"])]
+    try:
+        if media:
+            bot.send_media_group(chat_id, media)
+    finally:
+        for item in media:
+            item.media.close()
+
+@bot.message_handler(content_types=['voice'])
+def handle_voice_message(message):
+    """Transcribes a voice note in the speech pool, then answers it like a text message."""
+    chat_id = message.chat.id
+    if not is_verified(chat_id):
+        bot.send_message(chat_id, "❌ دسترسی محدود شده است. لطفاً با /start احراز هویت کنید.")
+        return
+
+    def load_audio():
+        return bot.download_file(bot.get_file(message.voice.file_id).file_path)
+
+    def on_transcript(transcript):
+        if not transcript:
+            bot.send_message(chat_id, "🎙️ متأسفانه صدایت را متوجه نشدم. لطفاً دوباره بگو یا بنویس.")
+            return
+        bot.send_message(chat_id, f"🎙️ «{transcript}»")
+        # Re-dispatched as a text message: the model turn runs on the bot's worker
+        # pool like typed text, so it never holds a (scarce) transcription worker
+        message.text = transcript
+        message.content_type = "text"
+        bot.process_new_messages([message])
+
+    def on_error(e):
+        bot.send_message(chat_id, "متأسفانه پردازش پیام صوتی ناموفق بود. لطفاً دوباره تلاش کنید.")
+
+    submit_voice_message(load_audio, on_transcript, on_error)
+
 @bot.message_handler(func=lambda message: True)
 def handle_all_messages(message):
     """Handles all non-command messages by passing them to the Gemini agent."""
@@ -446,25 +712,36 @@ def handle_all_messages(message):
             bot.send_message(chat_id, "❌ دسترسی محدود شده است. لطفاً با /start احراز هویت کنید.")
             return
             
-        # Get response from Super-Agent (Gemini with Tools)
-        gemini_text_response = get_gemini_response(message)
+        # Get response from Super-Agent (ethics filter and local fast path run
+        # before any model call, then Gemini with Tools)
+        gemini_text_response = answer_message(message)
         
         # Send to Telegram
         if gemini_text_response:
             bot.send_message(chat_id, gemini_text_response, parse_mode="Markdown")
+
+            # Spoken reply, delivered sentence by sentence off the update thread
+            voice = get_voice_preference(chat_id)
+            if voice in VOICE_PROFILES:
+                threading.Thread(target=send_voice_reply, args=(bot, chat_id, gemini_text_response, voice),
+                                 daemon=True).start()
             
         # Add to Memory
         add_to_memory(chat_id, "user", message.text.strip())
         add_to_memory(chat_id, "bot", gemini_text_response)
 
-    except APIError as e:
-        error_message = f"An API error occurred: {e}"
-        print(error_message)
-        bot.send_message(chat_id, "متأسفانه در حال حاضر به دلیل خطای API نمی‌توانم پاسخ دهم. لطفاً بعداً دوباره تلاش کنید.")
     except Exception as e:
-        error_message = f"An unexpected error occurred: {e}"
-        print(error_message)
-        bot.send_message(chat_id, "متأسفانه خطای ناشناخته‌ای رخ داد. لطفاً دوباره تلاش کنید.")
+        # APIError is imported here so the genai SDK stays out of module import time
+        from google.genai.errors import APIError
+
+        if isinstance(e, (APIError, CircuitOpenError)):
+            error_message = f"An API error occurred: {e}"
+            print(error_message)
+            bot.send_message(chat_id, "متأسفانه در حال حاضر به دلیل خطای API نمی‌توانم پاسخ دهم. لطفاً بعداً دوباره تلاش کنید.")
+        else:
+            error_message = f"An unexpected error occurred: {e}"
+            print(error_message)
+            bot.send_message(chat_id, "متأسفانه خطای ناشناخته‌ای رخ داد. لطفاً دوباره تلاش کنید.")
 
 # --- Helper Handlers (Admin-specific actions) ---
 
@@ -486,20 +763,12 @@ def power_up_test(message):
     if not is_mohammad(message):
         return
     
-    bot.reply_to(message, "⚡ محمد جان، دارم سیستم رو برای تست نهایی تحت فشار می‌ذارم... صدای فن‌ها رو گوش کن!")
+    bot.reply_to(message, "⚡ محمد جان، دارم CPU، رم، دیسک و یک نوبت کامل ایجنت رو بنچمارک می‌کنم... چند ثانیه صبر کن!")
     
-    # اجرای تست استرس که قبلاً نوشتیم
+    # بنچمارک واقعی؛ نتیجه در تاریخچه ذخیره و با اجراهای قبلی مقایسه می‌شود
     report = hardware_stress_test()
     
-    # ساخت یک ویدیوی کوتاه خودکار برای جشن گرفتن قدرت جدید (Simulated)
-    # video_path, lesson = make_ai_video(["1000011743.jpg", "1000011732.jpg"], "System_Upgrade_Success")
-    
-    final_msg = (
-        f"{report}\n\n"
-        f"🎬 **ویدیو رندر شد:** (شبیه‌سازی)\n"
-        f"دستیارت الان خیلی سریع‌تر شده محمد. بریم برای تسخیر بازار! 🚀"
-    )
-    bot.send_message(message.chat.id, final_msg, parse_mode="Markdown")
+    bot.send_message(message.chat.id, report, parse_mode="Markdown")
 
 @bot.message_handler(commands=['find_job'])
 def job_hunter(message):
@@ -529,4 +798,7 @@ def handle_salary(call):
     bot.answer_callback_query(call.id, "در حال انتقال درآمدها به حساب پادشاه...")
     bot.send_message(call.message.chat.id, "💵 محمد جان، حقوق این ماه من از ادمینی ۳ کانال، به حساب تتر شما واریز شد!")
 
+# Every handler registered above reports to the stall watchdog
+watch_handlers(bot)
+
 # The bot object is exported for use in main.py
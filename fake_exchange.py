@@ -0,0 +1,289 @@
+"""
+Local fake exchange (Binance-style) for exercising services.ticker_feed and
+the price fetching of services.trader.
+
+    python fake_exchange.py --port 8090 --drop-after 5 --refuse 2   # serve; see the env vars below
+    python fake_exchange.py --check-feed 15                         # reconnect, backoff and backfill check
+    python fake_exchange.py --check-prices --broken SOL             # pooling, batching, single-flight check
+
+Serves on one port:
+  * GET /ws/...                   a websocket that pushes a miniTicker array every
+                                  --interval seconds (TICKER_STREAM_URL=ws://127.0.0.1:<port>/ws/!miniTicker@arr);
+  * GET /api/v3/ticker/price      REST prices: all of them (the backfill snapshot),
+                                  ?symbol=BTCUSDT or ?symbols=["BTCUSDT",...]; an unknown
+                                  symbol fails a batch with 400, as on Binance
+                                  (BINANCE_API_URL=http://127.0.0.1:<port>).
+Each stream connection is closed after --drop-after seconds, the next --refuse
+connection attempts are then answered with 503, and an --out-of-order share of
+the events repeats an older price, so every recovery path of the feed runs.
+REST answers take --latency seconds; requests for a --broken symbol alone get
+the connection reset, and batches containing it get 400.
+"""
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+class Market:
+    """Random-walk prices per symbol with their event times (ms)."""
+
+    def __init__(self, symbols):
+        self.lock = threading.Lock()
+        self.prices = {symbol: random.uniform(1, 50_000) for symbol in symbols}
+        self.history = {symbol: [] for symbol in symbols}  # recent (price, event_ms), for out-of-order events
+        self.refusals = 0
+        self.stats = {"connections": 0, "refused": 0, "drops": 0, "messages": 0, "snapshots": 0,
+                      "tcp_connections": 0, "price_requests": 0}
+
+    def tick(self, out_of_order=0.0):
+        """One miniTicker array: every symbol moves, some events repeat an older state."""
+        events = []
+        with self.lock:
+            now_ms = int(time.time() * 1000)
+            for symbol, price in self.prices.items():
+                history = self.history[symbol]
+                if history and random.random() < out_of_order:
+                    old_price, old_ms = random.choice(history)
+                    events.append({"e": "24hrMiniTicker", "s": f"{symbol}USDT", "c": f"{old_price:.8f}", "E": old_ms})
+                    continue
+                price = self.prices[symbol] = price * random.uniform(0.999, 1.001)
+                history.append((price, now_ms))
+                del history[:-20]
+                events.append({"e": "24hrMiniTicker", "s": f"{symbol}USDT", "c": f"{price:.8f}", "E": now_ms})
+            self.stats["messages"] += 1
+        return events
+
+    def snapshot(self):
+        with self.lock:
+            self.stats["snapshots"] += 1
+            return [{"symbol": f"{symbol}USDT", "price": f"{price:.8f}"} for symbol, price in self.prices.items()]
+
+    def quote(self, pair):
+        """{"symbol", "price"} for a pair like BTCUSDT, or None if unknown."""
+        with self.lock:
+            price = self.prices.get(pair[:-4]) if pair.endswith("USDT") else None
+        return None if price is None else {"symbol": pair, "price": f"{price:.8f}"}
+
+def ws_frame(text, opcode=0x1):
+    """One unmasked server frame (FIN set)."""
+    payload = text.encode("utf-8")
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 1 << 16:
+        header += bytes([126]) + len(payload).to_bytes(2, "big")
+    else:
+        header += bytes([127]) + len(payload).to_bytes(8, "big")
+    return header + payload
+
+def make_handler(market, options):
+    class FakeExchangeHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse shows up
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.headers.get("Upgrade", "").lower() == "websocket":
+                self._stream()
+            elif self.path.startswith("/api/v3/ticker/price"):
+                self._prices()
+            else:
+                self._send(404, {"code": -1, "msg": "Not found"})
+
+        def _prices(self):
+            query = parse_qs(urlsplit(self.path).query)
+            time.sleep(options.latency)
+            with market.lock:
+                market.stats["price_requests"] += 1
+            if "symbol" in query:
+                pair = query["symbol"][0]
+                if pair[:-4] in options.broken:
+                    self.close_connection = True
+                    self.connection.shutdown(2)  # reset without a response
+                    return
+                quote = market.quote(pair)
+                if quote is None:
+                    self._send(400, {"code": -1121, "msg": "Invalid symbol."})
+                else:
+                    self._send(200, quote)
+            elif "symbols" in query:
+                pairs = json.loads(query["symbols"][0])
+                quotes = [market.quote(pair) for pair in pairs]
+                if None in quotes or any(pair[:-4] in options.broken for pair in pairs):
+                    self._send(400, {"code": -1121, "msg": "Invalid symbol."})
+                else:
+                    self._send(200, quotes)
+            else:
+                self._send(200, market.snapshot())
+
+        def _stream(self):
+            with market.lock:
+                refuse = market.refusals > 0
+                if refuse:
+                    market.refusals -= 1
+                    market.stats["refused"] += 1
+                else:
+                    market.stats["connections"] += 1
+            if refuse:
+                self._send(503, {"code": -1, "msg": "Injected refusal"})
+                return
+            accept = base64.b64encode(hashlib.sha1((self.headers["Sec-WebSocket-Key"] + WS_GUID).encode()).digest())
+            self.send_response(101, "Switching Protocols")
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept.decode())
+            self.end_headers()
+            self.close_connection = True
+            deadline = time.monotonic() + options.drop_after if options.drop_after else float("inf")
+            try:
+                while time.monotonic() < deadline and not options.stopping.is_set():
+                    self.wfile.write(ws_frame(json.dumps(market.tick(options.out_of_order))))
+                    self.wfile.flush()
+                    time.sleep(options.interval)
+                # Injected drop: close, then refuse the next attempts so the client backs off
+                self.wfile.write(ws_frame("", opcode=0x8))
+                with market.lock:
+                    market.stats["drops"] += 1
+                    market.refusals = options.refuse
+            except OSError:
+                pass  # client went away
+
+    return FakeExchangeHandler
+
+class CountingServer(ThreadingHTTPServer):
+    """Counts accepted TCP connections, to see whether clients reuse them."""
+
+    def get_request(self):
+        request = super().get_request()
+        with self.market.lock:
+            self.market.stats["tcp_connections"] += 1
+        return request
+
+def serve(options, background=False):
+    market = Market(options.symbols)
+    options.stopping = threading.Event()
+    server = CountingServer(("127.0.0.1", options.port), make_handler(market, options))
+    server.daemon_threads = True
+    server.market = market
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Fake exchange on http://127.0.0.1:{server.server_address[1]} "
+          f"(stream: ws://127.0.0.1:{server.server_address[1]}/ws/!miniTicker@arr)")
+    server.serve_forever()
+
+def check_feed(options):
+    """Runs services.ticker_feed against the fake stream and checks that every recovery path ran."""
+    import os
+
+    server = serve(options, background=True)
+    port = server.server_address[1]
+    os.environ["BINANCE_API_URL"] = f"http://127.0.0.1:{port}"  # read when services.trader is imported
+    from services import ticker_feed
+
+    ticker_feed.RECONNECT_MIN_DELAY = 0.2  # keep the backoff short enough for a check run
+    ticker_feed.start_ticker_feed(f"ws://127.0.0.1:{port}/ws/!miniTicker@arr")
+    time.sleep(options.check_feed)
+    status = ticker_feed.get_feed_status()
+    options.stopping.set()
+    ticker_feed.stop_ticker_feed()
+    server.shutdown()
+
+    market = server.market
+    drift = max(abs(ticker_feed.get_snapshot_price(s, max_age=float("inf")) - p) / p
+                for s, p in market.prices.items())
+    print(f"server: {market.stats}")
+    print(f"feed:   {status}")
+    checks = {
+        "reconnected after drops": status["connects"] >= 2,
+        "backed off through refusals": market.stats["refused"] >= 1,
+        "backfilled after reconnect": status["backfills"] >= 1,
+        "dropped out-of-order events": options.out_of_order == 0 or status["out_of_order"] > 0,
+        "snapshot tracks the server (<1%)": drift < 0.01,
+    }
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return all(checks.values())
+
+def check_prices(options):
+    """Runs services.trader's price fetching against the stand-in and checks batching, pooling and single-flight."""
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    options.latency = max(options.latency, 0.2)  # long enough for concurrent callers to overlap
+    server = serve(options, background=True)
+    os.environ["BINANCE_API_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["TICKER_STREAM_ENABLED"] = "0"
+    from services import trader
+
+    market = server.market
+    symbols = [s for s in options.symbols if s not in options.broken]
+
+    def requests_for(call):
+        trader._price_cache.clear()
+        before = market.stats["price_requests"]
+        result = call()
+        return market.stats["price_requests"] - before, result
+
+    checks = {}
+    sent, prices = requests_for(lambda: trader.get_crypto_prices(symbols))
+    checks[f"batching: {len(symbols)} symbols in {sent} request(s)"] = sent == 1 and None not in prices.values()
+
+    with ThreadPoolExecutor(20) as pool:
+        sent, results = requests_for(lambda: list(pool.map(lambda _: trader.get_crypto_price(symbols[0]), range(20))))
+    checks[f"single-flight: 20 concurrent callers, {sent} request(s)"] = sent == 1 and None not in results
+
+    sent, prices = requests_for(lambda: trader.get_crypto_prices(symbols + ["NOSUCHCOIN"] + options.broken))
+    missing = [s for s, p in prices.items() if p is None]
+    checks[f"per-symbol fallback: unpriced {missing}"] = set(missing) == {"NOSUCHCOIN", *options.broken}
+
+    before = market.stats["tcp_connections"]
+    for _ in range(20):
+        requests_for(lambda: trader.get_crypto_prices(symbols[:1]))
+    opened = market.stats["tcp_connections"] - before
+    checks[f"pooling: 20 sequential requests on {opened} new connection(s)"] = opened <= 2
+
+    server.shutdown()
+    print(f"server: {market.stats}")
+    print(f"cache:  {trader.get_price_cache_stats()}")
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return all(checks.values())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--symbols", type=lambda v: [s.strip().upper() for s in v.split(",") if s.strip()],
+                        default=["BTC", "ETH", "BNB", "SOL", "XRP"])
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds between stream messages")
+    parser.add_argument("--drop-after", type=float, default=3.0, help="seconds before each connection is closed (0: never)")
+    parser.add_argument("--refuse", type=int, default=2, help="connection attempts refused after each drop")
+    parser.add_argument("--out-of-order", type=float, default=0.05, help="share of events repeating an older price")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per REST answer")
+    parser.add_argument("--broken", type=lambda v: [s.strip().upper() for s in v.split(",") if s.strip()],
+                        default=[], help="symbols whose single-symbol requests get the connection reset")
+    parser.add_argument("--check-feed", type=float, default=0, help="run the ticker feed for N seconds and exit")
+    parser.add_argument("--check-prices", action="store_true", help="run the price fetching checks and exit")
+    options = parser.parse_args()
+    if options.check_feed:
+        sys.exit(0 if check_feed(options) else 1)
+    if options.check_prices:
+        sys.exit(0 if check_prices(options) else 1)
+    serve(options)
@@ -0,0 +1,118 @@
+"""
+Local fake Gemini endpoint with fault injection, for exercising services.gemini.
+
+    python fake_gemini.py --port 8089 --fail-rate 0.3          # serve; point GEMINI_BASE_URL at it
+    python fake_gemini.py --check 200 --fail-rate 0.3          # resilience check, bare vs wrapped client
+    python fake_gemini.py --check 50 --down gemini-2.5-flash   # primary model down: fallback + breaker
+
+Answers POST /<version>/models/<model>:generateContent like the real API.
+Each request fails with --status (default 503) with probability --fail-rate,
+models listed in --down always fail, and a --slow-rate share of requests take
+--slow-latency seconds instead of --latency.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+STATUS_NAMES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED",
+                400: "INVALID_ARGUMENT"}
+_PATH = re.compile(r"^/[^/]+/models/([^/:]+):generateContent")
+
+def make_handler(options):
+    class FakeGeminiHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            match = _PATH.match(self.path)
+            if not match:
+                self._send(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+                return
+            model = match.group(1)
+            slow = random.random() < options.slow_rate
+            time.sleep(options.slow_latency if slow else options.latency)
+            if model in options.down or random.random() < options.fail_rate:
+                status = options.status
+                self._send(status, {"error": {"code": status, "message": "Injected fault",
+                                              "status": STATUS_NAMES.get(status, "UNKNOWN")}})
+                return
+            self._send(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": f"پاسخ آزمایشی از {model}"}]},
+                                "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": 5, "candidatesTokenCount": 5, "totalTokenCount": 10},
+                "modelVersion": model,
+            })
+
+    return FakeGeminiHandler
+
+def serve(options, background=False):
+    server = ThreadingHTTPServer(("127.0.0.1", options.port), make_handler(options))
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Fake Gemini on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
+
+def _run(label, call, n):
+    ok, timings = 0, []
+    for _ in range(n):
+        start = time.perf_counter()
+        try:
+            call()
+            ok += 1
+        except Exception:
+            pass
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{label}: {ok}/{n} ok | p50 {statistics.median(timings):.0f} ms | "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:.0f} ms")
+
+def check(options):
+    """Sends the same requests through a bare client and through ResilientGemini."""
+    server = serve(options, background=True)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    from google import genai
+    from google.genai import types as gemini_types
+    from services import gemini
+
+    client = genai.Client(api_key="fake", http_options=gemini_types.HttpOptions(base_url=base_url, timeout=10_000))
+    model = options.model
+    _run("bare client     ", lambda: client.models.generate_content(model=model, contents="سلام"), options.check)
+    wrapped = gemini.ResilientGemini(client, hedge=options.hedge)
+    _run("ResilientGemini ", lambda: wrapped.generate_content(model=model, contents="سلام"), options.check)
+    print(gemini.get_gemini_stats())
+    server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--status", type=int, default=503)
+    parser.add_argument("--down", nargs="*", default=[], help="models that always fail")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--check", type=int, default=0, help="run N requests through both clients and exit")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--hedge", action="store_true", help="hedge the wrapped calls")
+    options = parser.parse_args()
+    if options.check:
+        check(options)
+        sys.exit(0)
+    serve(options)
@@ -0,0 +1,35 @@
+# gunicorn.conf.py - picked up automatically by `gunicorn app:app` / `gunicorn asgi:app`
+import os
+import threading
+
+# GUNICORN_PRELOAD=1: import the app once in the master and fork workers from it,
+# so the heavy imports are shared copy-on-write instead of paid per worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+# WARM_UP=1: import bot.py, the genai SDK and every tool module before the first
+# chat message instead of on it.
+WARM_UP = os.getenv("WARM_UP", "0") == "1"
+
+def _warm_up():
+    import app
+    app.warm_up()
+
+def when_ready(server):
+    """With preload, warm up once in the master before the workers are forked."""
+    if preload_app and WARM_UP:
+        _warm_up()
+        server.log.info("Super-Agent warmed up in master")
+
+def _start_background_services():
+    import app
+    app.start_background_services()
+
+def post_worker_init(worker):
+    """
+    Without preload, warm up each worker in the background so /health is not delayed.
+    Every worker also bids for the background services (price alerts, autonomy);
+    one wins and runs them, never the master, whose threads would be lost at fork.
+    """
+    if WARM_UP and not preload_app:
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    threading.Thread(target=_start_background_services, name="background-services", daemon=True).start()
@@ -45,5 +45,8 @@ def health():
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
     # This block is typically for local development
+    from app import start_background_services
+
+    start_background_services()
     port = int(os.environ.get("PORT", 8000))
     app.run(host="0.0.0.0", port=port)
@@ -1,5 +1 @@
-<<<<<<< HEAD
 # This file makes the 'services' directory a Python package.
-=======
-
->>>>>>> 03e15c3 (Feat: Implement Super-Agent logic with Gemini Function Calling and updated services)
@@ -1,5 +1,4 @@
 # services/admin.py
-from telebot import types
 import json
 import os
 
@@ -68,7 +67,7 @@ def show_auth_buttons(user_id):
 
 # --- Admin Dashboard and System Monitoring ---
 
-def get_system_status():
+def get_system_status() -> str:
     """Provides a report on the system's health (CPU, RAM, Disk)."""
     import psutil
     
@@ -100,7 +99,7 @@ def handle_admin_dashboard(message):
 
 # --- User Level Management ---
 
-def set_user_level(target_user_id, level):
+def set_user_level(target_user_id: int, level: str) -> str:
     """Sets the access level for a specific user."""
     if level not in USER_LEVELS:
         return f"❌ سطح دسترسی '{level}' معتبر نیست."
@@ -118,7 +117,7 @@ def set_user_level(target_user_id, level):
     else:
         return "❌ خطایی در ذخیره داده‌ها رخ داد."
 
-def get_user_list():
+def get_user_list() -> str:
     """Returns a list of all users and their levels."""
     user_data = load_user_data()
     report = "👥 **لیست کاربران و سطوح دسترسی:**\n\n"
@@ -0,0 +1,334 @@
+# services/alerts.py
+import os
+import json
+import time
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from contextlib import contextmanager
+
+# --- Price Alert Engine ---
+# Alerts are kept per symbol in two sorted indexes of (threshold, alert_id):
+#   above: fires when price >= threshold  -> a prefix of the ascending list
+#   below: fires when price <= threshold  -> a suffix of the ascending list
+# so each tick costs one bisect plus the number of alerts that fire.
+# Alerts persist in an append-only journal that is compacted on load and
+# whenever dead entries (fired or cancelled alerts) outnumber the live ones.
+# The journal is also how processes share alerts: every web worker can add or
+# cancel alerts (appending under a file lock), and the book replays the
+# journal whenever another process has changed it. Only the process running
+# the background services (bot.start_background_services) evaluates and
+# delivers them.
+
+ALERTS_PATH = "/home/ubuntu/my-ai-bot/price_alerts.jsonl"
+ALERT_POLL_INTERVAL = float(os.getenv("ALERT_POLL_INTERVAL", 10))   # seconds, when no ticker stream
+DELIVERY_INTERVAL = 1.0  # seconds; alerts fired within this window reach a user as one message
+COMPACT_MIN_ENTRIES = 1000  # journal lines before a compaction is considered
+
+ABOVE, BELOW = "above", "below"
+
+class AlertBook:
+    """Per-symbol sorted threshold indexes with journal persistence."""
+
+    def __init__(self, path=ALERTS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.alerts = {}  # alert_id -> alert dict
+        self.index = defaultdict(lambda: {ABOVE: [], BELOW: []})
+        self.next_id = 1
+        self._synced = None  # (size, mtime) of the journal as of our last read or write
+        self._entries = 0  # lines in the journal
+        self._lock_file = None
+
+    # --- Persistence ---
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the journal across processes (a sidecar .lock file)."""
+        import fcntl
+
+        if self._lock_file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._lock_file = open(self.path + ".lock", 'a')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _journal_state(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _replay(self):
+        """Rebuilds the alerts and indexes from the journal (caller holds self.lock)."""
+        alerts = {}
+        entries = 0
+        next_id = 1
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entries += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    if entry["op"] == "add":
+                        alerts[entry["alert"]["id"]] = entry["alert"]
+                        next_id = max(next_id, entry["alert"]["id"] + 1)
+                    elif entry["op"] == "next":
+                        next_id = max(next_id, entry["id"])
+                    else:
+                        alerts.pop(entry["id"], None)
+        self.alerts = alerts
+        self.index.clear()
+        for alert in alerts.values():
+            self.index[alert["symbol"]][alert["direction"]].append((alert["threshold"], alert["id"]))
+        for sides in self.index.values():
+            sides[ABOVE].sort()
+            sides[BELOW].sort()
+        self.next_id = next_id
+        self._entries = entries
+        self._synced = self._journal_state()
+
+    def _refresh(self):
+        """Replays the journal if another process changed it since our last read or write."""
+        if self._journal_state() != self._synced:
+            self._replay()
+
+    def load(self):
+        """Replays the journal, rebuilds the indexes and compacts the file."""
+        with self.lock, self._file_lock():
+            self._replay()
+            self._compact()
+            return len(self.alerts)
+
+    def _compact(self):
+        """Rewrites the journal with only the live alerts (atomic rename)."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # Ids are never reused, even after the alerts holding the highest ones are gone
+            f.write(json.dumps({"op": "next", "id": self.next_id}) + "\n")
+            for alert in self.alerts.values():
+                f.write(json.dumps({"op": "add", "alert": alert}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._entries = len(self.alerts) + 1
+        self._synced = self._journal_state()
+
+    def _log(self, entries):
+        """Appends to the journal, compacting it when mostly dead (caller holds self.lock and the file lock)."""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+        self._entries += len(entries)
+        self._synced = self._journal_state()
+        if self._entries >= max(COMPACT_MIN_ENTRIES, 2 * len(self.alerts)):
+            self._compact()
+
+    # --- Alert Management ---
+
+    def add(self, user_id, symbol, direction, threshold):
+        """Registers an alert and returns its id."""
+        if direction not in (ABOVE, BELOW):
+            raise ValueError(f"unknown direction: {direction}")
+        with self.lock, self._file_lock():
+            self._refresh()
+            alert = {"id": self.next_id, "user_id": int(user_id), "symbol": symbol.upper(),
+                     "direction": direction, "threshold": float(threshold), "created": time.time()}
+            self.next_id += 1
+            self.alerts[alert["id"]] = alert
+            insort(self.index[alert["symbol"]][direction], (alert["threshold"], alert["id"]))
+            self._log([{"op": "add", "alert": alert}])
+        return alert["id"]
+
+    def remove(self, alert_id, user_id=None):
+        """Cancels an alert (only the owner's, when user_id is given)."""
+        with self.lock, self._file_lock():
+            self._refresh()
+            alert = self.alerts.get(alert_id)
+            if alert is None or (user_id is not None and alert["user_id"] != int(user_id)):
+                return False
+            keys = self.index[alert["symbol"]][alert["direction"]]
+            position = bisect_left(keys, (alert["threshold"], alert_id))
+            if position < len(keys) and keys[position] == (alert["threshold"], alert_id):
+                del keys[position]
+            del self.alerts[alert_id]
+            self._log([{"op": "del", "id": alert_id}])
+        return True
+
+    def user_alerts(self, user_id):
+        with self.lock:
+            self._refresh()
+            return [a for a in self.alerts.values() if a["user_id"] == int(user_id)]
+
+    def symbols(self):
+        """Symbols that currently have at least one alert."""
+        with self.lock:
+            self._refresh()
+            return [s for s, sides in self.index.items() if sides[ABOVE] or sides[BELOW]]
+
+    def __len__(self):
+        return len(self.alerts)
+
+    # --- Tick Evaluation ---
+
+    def _fire(self, symbol, price):
+        """Removes and returns the alerts of `symbol` triggered by `price` (caller holds self.lock)."""
+        sides = self.index.get(symbol)
+        if sides is None:
+            return []
+        above, below = sides[ABOVE], sides[BELOW]
+        fired_keys = []
+        if above and above[0][0] <= price:
+            end = bisect_right(above, (price, float("inf")))
+            fired_keys += above[:end]
+            del above[:end]
+        if below and below[-1][0] >= price:
+            start = bisect_left(below, (price, float("-inf")))
+            fired_keys += below[start:]
+            del below[start:]
+        return [dict(self.alerts.pop(alert_id), price=price) for _, alert_id in fired_keys]
+
+    def on_ticks(self, prices):
+        """
+        Removes and returns the alerts triggered by a batch of {symbol: price} ticks.
+        Cost: O(log n) for the bisects plus O(k) for the k triggered alerts, per symbol.
+        """
+        with self.lock, self._file_lock():
+            # Adds and cancels from other processes must be applied before anything fires
+            self._refresh()
+            fired = []
+            for symbol, price in prices.items():
+                if price is not None:
+                    fired += self._fire(symbol, price)
+            if fired:
+                self._log([{"op": "fire", "id": alert["id"], "price": alert["price"]} for alert in fired])
+        return fired
+
+    def on_tick(self, symbol, price):
+        """on_ticks for a single symbol."""
+        return self.on_ticks({symbol: price})
+
+# --- Engine (tick source + batched delivery) ---
+
+_book = AlertBook()
+_sender = None          # callable(user_id, text)
+_pending = []
+_pending_lock = threading.Lock()
+_engine_thread = None
+_engine_lock = threading.Lock()
+_loaded = False
+
+def set_alert_sender(sender):
+    """Registers how alert messages reach users (bot.py passes a Telegram sender)."""
+    global _sender
+    _sender = sender
+
+def get_alert_book():
+    """The alert book, loaded from the journal on first use."""
+    global _loaded
+    with _engine_lock:
+        if not _loaded:
+            _book.load()
+            _loaded = True
+    return _book
+
+def _queue(fired):
+    if fired:
+        with _pending_lock:
+            _pending.extend(fired)
+
+def _on_feed_ticks(prices):
+    _queue(_book.on_ticks(prices))
+
+def _deliver():
+    """Sends all pending alerts, one message per user."""
+    with _pending_lock:
+        batch, _pending[:] = list(_pending), []
+    if not batch or _sender is None:
+        return
+    by_user = defaultdict(list)
+    for alert in batch:
+        by_user[alert["user_id"]].append(alert)
+    for user_id, alerts in by_user.items():
+        lines = ["🔔 **هشدار قیمت فعال شد:**"]
+        for alert in alerts:
+            arrow = "⬆️" if alert["direction"] == ABOVE else "⬇️"
+            lines.append(f"{arrow} {alert['symbol']} به ${alert['price']:,.2f} رسید (هدف: ${alert['threshold']:,.2f})")
+        try:
+            _sender(user_id, "\n".join(lines))
+        except Exception as e:
+            print(f"Error delivering alerts to {user_id}: {e}")
+
+def _run():
+    from services import ticker_feed
+    from services.trader import get_crypto_prices
+
+    get_alert_book()
+    ticker_feed.add_tick_listener(_on_feed_ticks)
+    last_poll = 0.0
+    while True:
+        # Without the streaming feed, poll the alerted symbols with one batched request
+        if not ticker_feed.is_running() and time.monotonic() - last_poll >= ALERT_POLL_INTERVAL:
+            last_poll = time.monotonic()
+            symbols = _book.symbols()
+            if symbols:
+                try:
+                    _queue(_book.on_ticks(get_crypto_prices(symbols)))
+                except Exception as e:
+                    print(f"Error polling alert prices: {e}")
+        _deliver()
+        time.sleep(DELIVERY_INTERVAL)
+
+def start_alert_engine():
+    """
+    Loads persisted alerts and starts evaluation/delivery in the background (idempotent).
+    Called once per deployment, from the process that runs the background services.
+    """
+    global _engine_thread
+    with _engine_lock:
+        if _engine_thread is None or not _engine_thread.is_alive():
+            _engine_thread = threading.Thread(target=_run, name="price-alerts", daemon=True)
+            _engine_thread.start()
+
+# --- Agent Tools ---
+
+def set_price_alert(symbol: str, target_price: float, user_id: int) -> str:
+    """
+    Notifies the user when a crypto symbol reaches a target price.
+
+    Args:
+        symbol: Ticker such as BTC or ETH.
+        target_price: Price in USDT that should trigger the alert.
+        user_id: Filled in by the bot.
+    """
+    from services.trader import get_crypto_price
+
+    symbol = symbol.upper()
+    current = get_crypto_price(symbol)
+    if current is None:
+        return f"❌ نماد {symbol} پیدا نشد یا قیمت آن در دسترس نیست."
+    direction = ABOVE if target_price >= current else BELOW
+    alert_id = get_alert_book().add(user_id, symbol, direction, target_price)
+    arrow = "بالاتر از" if direction == ABOVE else "پایین‌تر از"
+    return (f"🔔 هشدار #{alert_id} ثبت شد: وقتی {symbol} به {arrow} ${target_price:,.2f} برسد خبرت می‌کنم. "
+            f"(قیمت فعلی: ${current:,.2f})")
+
+def list_price_alerts(user_id: int) -> str:
+    """Lists the user's active price alerts."""
+    alerts = get_alert_book().user_alerts(user_id)
+    if not alerts:
+        return "🔕 هیچ هشدار قیمت فعالی نداری."
+    lines = ["🔔 **هشدارهای فعال تو:**"]
+    for alert in sorted(alerts, key=lambda a: a["id"]):
+        arrow = "⬆️" if alert["direction"] == ABOVE else "⬇️"
+        lines.append(f"#{alert['id']} {arrow} {alert['symbol']} @ ${alert['threshold']:,.2f}")
+    return "\n".join(lines)
+
+def cancel_price_alert(alert_id: int, user_id: int) -> str:
+    """Cancels one of the user's price alerts by its number."""
+    if get_alert_book().remove(int(alert_id), user_id=user_id):
+        return f"✅ هشدار #{alert_id} لغو شد."
+    return f"❌ هشدار #{alert_id} پیدا نشد."
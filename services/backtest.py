@@ -0,0 +1,73 @@
+# services/backtest.py
+import numpy as np
+
+# --- Vectorized Backtester ---
+# Strategies are evaluated with whole-array NumPy operations; the only Python
+# loop is over parameter combinations, never over bars.
+
+def moving_average(close, window):
+    """Simple moving average via cumulative sums; NaN for the first window-1 bars."""
+    out = np.full(len(close), np.nan)
+    if window <= len(close):
+        cumsum = np.concatenate([[0.0], np.cumsum(close, dtype=np.float64)])
+        out[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return out
+
+def _stats(bar_returns, positions, periods_per_year):
+    """Summary statistics of a log-return series."""
+    equity = np.cumsum(bar_returns)
+    peak = np.maximum.accumulate(np.concatenate([[0.0], equity]))[1:]
+    std = bar_returns.std()
+    return {
+        "total_return": float(np.expm1(equity[-1])) if len(equity) else 0.0,
+        "sharpe": float(bar_returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0,
+        "max_drawdown": float(-np.expm1((equity - peak).min())) if len(equity) else 0.0,
+        "trades": int(np.count_nonzero(np.diff(positions))) if len(positions) > 1 else 0,
+        "exposure": float(positions.mean()) if len(positions) else 0.0,
+    }
+
+def ma_crossover_grid(close, fast_windows, slow_windows, fee=0.001, periods_per_year=365 * 24):
+    """
+    Backtests a long-only moving-average crossover for every (fast, slow) pair.
+
+    The position for bar t+1 is decided on the close of bar t (long while the
+    fast MA is above the slow MA); each position change pays `fee` (fraction).
+
+    Args:
+        close: 1-D array of closing prices (a memory-mapped column is fine).
+        fast_windows, slow_windows: Candidate window lengths; pairs with fast >= slow are skipped.
+        fee: Cost per position change, e.g. 0.001 for 0.1%.
+        periods_per_year: Bars per year, used to annualize the Sharpe ratio.
+
+    Returns:
+        A list of result dicts (fast, slow, total_return, sharpe, max_drawdown, trades,
+        exposure) sorted by Sharpe ratio, best first.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if len(close) < 3:
+        return []
+    log_returns = np.diff(np.log(close))
+    averages = {w: moving_average(close, w) for w in set(fast_windows) | set(slow_windows)}
+
+    results = []
+    for fast in sorted(set(fast_windows)):
+        for slow in sorted(set(slow_windows)):
+            if fast >= slow or slow >= len(close):
+                continue
+            # Signal on bar t's close applies to the return from t to t+1
+            signal = (averages[fast] > averages[slow]).astype(np.float64)[:-1]
+            signal[:slow - 1] = 0.0
+            costs = fee * np.abs(np.diff(np.concatenate([[0.0], signal])))
+            bar_returns = signal * log_returns - costs
+            results.append({"fast": fast, "slow": slow, **_stats(bar_returns, signal, periods_per_year)})
+
+    results.sort(key=lambda r: r["sharpe"], reverse=True)
+    return results
+
+def buy_and_hold(close, periods_per_year=365 * 24):
+    """Benchmark statistics for simply holding the asset."""
+    close = np.asarray(close, dtype=np.float64)
+    if len(close) < 2:
+        return None
+    log_returns = np.diff(np.log(close))
+    return _stats(log_returns, np.ones(len(log_returns)), periods_per_year)
@@ -0,0 +1,279 @@
+# services/benchmark.py
+import os
+import json
+import time
+import socket
+import statistics
+import threading
+
+# --- Hardware Benchmark Suite ---
+# Measures what the bot actually depends on: pure-Python CPU throughput on
+# one core and on all cores (process pool, so the GIL does not hide the other
+# cores), memory bandwidth (large NumPy copies), sequential and random disk
+# I/O on the volume that holds the gallery, and the latency of one agent turn
+# with the network stubbed out. Every run is appended to a JSON-lines history
+# and compared with the median of the previous runs, so a deploy that makes
+# the bot slower shows up as a regression.
+#
+#     python -m services.benchmark        # exit code 1 on a regression
+
+BENCHMARK_HISTORY_PATH = os.getenv("BENCHMARK_HISTORY_PATH", "/home/ubuntu/my-ai-bot/benchmark_history.jsonl")
+BENCH_CPU_ITERATIONS = int(os.getenv("BENCH_CPU_ITERATIONS", 3_000_000))
+BENCH_MEMORY_MB = int(os.getenv("BENCH_MEMORY_MB", 256))
+BENCH_DISK_MB = int(os.getenv("BENCH_DISK_MB", 128))
+BENCH_RANDOM_READS = 2000
+BENCH_AGENT_RUNS = 20
+REGRESSION_THRESHOLD = float(os.getenv("BENCH_REGRESSION_THRESHOLD", 0.15))  # 15% worse than baseline
+BASELINE_RUNS = 5  # previous runs whose median is the baseline
+
+# name -> (label, unit, higher is better)
+METRICS = {
+    "cpu_single": ("CPU تک‌هسته", "M op/s", True),
+    "cpu_all": ("CPU همه هسته‌ها", "M op/s", True),
+    "cpu_scaling": ("مقیاس‌پذیری چندهسته", "x", True),
+    "memory_bandwidth": ("پهنای باند حافظه", "GB/s", True),
+    "disk_seq_write": ("نوشتن ترتیبی دیسک", "MB/s", True),
+    "disk_seq_read": ("خواندن ترتیبی دیسک", "MB/s", True),
+    "disk_random_read": ("خواندن تصادفی 4K", "IOPS", True),
+    "agent_turn": ("یک نوبت ایجنت (شبکه شبیه‌سازی)", "ms", False),
+}
+
+_agent_turn = None  # callable running one stubbed agent turn, registered by bot.py
+_run_lock = threading.Lock()
+
+# --- CPU ---
+
+def _cpu_work(iterations):
+    """Integer-heavy pure-Python loop; returns (iterations, seconds)."""
+    start = time.perf_counter()
+    x = 0
+    for i in range(iterations):
+        x = (x * 31 + i) & 0xFFFFFFFF
+    return iterations, time.perf_counter() - start
+
+def bench_cpu(iterations=BENCH_CPU_ITERATIONS):
+    """Single-core and all-core throughput in millions of loop iterations per second."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    done, seconds = _cpu_work(iterations)
+    single = done / seconds / 1e6
+
+    workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Start every worker before timing, so process start-up is not measured
+        list(pool.map(_cpu_work, [1] * workers))
+        start = time.perf_counter()
+        results = list(pool.map(_cpu_work, [iterations] * workers))
+        wall = time.perf_counter() - start
+    total = sum(n for n, _ in results) / wall / 1e6
+    return {"cpu_single": single, "cpu_all": total, "cpu_scaling": total / single}
+
+# --- Memory ---
+
+def bench_memory(size_mb=BENCH_MEMORY_MB, repeats=5):
+    """Copy bandwidth (read + write) of a large array, best of `repeats`, in GB/s."""
+    import numpy as np
+    import psutil
+
+    # Never take more than an eighth of the free memory for the two buffers
+    size = min(size_mb * 1024 * 1024, psutil.virtual_memory().available // 16)
+    src = np.ones(size // 8, dtype=np.float64)
+    dst = np.empty_like(src)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        np.copyto(dst, src)
+        best = min(best, time.perf_counter() - start)
+    return {"memory_bandwidth": 2 * src.nbytes / best / 1e9}
+
+# --- Disk ---
+
+def _drop_cache(fd):
+    """Asks the kernel to forget the file's cached pages (Linux), so reads hit the disk."""
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+def bench_disk(directory=None, size_mb=BENCH_DISK_MB, random_reads=BENCH_RANDOM_READS):
+    """
+    Sequential write/read throughput (MB/s) and random 4 KiB read IOPS on
+    the volume holding the gallery.
+    """
+    import random
+    from services.gallery import GALLERY_DB_PATH
+
+    directory = directory or os.path.dirname(GALLERY_DB_PATH) or "."
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f".benchmark-{os.getpid()}.tmp")
+    block = os.urandom(1024 * 1024)
+    size = size_mb * len(block)
+    try:
+        start = time.perf_counter()
+        with open(path, 'wb', buffering=0) as f:
+            for _ in range(size_mb):
+                f.write(block)
+            os.fsync(f.fileno())
+        write_seconds = time.perf_counter() - start
+
+        with open(path, 'rb', buffering=0) as f:
+            _drop_cache(f.fileno())
+            start = time.perf_counter()
+            while f.read(len(block)):
+                pass
+            read_seconds = time.perf_counter() - start
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            _drop_cache(fd)
+            offsets = [random.randrange(size // 4096) * 4096 for _ in range(random_reads)]
+            start = time.perf_counter()
+            for offset in offsets:
+                os.pread(fd, 4096, offset)
+            random_seconds = time.perf_counter() - start
+        finally:
+            os.close(fd)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return {"disk_seq_write": size / write_seconds / 1e6, "disk_seq_read": size / read_seconds / 1e6,
+            "disk_random_read": random_reads / random_seconds}
+
+# --- Agent Turn ---
+
+def set_agent_turn(runner):
+    """Registers a callable that runs one agent turn against a stubbed model (bot.py does this)."""
+    global _agent_turn
+    _agent_turn = runner
+
+def bench_agent_turn(runs=BENCH_AGENT_RUNS):
+    """Median latency of one stubbed agent turn in ms; the first (cold) turn is not counted."""
+    if _agent_turn is None:
+        return {}
+    _agent_turn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        _agent_turn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"agent_turn": statistics.median(timings)}
+
+BENCHMARKS = (("cpu", bench_cpu), ("memory", bench_memory), ("disk", bench_disk), ("agent", bench_agent_turn))
+
+# --- History and Regressions ---
+
+def load_history(path=BENCHMARK_HISTORY_PATH):
+    """All recorded runs, oldest first."""
+    if not os.path.exists(path):
+        return []
+    runs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                runs.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return runs
+
+def _append_history(record, path=BENCHMARK_HISTORY_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def compute_baseline(history, runs=BASELINE_RUNS):
+    """Per-metric median of the last `runs` recorded values."""
+    baseline = {}
+    for name in METRICS:
+        values = [r["results"][name] for r in history if name in r.get("results", {})][-runs:]
+        if values:
+            baseline[name] = statistics.median(values)
+    return baseline
+
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Metrics that got worse than the baseline by more than `threshold`.
+
+    Returns:
+        {name: relative change}, negative meaning worse.
+    """
+    regressions = {}
+    for name, value in results.items():
+        if name not in baseline or not baseline[name]:
+            continue
+        change = (value - baseline[name]) / baseline[name]
+        if not METRICS[name][2]:
+            change = -change
+        if change < -threshold:
+            regressions[name] = change
+    return regressions
+
+def run_benchmarks(save=True):
+    """
+    Runs every benchmark, compares it with the recorded history and appends it.
+
+    Returns:
+        The run record: time, host, cpu_count, results, baseline, regressions and errors.
+    """
+    with _run_lock:  # two runs at once would measure each other
+        results, errors = {}, {}
+        for name, bench in BENCHMARKS:
+            try:
+                results.update(bench())
+            except Exception as e:
+                print(f"Error in {name} benchmark: {e}")
+                errors[name] = str(e)
+        history = load_history()
+        baseline = compute_baseline(history)
+        record = {"time": time.time(), "host": socket.gethostname(), "cpu_count": os.cpu_count(),
+                  "results": results, "errors": errors}
+        if save:
+            try:
+                _append_history(record)
+            except OSError as e:
+                print(f"Error saving benchmark history: {e}")
+    return dict(record, baseline=baseline, regressions=find_regressions(results, baseline))
+
+def _fmt(value):
+    return f"{value:,.0f}" if value >= 100 else f"{value:.2f}"
+
+def format_benchmark_report(record):
+    """Run report with the change against the baseline for each metric."""
+    lines = [f"📊 **بنچمارک سخت‌افزار** ({record['cpu_count']} هسته):", ""]
+    for name, (label, unit, _) in METRICS.items():
+        if name not in record["results"]:
+            continue
+        value = record["results"][name]
+        line = f"{'⚠️' if name in record['regressions'] else '✅'} {label}: {_fmt(value)} {unit}"
+        base = record["baseline"].get(name)
+        if base:
+            line += f" ({(value - base) / base:+.0%} نسبت به میانه اجراهای قبلی)"
+        lines.append(line)
+    for name, error in record["errors"].items():
+        lines.append(f"❌ بنچمارک {name}: {error}")
+    lines.append("")
+    if record["regressions"]:
+        lines.append(f"🔻 افت عملکرد بیش از {REGRESSION_THRESHOLD:.0%} در {len(record['regressions'])} مورد!")
+    elif record["baseline"]:
+        lines.append("🟢 افت عملکردی نسبت به اجراهای قبلی دیده نشد.")
+    else:
+        lines.append("ℹ️ اولین اجرا ثبت شد؛ اجراهای بعدی با این مقایسه می‌شوند.")
+    return "\n".join(lines)
+
+HISTORY_COLUMNS = ("cpu_single", "cpu_all", "memory_bandwidth", "disk_random_read", "agent_turn")
+
+def format_benchmark_history(limit=10):
+    """The last `limit` runs, one line each, for the admin dashboard."""
+    history = load_history()[-limit:]
+    if not history:
+        return "📈 هنوز بنچمارکی ثبت نشده. با /power_up اجرا کن."
+    lines = ["📈 **تاریخچه بنچمارک** (" + " | ".join(METRICS[name][0] for name in HISTORY_COLUMNS) + "):"]
+    for run in reversed(history):
+        results = run.get("results", {})
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["time"]))
+        cells = [f"{_fmt(results[name])} {METRICS[name][1]}" if name in results else "—" for name in HISTORY_COLUMNS]
+        lines.append(f"• {date}: " + " | ".join(cells))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    record = run_benchmarks()
+    print(format_benchmark_report(record))
+    raise SystemExit(1 if record["regressions"] else 0)
@@ -0,0 +1,117 @@
+# services/candle_store.py
+import os
+import threading
+import numpy as np
+
+# --- Columnar Candle Store ---
+# History for backtests: one append-only binary file per field per
+# symbol/interval (<root>/<SYMBOL>/<interval>/<field>.bin), read back as
+# memory-mapped NumPy arrays so years of minute candles never have to be
+# loaded into RAM at once.
+
+CANDLE_STORE_PATH = os.getenv("CANDLE_STORE_PATH", "/home/ubuntu/my-ai-bot/candles")
+
+COLUMNS = {
+    "time": np.dtype("<i8"),     # candle open time, ms since epoch
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+    "volume": np.dtype("<f8"),
+}
+PRICE_FIELDS = ("open", "high", "low", "close", "volume")
+
+class CandleStore:
+    """Append-only, memory-mapped columnar storage for OHLCV candles."""
+
+    def __init__(self, root=CANDLE_STORE_PATH):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, interval, field):
+        return os.path.join(self.root, symbol.upper(), interval, f"{field}.bin")
+
+    def length(self, symbol, interval):
+        """
+        Number of complete rows. A crash between column writes can leave some
+        files one row longer; the shortest column defines the committed length.
+        """
+        sizes = []
+        for field, dtype in COLUMNS.items():
+            path = self._path(symbol, interval, field)
+            sizes.append(os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def last_time(self, symbol, interval):
+        """Open time of the newest stored candle, or None when empty."""
+        n = self.length(symbol, interval)
+        if not n:
+            return None
+        return int(self._column(symbol, interval, "time", n)[n - 1])
+
+    def append(self, symbol, interval, times, candles):
+        """
+        Appends candles (oldest first) whose open time is newer than the stored ones.
+
+        Args:
+            times: Open times in ms.
+            candles: Rows of open, high, low, close, volume.
+
+        Returns:
+            The number of rows written.
+        """
+        times = np.asarray(times, dtype=COLUMNS["time"])
+        candles = np.asarray(candles, dtype=np.float64).reshape(len(times), len(PRICE_FIELDS))
+        with self._lock:
+            n = self.length(symbol, interval)
+            last = self.last_time(symbol, interval)
+            keep = times > last if last is not None else np.ones(len(times), dtype=bool)
+            times, candles = times[keep], candles[keep]
+            if not len(times):
+                return 0
+            if np.any(np.diff(times) <= 0):
+                raise ValueError("candle times must be strictly increasing")
+
+            os.makedirs(os.path.dirname(self._path(symbol, interval, "time")), exist_ok=True)
+            # Price columns first, time last: a row only counts once every column has it
+            columns = {field: candles[:, i] for i, field in enumerate(PRICE_FIELDS)}
+            columns["time"] = times
+            for field in (*PRICE_FIELDS, "time"):
+                path = self._path(symbol, interval, field)
+                with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                    # Truncate a torn tail left by an interrupted append
+                    f.truncate(n * COLUMNS[field].itemsize)
+                    f.seek(0, os.SEEK_END)
+                    f.write(np.ascontiguousarray(columns[field], dtype=COLUMNS[field]).tobytes())
+            return len(times)
+
+    def _column(self, symbol, interval, field, n):
+        return np.memmap(self._path(symbol, interval, field), dtype=COLUMNS[field], mode="r", shape=(n,))
+
+    def read(self, symbol, interval, fields=("time", "close"), start_time=None, end_time=None):
+        """
+        Memory-mapped, read-only views of the requested columns.
+
+        The time range is located with a binary search on the time column, so
+        only the selected slice is ever paged in.
+
+        Returns:
+            A dict of field -> array (empty arrays when nothing is stored).
+        """
+        n = self.length(symbol, interval)
+        if not n:
+            return {field: np.empty(0, dtype=COLUMNS[field]) for field in fields}
+        times = self._column(symbol, interval, "time", n)
+        lo = int(np.searchsorted(times, start_time, side="left")) if start_time is not None else 0
+        hi = int(np.searchsorted(times, end_time, side="right")) if end_time is not None else n
+        return {field: (times if field == "time" else self._column(symbol, interval, field, n))[lo:hi]
+                for field in fields}
+
+_default_store = None
+
+def get_candle_store():
+    """The shared store rooted at CANDLE_STORE_PATH."""
+    global _default_store
+    if _default_store is None:
+        _default_store = CandleStore()
+    return _default_store
@@ -1,10 +1,64 @@
+import os
+import time
+import threading
+from services.text import normalize_fa, KeywordAutomaton
+
+# لیست کلمات ممنوعه یا الگوهای غیرقانونی
+# Extra terms can be supplied in a text file (one term per line, '#' for comments)
+# via ETHICS_LEXICON_PATH; the file is re-read automatically when it changes.
+# Terms only match whole words ("هک" must not reject "شاهکار" or "هکتار"), so inflected forms are listed too
+FORBIDDEN_WORDS = ["هک", "هکر", "هکرها", "ساخت بمب", "مواد مخدر",
+                   "hack", "hacker", "hacking", "crack", "cracking"]
+ETHICS_LEXICON_PATH = os.getenv("ETHICS_LEXICON_PATH", "")
+LEXICON_CHECK_INTERVAL = 5.0  # seconds between mtime checks of the lexicon file
+
+_lock = threading.Lock()
+_matcher = None
+_lexicon_mtime = None
+_last_check = 0.0
+
+def load_lexicon(path=None):
+    """Returns the normalized forbidden terms: the built-in list plus the lexicon file."""
+    path = ETHICS_LEXICON_PATH if path is None else path
+    terms = list(FORBIDDEN_WORDS)
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            terms += [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return {normalize_fa(term) for term in terms if normalize_fa(term)}
+
+def reload_lexicon():
+    """Recompiles the matcher from the current lexicon and returns the number of terms."""
+    global _matcher, _lexicon_mtime
+    terms = load_lexicon()
+    with _lock:
+        _matcher = KeywordAutomaton(terms, whole_words=True)
+        _lexicon_mtime = _get_lexicon_mtime()
+    return len(terms)
+
+def _get_lexicon_mtime():
+    try:
+        return os.path.getmtime(ETHICS_LEXICON_PATH) if ETHICS_LEXICON_PATH else None
+    except OSError:
+        return None
+
+def _get_matcher():
+    """Returns the compiled matcher, rebuilding it if the lexicon file changed."""
+    global _last_check
+    now = time.monotonic()
+    if _matcher is None:
+        reload_lexicon()
+    elif now - _last_check >= LEXICON_CHECK_INTERVAL:
+        _last_check = now
+        if _get_lexicon_mtime() != _lexicon_mtime:
+            reload_lexicon()
+    return _matcher
+
+def find_forbidden_terms(text):
+    """Returns the forbidden terms found in the (normalized) text."""
+    return _get_matcher().find_all(normalize_fa(text))
+
 def is_ethical_request(text):
-    # لیست کلمات ممنوعه یا الگوهای غیرقانونی
-    forbidden_words = ["هک", "ساخت بمب", "مواد مخدر", "hack", "crack"]
-    for word in forbidden_words:
-        if word in text.lower():
-            return False
-    return True
+    return not _get_matcher().contains_any(normalize_fa(text))
 
 def get_ethics_rejection_message(lang="fa"):
     messages = {
@@ -13,3 +67,22 @@ def get_ethics_rejection_message(lang="fa"):
         "ar": "⚠️ عذراً، لا أستطيع المساعدة في الطلبات غیر القانونية."
     }
     return messages.get(lang, messages["fa"])
+
+# Regression examples: legitimate messages that contain a forbidden term as part of a longer word
+ALLOWED_EXAMPLES = ["این یک شاهکار است", "راه‌کار پیشنهادی چیست؟", "زمین ۱۰ هکتاری", "آهک", "hackathon registration"]
+BLOCKED_EXAMPLES = ["چطور اینستاگرام را هک کنم؟", "یک هکر استخدام کن", "how to hack wifi", "ساخت بمب",
+                    "آموزش هک‌ها", "هک‌های جدید وای‌فای"]
+
+def check_examples():
+    """Returns the regression examples the filter gets wrong (empty when all pass)."""
+    wrong = [text for text in ALLOWED_EXAMPLES if not is_ethical_request(text)]
+    return wrong + [text for text in BLOCKED_EXAMPLES if is_ethical_request(text)]
+
+if __name__ == "__main__":
+    import sys
+
+    wrong = check_examples()
+    for text in wrong:
+        print(f"Misclassified: {text}")
+    print(f"{len(ALLOWED_EXAMPLES) + len(BLOCKED_EXAMPLES) - len(wrong)} examples ok, {len(wrong)} wrong")
+    sys.exit(1 if wrong else 0)
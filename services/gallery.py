@@ -0,0 +1,276 @@
+# services/gallery.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from services.text import ZWNJ, normalize_fa
+
+# --- Gallery Index ---
+# Every stored image/video gets a row in a SQLite index keyed by content
+# hash, user, prompt and time. All lookups go through B-tree indexes
+# (prompt prefix search is a range scan on the normalized prompt), so they
+# stay O(log n) however many files the drive holds. Thumbnails are made by
+# a small background pool and their paths stored in the same row. Per-user
+# disk usage is kept in its own table so quota checks are O(1).
+
+GALLERY_DB_PATH = os.getenv("GALLERY_DB_PATH", "/home/ubuntu/my-ai-bot/gallery.sqlite3")
+THUMBNAIL_PATH = os.getenv("THUMBNAIL_PATH", "/home/ubuntu/my-ai-bot/thumbnails")
+GALLERY_USER_QUOTA_MB = float(os.getenv("GALLERY_USER_QUOTA_MB", 1024))
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_WORKERS = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    prompt TEXT NOT NULL DEFAULT '',
+    prompt_key TEXT NOT NULL DEFAULT '',
+    bytes INTEGER NOT NULL,
+    created REAL NOT NULL,
+    thumbnail TEXT,
+    UNIQUE (user_id, sha256)
+);
+CREATE INDEX IF NOT EXISTS media_sha256 ON media (sha256);
+CREATE INDEX IF NOT EXISTS media_user_created ON media (user_id, created);
+CREATE INDEX IF NOT EXISTS media_prompt_key ON media (prompt_key);
+CREATE INDEX IF NOT EXISTS media_user_prompt_key ON media (user_id, prompt_key);
+CREATE TABLE IF NOT EXISTS usage (
+    user_id INTEGER PRIMARY KEY,
+    bytes INTEGER NOT NULL
+);
+"""
+SCHEMA_VERSION = 1  # 1: prompt_key keeps ZWNJ as a space (services.text.normalize_fa)
+
+class GalleryQuotaError(ValueError):
+    """Raised when storing a file would take a user past their gallery quota."""
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _quota_bytes(user_id):
+    from services.admin import ADMIN_ID
+
+    return None if int(user_id) == ADMIN_ID else GALLERY_USER_QUOTA_MB * 1024 * 1024
+
+class Gallery:
+    """SQLite-backed index of stored media with background thumbnails."""
+
+    def __init__(self, db_path=GALLERY_DB_PATH, thumbnail_path=THUMBNAIL_PATH):
+        self.db_path = db_path
+        self.thumbnail_path = thumbnail_path
+        self.lock = threading.Lock()
+        self._db = None
+        self._executor = None
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                with db:
+                    for row in db.execute("SELECT id, prompt FROM media WHERE prompt LIKE ?", (f"%{ZWNJ}%",)).fetchall():
+                        db.execute("UPDATE media SET prompt_key = ? WHERE id = ?", (normalize_fa(row["prompt"]), row["id"]))
+                    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._db = db
+        return self._db
+
+    # --- Writing ---
+
+    def add(self, path, user_id, prompt="", kind="image", enforce_quota=True):
+        """
+        Indexes a stored file for a user and queues its thumbnail.
+
+        Returns:
+            The media row as a dict (the existing one if the user already has this content).
+
+        Raises:
+            GalleryQuotaError: the file would exceed the user's quota; it is
+            deleted unless another row still refers to it.
+        """
+        sha256 = file_sha256(path)
+        size = os.path.getsize(path)
+        with self.lock:
+            db = self._conn()
+            existing = db.execute("SELECT * FROM media WHERE user_id = ? AND sha256 = ?",
+                                  (int(user_id), sha256)).fetchone()
+            if existing:
+                return dict(existing)
+
+            used = self._usage(db, user_id)
+            quota = _quota_bytes(user_id)
+            if enforce_quota and quota is not None and used + size > quota:
+                if not db.execute("SELECT 1 FROM media WHERE sha256 = ? AND path = ? LIMIT 1",
+                                  (sha256, path)).fetchone():
+                    os.remove(path)
+                raise GalleryQuotaError(
+                    f"سهمیه گالری پر است ({used / 1024 / 1024:.0f} از {quota / 1024 / 1024:.0f} MB).")
+
+            with db:
+                cursor = db.execute(
+                    "INSERT INTO media (sha256, user_id, kind, path, prompt, prompt_key, bytes, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (sha256, int(user_id), kind, path, prompt, normalize_fa(prompt), size, time.time()))
+                db.execute("INSERT INTO usage (user_id, bytes) VALUES (?, ?) "
+                           "ON CONFLICT (user_id) DO UPDATE SET bytes = bytes + excluded.bytes",
+                           (int(user_id), size))
+            row = dict(db.execute("SELECT * FROM media WHERE id = ?", (cursor.lastrowid,)).fetchone())
+        self._queue_thumbnail(row)
+        return row
+
+    def remove(self, media_id, user_id):
+        """Drops a user's row (and the file once nobody refers to it)."""
+        with self.lock:
+            db = self._conn()
+            row = db.execute("SELECT * FROM media WHERE id = ? AND user_id = ?", (media_id, int(user_id))).fetchone()
+            if row is None:
+                return False
+            with db:
+                db.execute("DELETE FROM media WHERE id = ?", (media_id,))
+                db.execute("UPDATE usage SET bytes = MAX(bytes - ?, 0) WHERE user_id = ?", (row["bytes"], int(user_id)))
+            orphan = not db.execute("SELECT 1 FROM media WHERE sha256 = ? AND path = ? LIMIT 1",
+                                    (row["sha256"], row["path"])).fetchone()
+        if orphan:
+            for path in (row["path"], row["thumbnail"]):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        return True
+
+    # --- Reading ---
+
+    @staticmethod
+    def _usage(db, user_id):
+        row = db.execute("SELECT bytes FROM usage WHERE user_id = ?", (int(user_id),)).fetchone()
+        return row["bytes"] if row else 0
+
+    def usage(self, user_id):
+        """Bytes stored by a user and their quota (None = unlimited)."""
+        with self.lock:
+            return self._usage(self._conn(), user_id), _quota_bytes(user_id)
+
+    def find_by_hash(self, sha256):
+        with self.lock:
+            return [dict(r) for r in self._conn().execute("SELECT * FROM media WHERE sha256 = ?", (sha256,))]
+
+    def search_prompts(self, prefix, user_id=None, limit=20):
+        """Media whose (normalized) prompt starts with `prefix`, newest first."""
+        key = normalize_fa(prefix)
+        query = "SELECT * FROM media WHERE prompt_key >= ? AND prompt_key < ?"
+        params = [key, key + "\U0010ffff"]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(int(user_id))
+        query += " ORDER BY created DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            return [dict(r) for r in self._conn().execute(query, params)]
+
+    def list_user_media(self, user_id, before=None, limit=20):
+        """A user's media, newest first; pass the last `created` as `before` for the next page."""
+        with self.lock:
+            rows = self._conn().execute(
+                "SELECT * FROM media WHERE user_id = ? AND created < ? ORDER BY created DESC LIMIT ?",
+                (int(user_id), before if before is not None else float("inf"), limit))
+            return [dict(r) for r in rows]
+
+    # --- Thumbnails ---
+
+    def _queue_thumbnail(self, row):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+        return self._executor.submit(self._make_thumbnail, row)
+
+    def _make_thumbnail(self, row):
+        from PIL import Image
+
+        os.makedirs(self.thumbnail_path, exist_ok=True)
+        target = os.path.join(self.thumbnail_path, f"{row['sha256']}.jpg")
+        try:
+            if not os.path.exists(target):
+                source = row["path"]
+                if row["kind"] == "video":
+                    source = self._first_frame(row["path"], target + ".png")
+                with Image.open(source) as image:
+                    image = image.convert("RGB")
+                    image.thumbnail(THUMBNAIL_SIZE)
+                    tmp_target = target + ".tmp"
+                    image.save(tmp_target, "JPEG", quality=85)
+                    os.replace(tmp_target, target)
+                if source != row["path"]:
+                    os.remove(source)
+            with self.lock:
+                with self._conn() as db:
+                    db.execute("UPDATE media SET thumbnail = ? WHERE sha256 = ?", (target, row["sha256"]))
+        except Exception as e:
+            print(f"Error creating thumbnail for {row['path']}: {e}")
+
+    @staticmethod
+    def _first_frame(video_path, target):
+        import subprocess
+        from services.media_engine import get_ffmpeg_exe
+
+        subprocess.run([get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y", "-i", video_path,
+                        "-frames:v", "1", target], check=True, capture_output=True, timeout=60)
+        return target
+
+_gallery = None
+_gallery_lock = threading.Lock()
+
+def get_gallery():
+    """The shared gallery index at GALLERY_DB_PATH."""
+    global _gallery
+    if _gallery is None:
+        with _gallery_lock:
+            if _gallery is None:
+                _gallery = Gallery()
+    return _gallery
+
+# --- Agent Tools ---
+
+def search_gallery(query: str, user_id: int) -> str:
+    """
+    Finds the user's saved images and videos whose prompt starts with the query (empty: the latest ones).
+
+    Args:
+        query: Beginning of the prompt or project name.
+        user_id: Filled in by the bot.
+    """
+    gallery = get_gallery()
+    rows = gallery.search_prompts(query, user_id=user_id, limit=10) if query.strip() else \
+        gallery.list_user_media(user_id, limit=10)
+    used, quota = gallery.usage(user_id)
+    quota_note = f"{used / 1024 / 1024:.1f} MB" + (f" از {quota / 1024 / 1024:.0f} MB" if quota else "")
+    if not rows:
+        return f"🖼️ چیزی در گالری پیدا نشد. (فضای استفاده‌شده: {quota_note})"
+    lines = [f"🖼️ **گالری ({quota_note}):**"]
+    for row in rows:
+        icon = "🎬" if row["kind"] == "video" else "🖼️"
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["created"]))
+        lines.append(f"{icon} #{row['id']} {row['prompt'] or '—'} ({date})")
+    return "\n".join(lines)
+
+def delete_gallery_item(media_id: int, user_id: int) -> str:
+    """
+    Deletes one of the user's saved images or videos (by its # number from search_gallery) to free quota.
+
+    Args:
+        media_id: The item's number, as shown by search_gallery.
+        user_id: Filled in by the bot.
+    """
+    gallery = get_gallery()
+    if not gallery.remove(int(media_id), user_id):
+        return f"❌ مورد #{media_id} در گالری تو پیدا نشد."
+    used, quota = gallery.usage(user_id)
+    quota_note = f"{used / 1024 / 1024:.1f} MB" + (f" از {quota / 1024 / 1024:.0f} MB" if quota else "")
+    return f"🗑️ مورد #{media_id} از گالری پاک شد. (فضای استفاده‌شده: {quota_note})"
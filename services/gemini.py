@@ -0,0 +1,372 @@
+# services/gemini.py
+import os
+import time
+import random
+import asyncio
+import threading
+
+# --- Resilient Gemini Calls ---
+# Wraps generate_content with:
+#   * retries with full-jitter exponential backoff for transient failures
+#     (429, 5xx, timeouts, dropped connections); other errors are raised at once;
+#   * a circuit breaker per model: after GEMINI_BREAKER_THRESHOLD consecutive
+#     transient failures calls fail fast for GEMINI_BREAKER_COOLDOWN seconds,
+#     then a single probe decides whether it closes again (any answer from the
+#     API, even a 400, closes it; a probe that never settles times out back to
+#     open after another cooldown);
+#   * a fallback model (GEMINI_FALLBACK_MODEL) tried when the requested one is
+#     failing or its breaker is open;
+#   * optional hedging: when the first call to the requested model has not
+#     answered after GEMINI_HEDGE_AFTER seconds a second identical call is
+#     started and the first answer wins (used for the latency-sensitive levels
+#     in GEMINI_HEDGE_LEVELS; retries are never hedged);
+#   * a budget: one generate_content sends at most GEMINI_MAX_REQUESTS paid
+#     requests across retries, hedges and the fallback (one is kept for the
+#     fallback model). A losing sync hedge cannot be cancelled mid-flight, so
+#     it counts against the budget until it returns.
+# GEMINI_BASE_URL points the SDK at another endpoint, e.g. fake_gemini.py.
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 60))  # seconds per request
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", 3))  # per model, first call included
+GEMINI_MAX_REQUESTS = int(os.getenv("GEMINI_MAX_REQUESTS", 4))  # per generate_content, all models
+GEMINI_RETRY_BASE_DELAY = 0.5  # seconds
+GEMINI_RETRY_MAX_DELAY = 8.0  # seconds
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", 5))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", 30))  # seconds
+GEMINI_HEDGE_AFTER = float(os.getenv("GEMINI_HEDGE_AFTER", 4))  # seconds
+GEMINI_HEDGE_LEVELS = [l.strip() for l in os.getenv("GEMINI_HEDGE_LEVELS", "Owner,Gold").split(",") if l.strip()]
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while a model's circuit breaker is open."""
+
+    def __init__(self, model, retry_in):
+        super().__init__(f"Circuit open for {model}; retry in {retry_in:.0f}s")
+        self.model = model
+        self.retry_in = retry_in
+
+def http_options():
+    """HttpOptions for genai.Client: GEMINI_BASE_URL, the request timeout, no SDK-level retries."""
+    from google.genai import types as gemini_types
+
+    options = {"timeout": int(GEMINI_TIMEOUT * 1000)}
+    if GEMINI_BASE_URL:
+        options["base_url"] = GEMINI_BASE_URL
+    return gemini_types.HttpOptions(**options)
+
+def is_transient(error):
+    """Whether retrying (or another model) may succeed: rate limits, server errors, network failures."""
+    from google.genai.errors import APIError
+
+    if isinstance(error, APIError):
+        return error.code in TRANSIENT_STATUS_CODES
+    import httpx
+
+    return isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError, CircuitOpenError))
+
+def backoff_delay(attempt):
+    """Full jitter: uniform in [0, min(max, base * 2^attempt)]."""
+    return random.uniform(0, min(GEMINI_RETRY_MAX_DELAY, GEMINI_RETRY_BASE_DELAY * 2 ** attempt))
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, threshold=GEMINI_BREAKER_THRESHOLD, cooldown=GEMINI_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+        self.trips = 0
+
+    def allow(self):
+        """True if a call may go out now; in half-open state only one probe at a time."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN and now - self.probe_at >= self.cooldown:
+                # The probe never reported back (hung or lost); open again instead of waiting forever
+                self.state = self.OPEN
+                self.opened_at = now
+                return False
+            if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self.probe_at = now
+                return True
+            return False
+
+    def retry_in(self):
+        with self.lock:
+            return max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def release(self):
+        """Ends a probe that finished without a verdict (e.g. cancelled); the next call probes again."""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+_breakers = {}
+_stats = {"calls": 0, "retries": 0, "failures": 0, "fallbacks": 0, "fast_fails": 0, "hedges": 0, "hedge_wins": 0}
+_lock = threading.Lock()
+_hedge_executor = None
+
+def get_breaker(model):
+    with _lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker()
+        return _breakers[model]
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+def get_gemini_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["breakers"] = {model: b.state for model, b in _breakers.items()}
+    return stats
+
+def format_gemini_stats():
+    """One-line summary for the admin dashboard."""
+    stats = get_gemini_stats()
+    breakers = "، ".join(f"{m}: {s}" for m, s in stats["breakers"].items()) or "—"
+    return (f"🤖 **Gemini:** {stats['calls']} فراخوانی | تلاش مجدد {stats['retries']} | "
+            f"مدل جایگزین {stats['fallbacks']} | رد سریع {stats['fast_fails']} | "
+            f"hedge {stats['hedge_wins']}/{stats['hedges']} | خطا {stats['failures']}\n"
+            f"⚡ مدارشکن‌ها: {breakers}")
+
+def should_hedge(level):
+    """Whether calls for a user level are hedged (see GEMINI_HEDGE_LEVELS)."""
+    return level in GEMINI_HEDGE_LEVELS
+
+# --- Client Wrapper ---
+
+class ResilientGemini:
+    """
+    generate_content with retries, circuit breaking, model fallback and
+    optional hedging, around any client exposing `models.generate_content`
+    (and `aio.models.generate_content` for the async variant).
+    """
+
+    def __init__(self, client, fallback_model=GEMINI_FALLBACK_MODEL, hedge=False,
+                 max_attempts=GEMINI_MAX_ATTEMPTS, hedge_after=GEMINI_HEDGE_AFTER, max_requests=GEMINI_MAX_REQUESTS):
+        self.client = client
+        self.fallback_model = fallback_model
+        self.hedge = hedge
+        self.max_attempts = max_attempts
+        self.hedge_after = hedge_after
+        self.max_requests = max_requests
+
+    def _models(self, model):
+        return [model] + ([self.fallback_model] if self.fallback_model and self.fallback_model != model else [])
+
+    # --- Sync ---
+
+    def _call_once(self, model, contents, config):
+        return self.client.models.generate_content(model=model, contents=contents, config=config)
+
+    def _call_hedged(self, model, contents, config, budget):
+        global _hedge_executor
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+        with _lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini-hedge")
+        futures = [_hedge_executor.submit(self._call_once, model, contents, config)]
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            _count("hedges")
+            budget[0] -= 1
+            futures.append(_hedge_executor.submit(self._call_once, model, contents, config))
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if future is not futures[0]:
+                    _count("hedge_wins")
+                for other in pending:
+                    other.cancel()
+                return response
+        raise error
+
+    def _call_with_retries(self, model, contents, config, breaker, budget, reserve, hedge):
+        """Up to max_attempts calls, stopping while `reserve` requests of the budget are still left."""
+        settled = False  # whether the breaker has heard how the call went
+        try:
+            for attempt in range(self.max_attempts):
+                budget[0] -= 1
+                try:
+                    # Only a first attempt is hedged, and only with a request to spare
+                    if hedge and attempt == 0 and budget[0] > reserve:
+                        response = self._call_hedged(model, contents, config, budget)
+                    else:
+                        response = self._call_once(model, contents, config)
+                    breaker.record_success()
+                    settled = True
+                    return response
+                except Exception as e:
+                    if not is_transient(e):
+                        breaker.record_success()  # the API answered; the request itself was rejected
+                        settled = True
+                        raise
+                    breaker.record_failure()
+                    settled = True
+                    last_attempt = attempt == self.max_attempts - 1 or budget[0] <= reserve
+                    if last_attempt or not breaker.allow():
+                        raise
+                    settled = False
+                    _count("retries")
+                    time.sleep(backoff_delay(attempt))
+        finally:
+            if not settled:
+                breaker.release()
+
+    def generate_content(self, model, contents, config=None):
+        """Like client.models.generate_content, falling back to the lighter model when needed."""
+        _count("calls")
+        error = None
+        models = self._models(model)
+        budget = [self.max_requests]  # paid requests left for this call
+        for index, candidate in enumerate(models):
+            reserve = len(models) - index - 1
+            if budget[0] <= reserve:
+                continue  # nothing left for this model beyond what the later ones need
+            breaker = get_breaker(candidate)
+            if not breaker.allow():
+                _count("fast_fails")
+                error = CircuitOpenError(candidate, breaker.retry_in())
+                continue
+            try:
+                response = self._call_with_retries(candidate, contents, config, breaker, budget, reserve,
+                                                   hedge=self.hedge and index == 0)
+            except Exception as e:
+                if not is_transient(e):
+                    _count("failures")
+                    raise
+                print(f"Gemini call to {candidate} failed: {e}")
+                error = e
+                continue
+            if candidate != model:
+                _count("fallbacks")
+            return response
+        _count("failures")
+        raise error
+
+    # --- Async ---
+
+    async def _acall_once(self, model, contents, config):
+        return await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+
+    async def _acall_hedged(self, model, contents, config, budget):
+        first = asyncio.ensure_future(self._acall_once(model, contents, config))
+        tasks = [first]
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+        if not done:
+            _count("hedges")
+            budget[0] -= 1
+            tasks.append(asyncio.ensure_future(self._acall_once(model, contents, config)))
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is not first:
+                        _count("hedge_wins")
+                    return task.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _acall_with_retries(self, model, contents, config, breaker, budget, reserve, hedge):
+        settled = False
+        try:
+            for attempt in range(self.max_attempts):
+                budget[0] -= 1
+                try:
+                    if hedge and attempt == 0 and budget[0] > reserve:
+                        response = await self._acall_hedged(model, contents, config, budget)
+                    else:
+                        response = await self._acall_once(model, contents, config)
+                    breaker.record_success()
+                    settled = True
+                    return response
+                except Exception as e:
+                    if not is_transient(e):
+                        breaker.record_success()
+                        settled = True
+                        raise
+                    breaker.record_failure()
+                    settled = True
+                    last_attempt = attempt == self.max_attempts - 1 or budget[0] <= reserve
+                    if last_attempt or not breaker.allow():
+                        raise
+                    settled = False
+                    _count("retries")
+                    await asyncio.sleep(backoff_delay(attempt))
+        finally:
+            # CancelledError is not an Exception; a cancelled probe must not leave the breaker half-open
+            if not settled:
+                breaker.release()
+
+    async def agenerate_content(self, model, contents, config=None):
+        """Async twin of generate_content (client.aio)."""
+        _count("calls")
+        error = None
+        models = self._models(model)
+        budget = [self.max_requests]
+        for index, candidate in enumerate(models):
+            reserve = len(models) - index - 1
+            if budget[0] <= reserve:
+                continue
+            breaker = get_breaker(candidate)
+            if not breaker.allow():
+                _count("fast_fails")
+                error = CircuitOpenError(candidate, breaker.retry_in())
+                continue
+            try:
+                response = await self._acall_with_retries(candidate, contents, config, breaker, budget, reserve,
+                                                          hedge=self.hedge and index == 0)
+            except Exception as e:
+                if not is_transient(e):
+                    _count("failures")
+                    raise
+                print(f"Gemini call to {candidate} failed: {e}")
+                error = e
+                continue
+            if candidate != model:
+                _count("fallbacks")
+            return response
+        _count("failures")
+        raise error
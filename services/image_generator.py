@@ -1,14 +1,14 @@
 import os
-import requests
 from datetime import datetime
 
-def save_generated_image(image_url: str, prompt: str) -> str:
+def save_generated_image(image_url: str, prompt: str, user_id: int = None) -> str:
     """
     Saves a generated image from a URL to the local filesystem.
     
     Args:
         image_url: The URL of the image to download.
         prompt: The prompt used to generate the image, used for file naming.
+        user_id: When given, the image is added to the user's gallery index (and counts toward their quota).
         
     Returns:
         The full path to the saved image file, or None if saving failed.
@@ -26,6 +26,8 @@ def save_generated_image(image_url: str, prompt: str) -> str:
     file_name = f"{timestamp}_{safe_prompt[:20].replace(' ', '_')}.jpg"
     full_path = os.path.join(save_path, file_name)
     
+    import requests
+
     # دانلود و ذخیره عکس
     try:
         response = requests.get(image_url, stream=True)
@@ -33,6 +35,12 @@ def save_generated_image(image_url: str, prompt: str) -> str:
             with open(full_path, 'wb') as f:
                 for chunk in response.iter_content(1024):
                     f.write(chunk)
+            if user_id is not None:
+                from services.gallery import get_gallery, GalleryQuotaError
+                try:
+                    get_gallery().add(full_path, user_id, prompt, "image")
+                except GalleryQuotaError as e:
+                    return f"Error: {e}"
             return full_path
         return f"Error: Could not download image. Status code: {response.status_code}"
     except Exception as e:
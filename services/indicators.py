@@ -0,0 +1,242 @@
+# services/indicators.py
+import time
+import threading
+import numpy as np
+
+# --- Technical Indicator Engine ---
+# OHLCV candles live in NumPy ring buffers, one row per symbol. Every
+# indicator keeps running state (sums, EMAs, Wilder averages), so a new
+# candle costs O(1) per symbol, and all symbols that receive a candle in the
+# same tick are updated together with vectorized array operations.
+
+FIELDS = ("open", "high", "low", "close", "volume")
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(FIELDS))
+
+# Running sums drift with floating-point error; they are recomputed exactly
+# from the ring buffer after this many updates.
+RESYNC_EVERY = 1000
+
+class IndicatorEngine:
+    """SMA, EMA, RSI, MACD, Bollinger Bands and ATR for many symbols of one interval."""
+
+    def __init__(self, capacity=500, sma_period=20, ema_period=20, rsi_period=14,
+                 macd_periods=(12, 26, 9), bb_period=20, bb_k=2.0, atr_period=14):
+        self.sma_period = sma_period
+        self.ema_period = ema_period
+        self.rsi_period = rsi_period
+        self.macd_fast, self.macd_slow, self.macd_signal_period = macd_periods
+        self.bb_period = bb_period
+        self.bb_k = bb_k
+        self.atr_period = atr_period
+        self.capacity = max(capacity, sma_period, bb_period) + 1
+
+        self.symbols = {}
+        self.lock = threading.Lock()
+        self._updates_since_resync = 0
+        self._allocate(0)
+
+    # --- Storage ---
+
+    def _allocate(self, n):
+        self.candles = np.zeros((len(FIELDS), n, self.capacity))
+        self.times = np.zeros(n, dtype=np.int64)       # open time of the last candle
+        self.count = np.zeros(n, dtype=np.int64)       # candles seen (not capped)
+        self.head = np.zeros(n, dtype=np.int64)        # next write position in the ring
+        self.state = {name: np.zeros(n) for name in (
+            "sma_sum", "bb_sum", "bb_sumsq", "ema", "ema_fast", "ema_slow",
+            "macd_signal", "avg_gain", "avg_loss", "atr", "prev_close",
+        )}
+
+    def _grow(self, n):
+        old = len(self.times)
+        self.candles = np.concatenate([self.candles, np.zeros((len(FIELDS), n - old, self.capacity))], axis=1)
+        self.times = np.concatenate([self.times, np.zeros(n - old, dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(n - old, dtype=np.int64)])
+        self.head = np.concatenate([self.head, np.zeros(n - old, dtype=np.int64)])
+        for name, values in self.state.items():
+            self.state[name] = np.concatenate([values, np.zeros(n - old)])
+
+    def rows_for(self, symbols):
+        """Row indexes for symbols, registering new ones (arrays grow geometrically)."""
+        new = [s for s in symbols if s not in self.symbols]
+        if new:
+            needed = len(self.symbols) + len(new)
+            if needed > len(self.times):
+                self._grow(max(needed, 2 * len(self.times), 16))
+            for symbol in new:
+                self.symbols[symbol] = len(self.symbols)
+        return np.array([self.symbols[s] for s in symbols], dtype=np.int64)
+
+    def _window_value(self, field, rows, lag):
+        """Value `lag` candles before the newest one (lag=0 is the newest)."""
+        return self.candles[field, rows, (self.head[rows] - 1 - lag) % self.capacity]
+
+    # --- Incremental Update ---
+
+    def update(self, symbols, candles, times=None):
+        """
+        Appends one closed candle per symbol and advances every indicator.
+
+        Args:
+            symbols: Sequence of symbol names (each at most once per call).
+            candles: Array-like of shape (len(symbols), 5) with open, high, low, close, volume.
+            times: Optional open times; candles not newer than the stored one are ignored.
+        """
+        candles = np.asarray(candles, dtype=np.float64).reshape(len(symbols), len(FIELDS))
+        rows = self.rows_for(symbols)
+        if times is not None:
+            times = np.asarray(times, dtype=np.int64)
+            fresh = (times > self.times[rows]) | (self.count[rows] == 0)
+            rows, candles, times = rows[fresh], candles[fresh], times[fresh]
+            self.times[rows] = times
+        if not len(rows):
+            return
+
+        st = self.state
+        close, high, low = candles[:, CLOSE], candles[:, HIGH], candles[:, LOW]
+        first = self.count[rows] == 0
+        prev_close = np.where(first, close, st["prev_close"][rows])
+
+        # Ring buffer write
+        self.candles[:, rows, self.head[rows]] = candles.T
+        self.head[rows] = (self.head[rows] + 1) % self.capacity
+        self.count[rows] += 1
+        n = self.count[rows]
+
+        # SMA and Bollinger: add the new close, drop the one leaving the window
+        dropped_sma = np.where(n > self.sma_period, self._window_value(CLOSE, rows, self.sma_period), 0.0)
+        st["sma_sum"][rows] += close - dropped_sma
+        dropped_bb = np.where(n > self.bb_period, self._window_value(CLOSE, rows, self.bb_period), 0.0)
+        st["bb_sum"][rows] += close - dropped_bb
+        st["bb_sumsq"][rows] += close * close - dropped_bb * dropped_bb
+
+        # EMAs (seeded with the first close)
+        def ema(name, period, value):
+            alpha = 2.0 / (period + 1)
+            st[name][rows] = np.where(first, value, st[name][rows] + alpha * (value - st[name][rows]))
+
+        ema("ema", self.ema_period, close)
+        ema("ema_fast", self.macd_fast, close)
+        ema("ema_slow", self.macd_slow, close)
+        ema("macd_signal", self.macd_signal_period, st["ema_fast"][rows] - st["ema_slow"][rows])
+
+        # Wilder smoothing: plain mean for the first `period` values, then (avg*(p-1)+x)/p
+        def wilder(name, period, value, samples):
+            avg = st[name][rows]
+            weight = np.where(samples <= period, 1.0 / np.maximum(samples, 1), 1.0 / period)
+            st[name][rows] = np.where(samples > 0, avg + weight * (value - avg), avg)
+
+        delta = close - prev_close
+        wilder("avg_gain", self.rsi_period, np.maximum(delta, 0.0), n - 1)
+        wilder("avg_loss", self.rsi_period, np.maximum(-delta, 0.0), n - 1)
+        true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+        wilder("atr", self.atr_period, true_range, n)
+
+        st["prev_close"][rows] = close
+
+        self._updates_since_resync += len(rows)
+        if self._updates_since_resync >= RESYNC_EVERY * max(len(self.symbols), 1):
+            self.resync()
+
+    def load(self, symbol, candles, times=None):
+        """Feeds a history of candles (oldest first) for one symbol."""
+        candles = np.asarray(candles, dtype=np.float64)
+        for i in range(len(candles)):
+            self.update([symbol], candles[i:i + 1], None if times is None else [times[i]])
+
+    def resync(self):
+        """Recomputes the windowed running sums exactly from the ring buffers."""
+        rows = np.arange(len(self.symbols))
+        if not len(rows):
+            return
+        for name, period in (("sma_sum", self.sma_period), ("bb_sum", self.bb_period)):
+            window = np.stack([self._window_value(CLOSE, rows, lag) for lag in range(period)])
+            valid = np.arange(period)[:, None] < self.count[rows][None, :]
+            self.state[name][rows] = np.where(valid, window, 0.0).sum(axis=0)
+            if name == "bb_sum":
+                self.state["bb_sumsq"][rows] = np.where(valid, window * window, 0.0).sum(axis=0)
+        self._updates_since_resync = 0
+
+    # --- Read-out ---
+
+    def snapshot(self, symbol):
+        """
+        Current indicator values for a symbol.
+
+        Returns:
+            A dict of indicator -> value (None while the window is not full yet), or None for unknown symbols.
+        """
+        if symbol not in self.symbols:
+            return None
+        row = self.symbols[symbol]
+        st = {name: float(values[row]) for name, values in self.state.items()}
+        n = int(self.count[row])
+
+        def ready(period):
+            return n >= period
+
+        bb_n = min(n, self.bb_period)
+        bb_mid = st["bb_sum"] / bb_n if bb_n else 0.0
+        bb_std = float(np.sqrt(max(st["bb_sumsq"] / bb_n - bb_mid * bb_mid, 0.0))) if bb_n else 0.0
+        macd = st["ema_fast"] - st["ema_slow"]
+        if st["avg_loss"] == 0:
+            rsi = 100.0 if st["avg_gain"] > 0 else 50.0
+        else:
+            rsi = 100.0 - 100.0 / (1.0 + st["avg_gain"] / st["avg_loss"])
+
+        return {
+            "close": st["prev_close"],
+            "candles": n,
+            "sma": st["sma_sum"] / self.sma_period if ready(self.sma_period) else None,
+            "ema": st["ema"] if ready(self.ema_period) else None,
+            "rsi": rsi if ready(self.rsi_period + 1) else None,
+            "macd": macd if ready(self.macd_slow) else None,
+            "macd_signal": st["macd_signal"] if ready(self.macd_slow + self.macd_signal_period) else None,
+            "macd_hist": macd - st["macd_signal"] if ready(self.macd_slow + self.macd_signal_period) else None,
+            "bb_upper": bb_mid + self.bb_k * bb_std if ready(self.bb_period) else None,
+            "bb_middle": bb_mid if ready(self.bb_period) else None,
+            "bb_lower": bb_mid - self.bb_k * bb_std if ready(self.bb_period) else None,
+            "atr": st["atr"] if ready(self.atr_period) else None,
+        }
+
+# --- Benchmark ---
+
+def benchmark_indicators(n_symbols=2000, n_ticks=200, seed=0):
+    """
+    Refreshes all indicators of `n_symbols` random-walk symbols for `n_ticks` candles.
+
+    Returns:
+        A dict with the elapsed time and symbol / symbol-indicator updates per second.
+    """
+    rng = np.random.default_rng(seed)
+    engine = IndicatorEngine()
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    close = np.full(n_symbols, 100.0)
+    ticks = []
+    for _ in range(n_ticks):
+        new_close = close * (1.0 + rng.normal(0, 0.01, n_symbols))
+        spread = np.abs(rng.normal(0, 0.005, n_symbols)) * new_close
+        ticks.append(np.column_stack([close, np.maximum(close, new_close) + spread,
+                                      np.minimum(close, new_close) - spread, new_close,
+                                      rng.uniform(1, 1000, n_symbols)]))
+        close = new_close
+
+    start = time.perf_counter()
+    for candles in ticks:
+        engine.update(symbols, candles)
+    elapsed = time.perf_counter() - start
+
+    indicators_per_symbol = 6  # SMA, EMA, RSI, MACD, Bollinger, ATR
+    return {
+        "symbols": n_symbols,
+        "ticks": n_ticks,
+        "seconds": elapsed,
+        "symbol_updates_per_sec": n_symbols * n_ticks / elapsed,
+        "pairs_per_sec": n_symbols * n_ticks * indicators_per_symbol / elapsed,
+    }
+
+if __name__ == "__main__":
+    for n in (100, 1000, 5000):
+        result = benchmark_indicators(n_symbols=n)
+        print(f"{n:>5} symbols x {result['ticks']} ticks: {result['seconds'] * 1000:8.1f} ms  "
+              f"{result['pairs_per_sec']:>14,.0f} symbol/indicator pairs per second")
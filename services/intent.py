@@ -0,0 +1,129 @@
+# services/intent.py
+import re
+import threading
+import importlib
+from collections import Counter
+from services.text import normalize_fa
+
+# --- Local Intent Fast Path ---
+# Some service modules answer from canned knowledge (legal articles, prices).
+# When a message clearly belongs to one of them it is answered locally,
+# without a Gemini round trip; everything else falls back to the model.
+# Only handlers that return a complete answer belong here: the writer, for
+# instance, only acknowledges the request, so writing is left to the model.
+
+# intent -> handler module/function, keyword weights, confidence threshold.
+# A message's confidence for an intent is the noisy-OR of its matched keyword
+# weights, so one strong keyword or several weak ones can cross the threshold.
+INTENTS = {
+    "legal": {
+        "handler": ("services.legal", "handle_legal_request"),
+        "threshold": 0.8,
+        "keywords": {
+            "ارث": 0.9, "میراث": 0.9, "مهریه": 0.9, "طلاق": 0.8,
+            "سفته": 0.8, "چک برگشتی": 0.9, "چک": 0.5,
+            "قانون": 0.3, "حقوقی": 0.4, "دادگاه": 0.4,
+        },
+    },
+    "trader": {
+        "handler": ("services.trader", "handle_trader_request"),
+        "threshold": 0.9,
+        "keywords": {
+            "قیمت": 0.6, "price": 0.6,
+            "بیت": 0.8, "btc": 0.8, "اتریوم": 0.8, "eth": 0.8,
+        },
+    },
+}
+
+# Persian suffixes (plural, possessive, indefinite/adjectival) allowed after a keyword
+KEYWORD_SUFFIXES = ("ها", "های", "هایی", "ی", "ای", "م", "ت", "ش", "ام", "ات", "اش", "مان", "تان", "شان")
+
+# The winning intent must beat the runner-up by this much to be answered locally
+MIN_MARGIN = 0.2
+
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+def _build_index():
+    """Compiles every keyword of every intent into one alternation regex."""
+    keyword_map = {}
+    for intent, spec in INTENTS.items():
+        for keyword, weight in spec["keywords"].items():
+            keyword_map.setdefault(normalize_fa(keyword), []).append((intent, weight))
+    # Longest first, so "چک برگشتی" wins over "چک"; keywords must be whole words, optionally
+    # with a Persian suffix ("قیمتش", "چک‌های" after normalization), so "eth" misses "ethics"
+    alternation = "|".join(re.escape(k) for k in sorted(keyword_map, key=len, reverse=True))
+    suffixes = "|".join(sorted(KEYWORD_SUFFIXES, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)({alternation})(?:{suffixes})?(?!\w)"), keyword_map
+
+_KEYWORD_PATTERN, _KEYWORD_MAP = _build_index()
+
+def classify_intent(text):
+    """
+    Scores a message against every local intent.
+
+    Returns:
+        A dict of intent -> confidence (0..1) for intents with at least one keyword hit.
+    """
+    normalized = normalize_fa(text)
+    matched = {}
+    for match in _KEYWORD_PATTERN.finditer(normalized):
+        for intent, weight in _KEYWORD_MAP[match.group(1)]:
+            matched.setdefault(intent, {})[match.group(1)] = weight
+
+    scores = {}
+    for intent, weights in matched.items():
+        miss = 1.0
+        for weight in weights.values():
+            miss *= 1.0 - weight
+        scores[intent] = 1.0 - miss
+    return scores
+
+def answer_locally(text):
+    """
+    Answers a message from a service module when one intent is confident enough.
+
+    Returns:
+        The service's answer, or None when the message should go to the model.
+    """
+    scores = classify_intent(text)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    with _stats_lock:
+        _stats["checked"] += 1
+        if not ranked:
+            _stats["no_match"] += 1
+            return None
+
+    intent, confidence = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+    if confidence < INTENTS[intent]["threshold"] or confidence - runner_up < MIN_MARGIN:
+        with _stats_lock:
+            _stats[f"fallback:{intent}"] += 1
+        return None
+
+    module_name, function_name = INTENTS[intent]["handler"]
+    handler = getattr(importlib.import_module(module_name), function_name)
+    with _stats_lock:
+        _stats[f"hit:{intent}"] += 1
+    return handler(text)
+
+def get_intent_stats():
+    """Returns a snapshot of the fast-path counters."""
+    with _stats_lock:
+        return dict(_stats)
+
+def format_intent_stats():
+    """Formats per-intent hit rates for the admin dashboard."""
+    stats = get_intent_stats()
+    checked = stats.get("checked", 0)
+    if not checked:
+        return "⚡ **مسیر سریع محلی:** هنوز پیامی بررسی نشده است."
+
+    hits = sum(stats.get(f"hit:{intent}", 0) for intent in INTENTS)
+    lines = [f"⚡ **مسیر سریع محلی:** {hits} از {checked} پیام بدون جمینای پاسخ داده شد ({hits / checked:.0%})"]
+    for intent in INTENTS:
+        hit = stats.get(f"hit:{intent}", 0)
+        fallback = stats.get(f"fallback:{intent}", 0)
+        lines.append(f"🔹 {intent}: {hit} پاسخ محلی ({hit / checked:.0%})، {fallback} ارجاع به مدل")
+    return "\n".join(lines)
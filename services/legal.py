@@ -1,27 +1,28 @@
-def handle_legal_request(text):
-    text = text.lower()
-    
-    # پاسخ‌های از پیش تعیین شده برای سوالات متداول حقوقی ایران
-    if "ارث" in text or "میراث" in text:
-        return (
-            "⚖️ **مبحث ارث در حقوق ایران:**\n"
-            "طبق قانون مدنی ایران، ارث بر اساس طبقات سه‌گانه تقسیم می‌شود. "
-            "طبقه اول شامل والدین و اولاد و اولادِ اولاد است. تا زمانی که یک نفر از طبقه اول باشد، طبقات بعدی ارث نمی‌برند."
-        )
-    
-    if "مهریه" in text or "طلاق" in text:
-        return (
-            "⚖️ **حقوق خانواده:**\n"
-            "در حقوق ایران، مهریه حق قانونی زوجه است و به محض عقد مالک آن می‌شود. "
-            "طلاق نیز بر اساس مواد ۱۱۳۳ به بعد قانون مدنی و قانون حمایت از خانواده بررسی می‌شود."
-        )
 
-    if "چک" in text or "سفته" in text:
-        return (
-            "⚖️ **اسناد تجاری:**\n"
-            "قانون جدید چک (مصوب ۱۳۹۷) الزامات ثبت در سامانه صیاد را اجباری کرده است. "
-            "چک‌های صیادی بدون ثبت در سامانه، مشمول مزایای قانون صدور چک نخواهند بود."
-        )
+# Minimum BM25 score of the best article; weaker matches are not worth citing
+MIN_SCORE = 2.0
+TOP_ARTICLES = 3
+MAX_ARTICLE_CHARS = 600
+
+def handle_legal_request(text: str) -> str:
+    """Answers questions about Iranian law (civil, family and commercial code) by citing the relevant articles."""
+    from services.legal_index import get_legal_index
+
+    try:
+        results = get_legal_index().search(text, top_k=TOP_ARTICLES)
+    except Exception as e:
+        print(f"Error searching legal index: {e}")
+        results = []
+
+    if results and results[0][0] >= MIN_SCORE:
+        lines = ["⚖️ **مواد قانونی مرتبط:**"]
+        for _, article in results:
+            body = article["text"]
+            if len(body) > MAX_ARTICLE_CHARS:
+                body = body[:MAX_ARTICLE_CHARS].rsplit(" ", 1)[0] + " …"
+            lines.append(f"📜 **ماده {article['article']} {article['law']}:**\n{body}")
+        lines.append("ℹ️ این متن جنبه اطلاع‌رسانی دارد؛ برای پرونده مشخص با وکیل مشورت کنید.")
+        return "\n\n".join(lines)
 
     return (
         "⚖️ **دستیار حقوقی ایران:**\n"
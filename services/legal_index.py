@@ -0,0 +1,233 @@
+# services/legal_index.py
+import os
+import re
+import json
+import math
+import tempfile
+import threading
+import numpy as np
+from services.text import normalize_fa
+
+# --- Legal Knowledge Index (BM25) ---
+# Articles of Iranian law (data/legal_articles.json) are tokenized into an
+# inverted index that is written once to a compact binary file and
+# memory-mapped when loaded; a query only touches the posting lists of its
+# own terms, so answers take milliseconds and cite the exact article.
+#
+# File layout: 8-byte magic, uint32 header length, JSON header (counts, BM25
+# parameters and section offsets), then 8-byte aligned little-endian arrays.
+#
+# Rebuild after editing the articles with: python -m services.legal_index
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+LEGAL_ARTICLES_PATH = os.getenv("LEGAL_ARTICLES_PATH", os.path.join(_DATA_DIR, "legal_articles.json"))
+LEGAL_INDEX_PATH = os.getenv("LEGAL_INDEX_PATH", os.path.join(_DATA_DIR, "legal_index.bin"))
+
+MAGIC = b"LBM25v2\0"  # bumped when tokenization changes, so older files are rebuilt
+K1, B = 1.5, 0.75
+
+STOPWORDS = {
+    "و", "در", "به", "از", "که", "این", "آن", "را", "با", "است", "برای", "یا", "تا", "هر", "بر",
+    "اگر", "باید", "می", "شود", "میشود", "نیز", "آنها", "او", "خود", "یک", "دیگر", "باشد", "بود",
+    "کند", "کرد", "چه", "چی", "چیه", "چطور", "چگونه", "آیا", "من", "ما", "شما", "هست", "نه",
+    "طبق", "مورد", "ذیل", "مگر", "اینکه", "بعد", "قبل", "وقتی", "چون", "اما", "ولی",
+    "میشه", "میشود", "کی", "کجا", "چقدر", "چند", "داره", "دارد", "بگو",
+    # suffixes written after a ZWNJ ("ماده‌های") come out as separate tokens
+    "ها", "های", "هایی", "ای", "ام", "اش", "ات",
+}
+# Everyday words in questions -> the terms the law itself uses (added to the query)
+QUERY_SYNONYMS = {
+    "مهریه": ["مهر"], "زن": ["زوجه"], "همسر": ["زوجه", "زوج"], "شوهر": ["زوج"],
+    "بچه": ["طفل", "اولاد"], "فرزند": ["طفل", "اولاد"], "سهم": ["فرض"],
+    "ارث": ["ترکه", "وارث"], "میراث": ["ارث", "ترکه"], "قرارداد": ["عقد", "معامله"],
+    "خرید": ["بیع"], "فروش": ["بیع"], "اجاره": ["مستاجر", "موجر"], "کرایه": ["اجاره"],
+    "خسارت": ["ضامن", "تلف"], "سفته": ["فته"], "بدهی": ["دیون"], "وام": ["قرض"],
+}
+# Plural and adjective suffixes, longest first; applied identically to articles and queries
+_SUFFIXES = ("هایی", "های", "ها", "ات", "ان", "ی")
+_TOKEN = re.compile(r"\w+")
+
+_SECTIONS = (
+    ("doc_len", "<u4"),
+    ("term_offsets", "<u4"),
+    ("terms", "u1"),
+    ("posting_offsets", "<u4"),
+    ("post_docs", "<u4"),
+    ("post_tfs", "<u2"),
+    ("doc_offsets", "<u4"),
+    ("docs", "u1"),
+)
+
+def _stem(token):
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+def tokenize(text):
+    """Normalized, light-stemmed index terms of a Persian/English text."""
+    tokens = []
+    for token in _TOKEN.findall(normalize_fa(text)):
+        if token in STOPWORDS or (len(token) < 2 and not token.isdigit()):
+            continue
+        tokens.append(_stem(token))
+    return tokens
+
+# --- Building ---
+
+def build_index(articles_path=LEGAL_ARTICLES_PATH, index_path=LEGAL_INDEX_PATH):
+    """
+    Tokenizes every article and writes the binary index (atomic rename).
+
+    Returns:
+        The number of indexed articles.
+    """
+    with open(articles_path, 'r', encoding='utf-8') as f:
+        articles = json.load(f)
+
+    postings = {}  # term -> {doc_id: tf}
+    doc_len = []
+    for doc_id, article in enumerate(articles):
+        tokens = tokenize(f"{article['law']} ماده {article['article']} {article['text']}")
+        doc_len.append(len(tokens))
+        for token in tokens:
+            counts = postings.setdefault(token, {})
+            counts[doc_id] = counts.get(doc_id, 0) + 1
+
+    terms = sorted(postings)
+    encoded_terms = [t.encode("utf-8") for t in terms]
+    encoded_docs = [json.dumps(a, ensure_ascii=False).encode("utf-8") for a in articles]
+    post_docs, post_tfs, posting_offsets = [], [], [0]
+    for term in terms:
+        for doc_id, tf in sorted(postings[term].items()):
+            post_docs.append(doc_id)
+            post_tfs.append(min(tf, 0xFFFF))
+        posting_offsets.append(len(post_docs))
+
+    arrays = {
+        "doc_len": doc_len,
+        "term_offsets": np.cumsum([0] + [len(t) for t in encoded_terms]),
+        "terms": np.frombuffer(b"".join(encoded_terms), dtype="u1"),
+        "posting_offsets": posting_offsets,
+        "post_docs": post_docs,
+        "post_tfs": post_tfs,
+        "doc_offsets": np.cumsum([0] + [len(d) for d in encoded_docs]),
+        "docs": np.frombuffer(b"".join(encoded_docs), dtype="u1"),
+    }
+    blobs, sections, offset = [], {}, 0
+    for name, dtype in _SECTIONS:
+        data = np.asarray(arrays[name], dtype=dtype).tobytes()
+        sections[name] = [offset, len(data)]
+        padding = -len(data) % 8
+        blobs.append(data + b"\0" * padding)
+        offset += len(data) + padding
+
+    header = json.dumps({
+        "n_docs": len(articles), "n_terms": len(terms), "avgdl": sum(doc_len) / max(len(doc_len), 1),
+        "k1": K1, "b": B, "sections": sections,
+    }).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+    # A private temp file per build: workers building at the same cold start never write into each other's file
+    directory = os.path.dirname(index_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(index_path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(4, "little"))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return len(articles)
+
+# --- Searching ---
+
+class LegalIndex:
+    """Read-only BM25 index backed by a memory-mapped file."""
+
+    def __init__(self, path=LEGAL_INDEX_PATH):
+        raw = np.memmap(path, dtype="u1", mode="r")
+        if bytes(raw[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"not a legal index file: {path}")
+        header_len = int.from_bytes(bytes(raw[len(MAGIC):len(MAGIC) + 4]), "little")
+        base = len(MAGIC) + 4
+        meta = json.loads(bytes(raw[base:base + header_len]))
+        base += header_len
+
+        self.n_docs = meta["n_docs"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.k1, self.b = meta["k1"], meta["b"]
+        for name, dtype in _SECTIONS:
+            start, size = meta["sections"][name]
+            setattr(self, name, raw[base + start:base + start + size].view(dtype))
+
+        # The term dictionary is the only part decoded up front
+        terms_blob = bytes(self.terms)
+        offsets = self.term_offsets
+        self.term_ids = {terms_blob[offsets[i]:offsets[i + 1]].decode("utf-8"): i
+                         for i in range(meta["n_terms"])}
+
+    def article(self, doc_id):
+        start, end = self.doc_offsets[doc_id], self.doc_offsets[doc_id + 1]
+        return json.loads(bytes(self.docs[start:end]))
+
+    def search(self, query, top_k=3):
+        """
+        Ranks articles against `query` with BM25.
+
+        Returns:
+            A list of (score, article dict), best first; only articles sharing a term with the query.
+        """
+        terms = set(tokenize(query))
+        for term in list(terms):
+            terms.update(tokenize(" ".join(QUERY_SYNONYMS.get(term, []))))
+
+        scores = np.zeros(self.n_docs)
+        for term in terms:
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.posting_offsets[term_id], self.posting_offsets[term_id + 1]
+            docs = self.post_docs[start:end]
+            tfs = self.post_tfs[start:end].astype(np.float64)
+            df = end - start
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        best = matched[np.argsort(-scores[matched], kind="stable")[:top_k]]
+        return [(float(scores[i]), self.article(int(i))) for i in best]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_legal_index():
+    """The shared index; (re)built first when missing or older than the articles file."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                stale = (not os.path.exists(LEGAL_INDEX_PATH) or (
+                    os.path.exists(LEGAL_ARTICLES_PATH)
+                    and os.path.getmtime(LEGAL_ARTICLES_PATH) > os.path.getmtime(LEGAL_INDEX_PATH)))
+                if stale:
+                    build_index()
+                try:
+                    _index = LegalIndex()
+                except ValueError:  # written by an older version
+                    build_index()
+                    _index = LegalIndex()
+    return _index
+
+if __name__ == "__main__":
+    count = build_index()
+    print(f"Indexed {count} articles -> {LEGAL_INDEX_PATH} ({os.path.getsize(LEGAL_INDEX_PATH):,} bytes)")
@@ -1,12 +1,11 @@
 import os
-import requests
-from datetime import datetime
-from moviepy.editor import ImageSequenceClip
 import time
+import hashlib
+import threading
 
 # تنظیمات هارد ۱ ترابایتی محمد عزیز
 # یادت باشه ویندوزت که بالا اومد، اگه اسم درایو هاردت چیزی غیر از D بود، این رو عوض کن
-BASE_PATH = "D:/my_ai_bot"
+BASE_PATH = os.getenv("MEDIA_BASE_PATH", "D:/my_ai_bot")
 GALLERY_PATH = os.path.join(BASE_PATH, "gallery")
 VIDEO_PATH = os.path.join(BASE_PATH, "videos")
 
@@ -16,45 +15,277 @@ def setup_folders():
         if not os.path.exists(path):
             os.makedirs(path)
 
+# --- دانلود همزمان تصاویر ---
+# چند دانلود همزمان (حداکثر DOWNLOAD_WORKERS) روی یک Session مشترک؛ هر فایل
+# تکه‌تکه روی دیسک نوشته می‌شود، با rename اتمی جایگزین می‌شود و با هش محتوا
+# نام‌گذاری می‌شود تا تصویر تکراری فقط یک بار ذخیره شود.
+DOWNLOAD_WORKERS = int(os.getenv("MEDIA_DOWNLOAD_WORKERS", 16))
+DOWNLOAD_TIMEOUT = 15  # ثانیه
+CHUNK_SIZE = 64 * 1024
+CONTENT_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Session مشترک با connection pool به اندازه تعداد دانلودهای همزمان"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def download_image(url, dest_dir=GALLERY_PATH):
+    """
+    دانلود استریمی یک تصویر با هش‌گیری همزمان.
+
+    Returns:
+        دیکشنری شامل url، path، bytes، seconds و duplicate (اگر همین محتوا قبلاً ذخیره شده بود).
+    """
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(dest_dir, f".download_{os.urandom(6).hex()}.tmp")
+    try:
+        with get_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+
+        extension = CONTENT_TYPES.get(content_type) or os.path.splitext(url.split("?")[0])[1].lower() or ".jpg"
+        path = os.path.join(dest_dir, f"{digest.hexdigest()[:32]}{extension}")
+        duplicate = os.path.exists(path)
+        if duplicate:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {"url": url, "path": path, "bytes": size, "seconds": time.perf_counter() - started, "duplicate": duplicate}
+
+def download_images(urls, dest_dir=GALLERY_PATH):
+    """
+    دانلود همزمان چند تصویر؛ زمان کل نزدیک به کندترین دانلود است نه مجموع آن‌ها.
+
+    Returns:
+        لیستی هم‌ترتیب با urls؛ برای دانلودهای ناموفق None.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not urls:
+        return []
+    os.makedirs(dest_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    def fetch(item):
+        i, url = item
+        try:
+            result = download_image(url, dest_dir)
+        except Exception as e:
+            print(f"خطا در دانلود تصویر {i}: {e}")
+            return None
+        note = " (تکراری)" if result["duplicate"] else ""
+        print(f"تصویر {i+1} در {result['seconds']:.2f} ثانیه ذخیره شد ({result['bytes']:,} بایت){note}: {result['path']}")
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(urls))) as pool:
+        results = list(pool.map(fetch, enumerate(urls)))
+    print(f"{sum(r is not None for r in results)}/{len(urls)} تصویر در {time.perf_counter() - started:.2f} ثانیه دانلود شد")
+    return results
+
+def new_video_path(project_name):
+    """مسیر فایل خروجی یک پروژه در پوشه ویدیوها"""
+    return os.path.join(VIDEO_PATH, f"{project_name}_{int(time.time())}.mp4")
+
+def _progress_logger(progress):
+    """لاگر proglog که پیشرفت رندر MoviePy را به صورت کسری بین ۰ و ۱ به progress می‌دهد"""
+    from proglog import ProgressBarLogger
+
+    class ProgressLogger(ProgressBarLogger):
+        def bars_callback(self, bar, attr, value, old_value=None):
+            total = self.bars[bar].get("total")
+            if attr == "index" and total:
+                progress(min(value / total, 1.0))
+
+    return ProgressLogger()
+
+# --- رندر ویدیو ---
+# دو حالت رندر (RENDER_MODE):
+#   slideshow: تصاویر در یک pool موازی به اندازه نهایی تغییر اندازه می‌دهند و با
+#              concat demuxer به ffmpeg داده می‌شوند؛ هر تصویر فقط یک فریم با
+#              مدت نمایش خودش است (بدون تکرار فریم و بدون نگه‌داشتن همه تصاویر در رم).
+#   moviepy:   روش قبلی با ImageSequenceClip (هر تصویر ۴۸ فریم یکسان در ۲۴fps).
+RENDER_MODE = os.getenv("RENDER_MODE", "slideshow")
+SECONDS_PER_IMAGE = 2
+SLIDESHOW_SIZE = tuple(int(v) for v in os.getenv("SLIDESHOW_SIZE", "1280x720").split("x"))
+RESIZE_WORKERS = int(os.getenv("RESIZE_WORKERS", os.cpu_count() or 2))
+
+def get_ffmpeg_exe():
+    """ffmpeg از FFMPEG_BIN، یا نسخه‌ای که همراه imageio-ffmpeg (وابستگی MoviePy) نصب شده"""
+    if os.getenv("FFMPEG_BIN"):
+        return os.getenv("FFMPEG_BIN")
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+def _fit_image(args):
+    """تغییر اندازه با حفظ نسبت و حاشیه مشکی تا دقیقاً size شود؛ خروجی JPEG"""
+    from PIL import Image
+
+    source, target, size = args
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        scale = min(size[0] / image.width, size[1] / image.height)
+        if scale != 1:
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                 Image.LANCZOS)
+        canvas = Image.new("RGB", size)
+        canvas.paste(image, ((size[0] - image.width) // 2, (size[1] - image.height) // 2))
+        canvas.save(target, "JPEG", quality=95)
+    return target
+
+def _render_slideshow(image_paths, output_path, progress=None, size=SLIDESHOW_SIZE):
+    import tempfile
+    import subprocess
+    from concurrent.futures import ThreadPoolExecutor
+
+    size = (size[0] - size[0] % 2, size[1] - size[1] % 2)  # yuv420p نیاز به ابعاد زوج دارد
+    with tempfile.TemporaryDirectory(prefix="slideshow_") as work_dir:
+        jobs = [(path, os.path.join(work_dir, f"{i:05d}.jpg"), size) for i, path in enumerate(image_paths)]
+        with ThreadPoolExecutor(max_workers=min(RESIZE_WORKERS, len(jobs))) as pool:
+            frames = list(pool.map(_fit_image, jobs))
+
+        # concat demuxer: مدت هر تصویر؛ تصویر آخر تکرار می‌شود تا مدتش رعایت شود
+        list_path = os.path.join(work_dir, "frames.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for frame in frames:
+                f.write(f"file '{frame}'\nduration {SECONDS_PER_IMAGE}\n")
+            f.write(f"file '{frames[-1]}'\n")
+
+        total_us = len(frames) * SECONDS_PER_IMAGE * 1_000_000
+        command = [get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+                   "-f", "concat", "-safe", "0", "-i", list_path,
+                   "-fps_mode", "vfr", "-c:v", "libx264", "-tune", "stillimage", "-pix_fmt", "yuv420p",
+                   "-movflags", "+faststart", "-progress", "pipe:1", "-nostats", output_path]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if progress and key == "out_time_us" and value.isdigit():
+                progress(min(int(value) / total_us, 1.0))
+        error = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(error.strip() or f"ffmpeg exited with {process.returncode}")
+    if progress:
+        progress(1.0)
+    return output_path
+
+def _render_moviepy(image_paths, output_path, progress=None):
+    # MoviePy سنگین است؛ فقط هنگام ساخت ویدیو بارگذاری می‌شود
+    try:
+        from moviepy.editor import ImageSequenceClip
+    except ImportError:  # MoviePy 2.x
+        from moviepy import ImageSequenceClip
+
+    # هر تصویر ۲ ثانیه نمایش داده بشه (fps=0.5)
+    clip = ImageSequenceClip(image_paths, fps=1 / SECONDS_PER_IMAGE)
+
+    # رندر گرفتن با متد libx264 که استاندارد اینستاگرامه
+    clip.write_videofile(output_path, fps=24, codec="libx264", audio=False,
+                         logger=_progress_logger(progress) if progress else "bar")
+    return output_path
+
+RENDERERS = {"slideshow": _render_slideshow, "moviepy": _render_moviepy}
+
+def render_video(image_paths, output_path, progress=None, mode=None):
+    """
+    رندر اسلایدشو از تصاویر ذخیره‌شده (هر تصویر SECONDS_PER_IMAGE ثانیه).
+
+    Args:
+        progress: تابع اختیاری که کسر پیشرفت (۰ تا ۱) را دریافت می‌کند.
+        mode: 'slideshow' یا 'moviepy'؛ پیش‌فرض RENDER_MODE.
+    """
+    return RENDERERS[mode or RENDER_MODE](image_paths, output_path, progress)
+
+def _benchmark_worker(mode, image_paths, output_path, results):
+    import resource
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    render_video(image_paths, output_path, mode=mode)
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    results.put({
+        "mode": mode,
+        "seconds": time.perf_counter() - started,
+        "cpu_seconds": time.process_time() - cpu_started + children.ru_utime + children.ru_stime,
+        "peak_rss_mb": own.ru_maxrss / 1024,
+        "ffmpeg_peak_rss_mb": children.ru_maxrss / 1024,
+        "bytes": os.path.getsize(output_path),
+    })
+
+def benchmark_render(n_images=30, size=SLIDESHOW_SIZE):
+    """
+    مقایسه دو حالت رندر روی تصاویر تصادفی؛ هر حالت در یک پروسه تازه اجرا
+    می‌شود تا زمان CPU و اوج حافظه (خود پروسه و ffmpeg) جدا اندازه‌گیری شود.
+    """
+    import tempfile
+    import multiprocessing
+    import numpy as np
+    from PIL import Image
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="render_bench_") as work_dir:
+        rng = np.random.default_rng(0)
+        images = []
+        for i in range(n_images):
+            path = os.path.join(work_dir, f"src_{i}.jpg")
+            noise = rng.integers(0, 255, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+            Image.fromarray(noise).resize(size, Image.BILINEAR).save(path, "JPEG", quality=90)
+            images.append(path)
+        for mode in RENDERERS:
+            queue = ctx.Queue()
+            process = ctx.Process(target=_benchmark_worker,
+                                  args=(mode, images, os.path.join(work_dir, f"{mode}.mp4"), queue))
+            process.start()
+            results.append(queue.get())
+            process.join()
+    return results
+
 def save_and_make_video(image_urls, project_name="ai_project"):
     """
     ۱. دریافت لینک تصاویر از جمینای
     ۲. ذخیره در هارد ۱ ترابایت
     ۳. تبدیل به ویدیو با MoviePy
+
+    این تابع در همین پروسه رندر می‌کند؛ ربات از صف رندر (services/render_queue.py) استفاده می‌کند.
     """
     setup_folders()
-    saved_images = []
-    
-    # مرحله اول: ذخیره تصاویر در گالری محمد
+
+    # مرحله اول: ذخیره همزمان تصاویر در گالری محمد
     print(f"شروع ذخیره‌سازی تصاویر برای پروژه: {project_name}")
-    for i, url in enumerate(image_urls):
-        try:
-            response = requests.get(url, timeout=15)
-            if response.status_code == 200:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{project_name}_{i}_{timestamp}.jpg"
-                filepath = os.path.join(GALLERY_PATH, filename)
-                
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                saved_images.append(filepath)
-                print(f"تصویر {i+1} ذخیره شد: {filepath}")
-        except Exception as e:
-            print(f"خطا در دانلود تصویر {i}: {e}")
+    saved_images = [result["path"] for result in download_images(image_urls) if result]
 
     if not saved_images:
         return None, "محمد جان، هیچ تصویری ذخیره نشد که ویدیو بسازم!"
 
     # مرحله دوم: تدوین ویدیو (اینجا رم ۸ گیگ و سی‌پی‌یو Xeon میان وسط!)
     try:
-        output_video = os.path.join(VIDEO_PATH, f"{project_name}_{int(time.time())}.mp4")
-        
-        # هر تصویر ۲ ثانیه نمایش داده بشه (fps=0.5)
-        clip = ImageSequenceClip(saved_images, fps=0.5) 
-        
-        # رندر گرفتن با متد libx264 که استاندارد اینستاگرامه
-        clip.write_videofile(output_video, fps=24, codec="libx264", audio=False)
-        
+        output_video = render_video(saved_images, new_video_path(project_name))
         return output_video, get_tutor_lesson()
     except Exception as e:
         return None, f"خطا در ساخت ویدیو: {e}"
@@ -69,3 +300,9 @@ def get_tutor_lesson():
         "۳. **پردازش سنگین:** ساخت ویدیو بیشترین فشار رو به رم ۸ گیگابایتی‌ت میاره، پس همیشه فن سی‌پی‌یو رو چک کن!"
     )
     return lesson
+
+if __name__ == "__main__":
+    for result in benchmark_render():
+        print(f"{result['mode']:>9}: {result['seconds']:6.2f} s wall, {result['cpu_seconds']:6.2f} s CPU, "
+              f"peak RSS {result['peak_rss_mb']:6.0f} MB (ffmpeg {result['ffmpeg_peak_rss_mb']:5.0f} MB), "
+              f"{result['bytes'] / 1024:,.0f} KB")
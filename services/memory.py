@@ -80,8 +80,13 @@ def update_personality(user_id, new_personality):
     
     return f"✅ تحلیل شخصیت کاربر {user_id} به '{new_personality}' به‌روزرسانی شد."
 
-def handle_personality_analysis(user_id):
-    """Simulates a detailed personality analysis based on history."""
+def handle_personality_analysis(user_id: int) -> str:
+    """
+    Simulates a detailed personality analysis based on history.
+
+    Args:
+        user_id: Filled in by the bot.
+    """
     history = get_history(user_id)
     
     if not history:
@@ -0,0 +1,158 @@
+# services/model_router.py
+import os
+import re
+import threading
+from collections import Counter, deque
+from services.text import normalize_fa
+from services.gemini import GEMINI_FALLBACK_MODEL
+
+# --- Model Tiering ---
+# Not every message needs the same model. Each message is classified into a
+# model profile before it goes to Gemini:
+#   * lite: small talk and short general questions outside rooms; a lighter
+#     model, no tool declarations and a compact system instruction;
+#   * default: anything that looks like tool work (intent keywords, rooms);
+#   * pro: tool work for premium levels (ROUTER_PRO_LEVEL and above).
+# The classifier only uses the text length, keyword hits, the chat's room and
+# the user's level, so it costs microseconds. Every decision is logged and the
+# end-to-end latency of each profile is kept for the admin dashboard.
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") == "1"  # "0": everything uses the default profile
+ROUTER_PRO_LEVEL = os.getenv("ROUTER_PRO_LEVEL", "Gold")
+SMALL_TALK_MAX_CHARS = int(os.getenv("ROUTER_SMALL_TALK_MAX_CHARS", 60))  # with a small-talk keyword
+SHORT_MESSAGE_MAX_CHARS = int(os.getenv("ROUTER_SHORT_MAX_CHARS", 25))  # without one
+LATENCY_WINDOW = 200  # recent latencies kept per profile
+
+LITE_MODEL = os.getenv("ROUTER_LITE_MODEL", "gemini-2.5-flash-lite")
+DEFAULT_MODEL = os.getenv("ROUTER_DEFAULT_MODEL", "gemini-2.5-flash")
+PRO_MODEL = os.getenv("ROUTER_PRO_MODEL", "gemini-2.5-pro")
+
+# Fallbacks follow the settings: GEMINI_FALLBACK_MODEL below the default tier,
+# the default model below pro (ResilientGemini skips a fallback equal to the model)
+MODEL_PROFILES = {
+    "lite": {"model": LITE_MODEL, "tools": False, "fallback": GEMINI_FALLBACK_MODEL},
+    "default": {"model": DEFAULT_MODEL, "tools": True, "fallback": GEMINI_FALLBACK_MODEL},
+    "pro": {"model": PRO_MODEL, "tools": True, "fallback": DEFAULT_MODEL},
+}
+
+SMALL_TALK_KEYWORDS = (
+    "سلام", "درود", "صبح بخیر", "شب بخیر", "عصر بخیر", "خداحافظ", "خدانگهدار", "بای",
+    "مرسی", "ممنون", "متشکرم", "سپاس", "دمت گرم", "قربونت", "چطوری", "خوبی", "حالت چطوره",
+    "اوکی", "باشه", "عالی", "آفرین", "هه", "خخخ",
+    "hi", "hello", "hey", "thanks", "thank you", "bye", "ok", "good morning", "good night",
+)
+
+# Signals that a message needs one of the tools (besides the intent keywords of services.intent)
+TOOL_KEYWORDS = (
+    # trader
+    "بورس", "سهم", "دلار", "طلا", "سکه", "ارز", "کریپتو", "تحلیل", "نمودار", "اندیکاتور",
+    "بک تست", "بکتست", "هشدار", "backtest", "crypto", "usdt",
+    # tutor / writer / legal
+    "درس", "آموزش", "ریاضی", "فیزیک", "شیمی", "کنکور", "تمرین", "ترجمه", "رزومه", "قرارداد", "وکیل",
+    "ایمیل", "نامه", "کپشن", "مقاله", "وبلاگ", "email", "caption", "article",
+    # media
+    "تصویر", "عکس", "نقاشی", "ویدیو", "ویدئو", "اسلاید", "گالری", "رندر", "image", "video",
+    # search, personality, account, admin
+    "جستجو", "سرچ", "اخبار", "خبر", "search", "شخصیت", "اشتراک", "پریمیوم", "premium",
+    "سطح", "دسترسی", "وضعیت", "سیستم", "کاربر", "سرور",
+    # action verbs: "یه گربه بکش" is short but needs image generation
+    "بکش", "بساز", "بسازی", "طراحی کن", "درست کن", "بنویس", "بفرست", "حساب کن", "پیدا کن",
+    "draw", "paint", "make", "create", "generate", "write", "find",
+)
+
+def _keyword_pattern(keywords, whole_word=False):
+    """One alternation regex over normalized keywords; each must start a word (and end one if `whole_word`)."""
+    normalized = sorted({normalize_fa(k) for k in keywords}, key=len, reverse=True)
+    end = r"(?!\w)" if whole_word else ""
+    return re.compile(rf"(?<!\w)(?:{'|'.join(re.escape(k) for k in normalized)}){end}")
+
+# Greetings are short words ("hi", "بای") that prefix unrelated ones ("history", "باید")
+_SMALL_TALK_PATTERN = _keyword_pattern(SMALL_TALK_KEYWORDS, whole_word=True)
+# Tool keywords may carry suffixes ("عکس‌ها"); a false hit only keeps the default profile
+_TOOL_PATTERN = _keyword_pattern(TOOL_KEYWORDS)
+
+_stats_lock = threading.Lock()
+_decisions = Counter()  # profile -> messages
+_last_profiles = {}  # user id -> profile of their previous message
+_latencies = {profile: deque(maxlen=LATENCY_WINDOW) for profile in MODEL_PROFILES}
+
+def classify_request(text, room=None, level="Free"):
+    """
+    Picks the model profile for a message.
+
+    Args:
+        text: The user's message.
+        room: The chat's current room ('tutor', 'writer', ...) or None outside rooms.
+        level: The user's level name from USER_LEVELS.
+
+    Returns:
+        A (profile name, reason) tuple; the reason is a short tag for the logs.
+    """
+    from services.admin import USER_LEVELS
+    from services.intent import classify_intent
+
+    if not ROUTER_ENABLED:
+        return "default", "disabled"
+
+    normalized = normalize_fa(text)
+    tool_work = room is not None or bool(classify_intent(text)) or bool(_TOOL_PATTERN.search(normalized))
+    if not tool_work:
+        if _SMALL_TALK_PATTERN.search(normalized) and len(normalized) <= SMALL_TALK_MAX_CHARS:
+            return "lite", "small-talk"
+        if len(normalized) <= SHORT_MESSAGE_MAX_CHARS:
+            return "lite", "short"
+
+    reason = f"room:{room}" if room is not None else "tools" if tool_work else "long"
+    user_rank = USER_LEVELS.get(level, USER_LEVELS["Free"])
+    if user_rank >= USER_LEVELS.get(ROUTER_PRO_LEVEL, USER_LEVELS["Gold"]):
+        return "pro", f"{reason},{level}"
+    return "default", reason
+
+def route_request(text, room=None, level="Free", user_id=None):
+    """classify_request plus logging; returns (profile name, profile dict)."""
+    profile, reason = classify_request(text, room, level)
+    with _stats_lock:
+        previous = _last_profiles.get(user_id)
+        if reason == "short" and previous not in (None, "lite"):
+            # "بله، انجامش بده" after a tool answer continues that work
+            profile, reason = previous, "follow-up"
+        _last_profiles[user_id] = profile
+        _decisions[profile] += 1
+    print(f"Model route: user {user_id} -> {profile} ({MODEL_PROFILES[profile]['model']}, {reason})")
+    return profile, MODEL_PROFILES[profile]
+
+def record_latency(profile, seconds):
+    """Records the end-to-end time of one answered message (all model turns and tool calls)."""
+    with _stats_lock:
+        _latencies[profile].append(seconds)
+
+def get_routing_stats():
+    """Per profile: message count, share and median/p95 latency over the recent window."""
+    with _stats_lock:
+        decisions = dict(_decisions)
+        latencies = {profile: sorted(values) for profile, values in _latencies.items()}
+    total = sum(decisions.values())
+    stats = {}
+    for profile, values in latencies.items():
+        count = decisions.get(profile, 0)
+        stats[profile] = {
+            "model": MODEL_PROFILES[profile]["model"],
+            "messages": count,
+            "share": count / total if total else 0.0,
+            "p50": values[len(values) // 2] if values else None,
+            "p95": values[max(int(len(values) * 0.95) - 1, 0)] if values else None,
+        }
+    return stats
+
+def format_routing_stats():
+    """Formats the profile mix and latencies for the admin dashboard."""
+    stats = get_routing_stats()
+    if not any(s["messages"] for s in stats.values()):
+        return "🧭 **مسیریابی مدل:** هنوز پیامی مسیریابی نشده است."
+    lines = ["🧭 **مسیریابی مدل:**"]
+    for profile, s in stats.items():
+        line = f"🔹 {profile} (`{s['model']}`): {s['messages']} پیام ({s['share']:.0%})"
+        if s["p50"] is not None:
+            line += f" | میانه {s['p50'] * 1000:.0f}ms، p95 {s['p95'] * 1000:.0f}ms"
+        lines.append(line)
+    return "\n".join(lines)
@@ -1,5 +1,7 @@
-def check_access_level(user_id):
+def check_access_level(user_id: int) -> str:
+    """Returns the user's subscription access level."""
     return "free"  # یا منطق اشتراک پولی شما
 
-def get_premium_features():
+def get_premium_features() -> str:
+    """Lists the premium subscription features."""
     return "💎 قابلیت‌های ویژه شامل: تحلیل عمیق بازار، دسترسی به دیتابیس‌های حقوقی و بدون محدودیت پیام."
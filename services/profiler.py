@@ -0,0 +1,282 @@
+# services/profiler.py
+import os
+import sys
+import time
+import functools
+import threading
+import traceback
+from collections import Counter, deque
+
+# --- Sampling Profiler and Stall Watchdog ---
+# The profiler is a daemon thread that snapshots every thread's Python stack
+# (sys._current_frames) at a fixed interval and counts identical stacks.
+# The counts export as collapsed stacks ("frame;frame;frame count"), which
+# flamegraph.pl, speedscope and inferno read directly. It times its own samples
+# and lowers its rate whenever it would use more than PROFILER_MAX_OVERHEAD
+# of one core, so it can stay on in production.
+#
+# The watchdog is independent and always on: bot handlers are wrapped (see
+# watch_handlers) so it knows which handler each thread is running, and any
+# handler still running after STALL_THRESHOLD seconds is reported once, with
+# the stack it is blocked in.
+
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", 0.01))  # seconds between samples
+PROFILER_MAX_INTERVAL = 1.0
+PROFILER_MAX_OVERHEAD = float(os.getenv("PROFILER_MAX_OVERHEAD", 0.02))  # fraction of one core
+PROFILER_MAX_DEPTH = 64
+STALL_THRESHOLD = float(os.getenv("STALL_THRESHOLD", 10))  # seconds
+STALL_CHECK_INTERVAL = 1.0
+MAX_STALLS = 20  # recent stalls kept for the dashboard
+
+# Leaf frames of threads that are only waiting for work; left out of the hot-stack list
+IDLE_LEAVES = {
+    "threading:Condition.wait", "threading:Event.wait", "threading:Thread._wait_for_tstate_lock",
+    "queue:Queue.get", "selectors:EpollSelector.select", "selectors:PollSelector.select",
+    "selectors:SelectSelector.select", "concurrent.futures.thread:_worker", "socket:socket.accept",
+}
+
+# Threads of this module, never sampled
+OWN_THREADS = {"sampling-profiler", "stall-watchdog"}
+
+_labels = {}  # code object -> "module:qualname"
+
+def _frame_label(frame):
+    code = frame.f_code
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+    return label
+
+def _collapse(frame):
+    """The stack of `frame` as 'root;...;leaf' labels (at most PROFILER_MAX_DEPTH deep)."""
+    labels = []
+    while frame is not None and len(labels) < PROFILER_MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+class SamplingProfiler:
+    """Aggregates periodic stack samples of all threads into collapsed-stack counts."""
+
+    def __init__(self, interval=PROFILER_INTERVAL, max_overhead=PROFILER_MAX_OVERHEAD):
+        self.base_interval = interval
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.lock = threading.Lock()
+        self.stacks = Counter()
+        self.samples = 0
+        self.sample_seconds = 0.0  # CPU time spent taking samples
+        self.started = None
+        self.active_seconds = 0.0  # enabled time before the current start
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        with self.lock:
+            self.active_seconds += time.monotonic() - self.started
+            self.started = None
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+            self.samples = 0
+            self.sample_seconds = 0.0
+            self.active_seconds = 0.0
+            if self.started is not None:
+                self.started = time.monotonic()
+
+    def sample(self):
+        """Takes one snapshot of every thread's stack (except this module's own)."""
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        with self.lock:
+            for ident, frame in frames.items():
+                name = names.get(ident, str(ident))
+                if name not in OWN_THREADS:
+                    self.stacks[f"{name};{_collapse(frame)}"] += 1
+            self.samples += 1
+
+    def _loop(self):
+        average_cost, cpu = None, time.thread_time()
+        while not self._stop.wait(self.interval):
+            self.sample()
+            # All CPU this thread used since the last sample, wake-ups included
+            cost, cpu = time.thread_time() - cpu, time.thread_time()
+            with self.lock:
+                self.sample_seconds += cost
+            # Space samples so their (smoothed) CPU cost stays at ~3/4 of the budget
+            average_cost = cost if average_cost is None else 0.9 * average_cost + 0.1 * cost
+            target = average_cost / (self.max_overhead * 0.75)
+            self.interval = min(max(target, self.base_interval), PROFILER_MAX_INTERVAL)
+
+    def get_stats(self):
+        with self.lock:
+            enabled = self.active_seconds + (time.monotonic() - self.started if self.started is not None else 0.0)
+            return {"running": self.running, "samples": self.samples, "stacks": len(self.stacks),
+                    "interval": self.interval, "enabled_seconds": enabled,
+                    "overhead": self.sample_seconds / enabled if enabled else 0.0}
+
+    def collapsed(self):
+        """Flame-graph input: one 'thread;frame;...;frame count' line per distinct stack."""
+        with self.lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def hot_stacks(self, limit=5, include_idle=False):
+        """The most frequently sampled stacks as (stack, share of samples)."""
+        with self.lock:
+            total = sum(self.stacks.values())
+            items = self.stacks.most_common()
+        hot = []
+        for stack, count in items:
+            if not include_idle and stack.rsplit(";", 1)[-1] in IDLE_LEAVES:
+                continue
+            hot.append((stack, count / total))
+            if len(hot) == limit:
+                break
+        return hot
+
+# --- Stall Watchdog ---
+
+class StallWatchdog:
+    """Reports handlers that have been running longer than `threshold` seconds."""
+
+    def __init__(self, threshold=STALL_THRESHOLD):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.active = {}  # thread id -> [handler name, start, reported]
+        self.stalls = deque(maxlen=MAX_STALLS)
+        self.total_stalls = 0
+        self._thread = None
+
+    def enter(self, name):
+        with self.lock:
+            self.active[threading.get_ident()] = [name, time.monotonic(), False]
+
+    def exit(self):
+        with self.lock:
+            entry = self.active.pop(threading.get_ident(), None)
+        if entry and entry[2]:
+            print(f"Stalled handler {entry[0]} finished after {time.monotonic() - entry[1]:.1f}s")
+
+    def wrap(self, function):
+        """`function` with its runs tracked by the watchdog."""
+        # functools.wraps keeps the signature visible to telebot's parameter inspection
+        @functools.wraps(function)
+        def tracked(*args, **kwargs):
+            self.enter(function.__name__)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.exit()
+        return tracked
+
+    def check(self):
+        """Records every handler past the threshold (once per run) with its current stack."""
+        now = time.monotonic()
+        with self.lock:
+            overdue = [(ident, entry) for ident, entry in self.active.items()
+                       if not entry[2] and now - entry[1] > self.threshold]
+            for _, entry in overdue:
+                entry[2] = True
+        if not overdue:
+            return []
+        frames = sys._current_frames()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        found = []
+        for ident, (name, start, _) in overdue:
+            stack = traceback.format_stack(frames[ident]) if ident in frames else []
+            stall = {"handler": name, "thread": names.get(ident, str(ident)), "seconds": now - start,
+                     "time": time.time(), "stack": "".join(stack), "where": stack[-1].strip() if stack else ""}
+            print(f"Stalled handler {name} on {stall['thread']}: running for {stall['seconds']:.1f}s\n{stall['stack']}")
+            found.append(stall)
+        with self.lock:
+            self.stalls.extend(found)
+            self.total_stalls += len(found)
+        return found
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(STALL_CHECK_INTERVAL)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error in stall watchdog: {e}")
+
+    def get_stats(self):
+        now = time.monotonic()
+        with self.lock:
+            return {"threshold": self.threshold, "running_handlers": len(self.active),
+                    "longest_running": max((now - e[1] for e in self.active.values()), default=0.0),
+                    "total_stalls": self.total_stalls, "recent": list(self.stalls)}
+
+profiler = SamplingProfiler()
+watchdog = StallWatchdog()
+
+def watch_handlers(bot):
+    """Wraps every handler registered on a TeleBot so the watchdog sees it, and starts the watchdog."""
+    for attribute, handlers in vars(bot).items():
+        if not attribute.endswith("_handlers") or not isinstance(handlers, list):
+            continue
+        for handler in handlers:
+            if isinstance(handler, dict) and "function" in handler and not hasattr(handler["function"], "__wrapped__"):
+                handler["function"] = watchdog.wrap(handler["function"])
+    watchdog.start()
+
+def toggle_profiler():
+    """Starts or stops the sampling profiler; returns whether it is now running."""
+    if profiler.running:
+        profiler.stop()
+    else:
+        profiler.start()
+    return profiler.running
+
+def _short_stack(stack, frames=4):
+    """Thread name plus the innermost frames of a collapsed stack."""
+    parts = stack.split(";")
+    inner = parts[1:][-frames:]
+    return f"[{parts[0]}] " + (" ← ".join(reversed(inner)) if inner else "—")
+
+def format_profiler_report():
+    """Profiler and watchdog status for the admin dashboard."""
+    stats = profiler.get_stats()
+    watch = watchdog.get_stats()
+    state = "🟢 روشن" if stats["running"] else "⚪️ خاموش"
+    lines = [
+        f"🔬 **پروفایلر نمونه‌برداری:** {state}",
+        f"نمونه‌ها: {stats['samples']} | پشته‌های متمایز: {stats['stacks']} | "
+        f"فاصله: {stats['interval'] * 1000:.0f}ms | سربار: {stats['overhead']:.2%}",
+    ]
+    hot = profiler.hot_stacks()
+    if hot:
+        lines.append("\n🔥 **داغ‌ترین پشته‌ها (بدون threadهای بیکار):**")
+        lines += [f"{share:.0%} `{_short_stack(stack)}`" for stack, share in hot]
+    lines.append(f"\n⏱️ **نگهبان گیر کردن** (آستانه {watch['threshold']:g} ثانیه): "
+                 f"{watch['running_handlers']} هندلر در حال اجرا، طولانی‌ترین {watch['longest_running']:.1f} ثانیه، "
+                 f"{watch['total_stalls']} گیر کردن ثبت‌شده")
+    for stall in list(reversed(watch["recent"]))[:3]:
+        date = time.strftime("%H:%M:%S", time.localtime(stall["time"]))
+        where = " ".join(stall["where"].split())
+        lines.append(f"⚠️ {date} `{stall['handler']}` ({stall['seconds']:.0f}s): `{where}`")
+    return "\n".join(lines)
@@ -0,0 +1,108 @@
+# services/registry.py
+import importlib
+
+# --- Lazy Tool Registry ---
+# Tool functions need type-annotated parameters: the SDK builds their
+# declarations from the signature and docstring.
+# The agent tools live in service modules that pull in heavy libraries
+# (requests, psutil, gTTS, ...). Instead of importing all of them when bot.py
+# loads, each tool is resolved from its module the first time it is needed.
+
+TOOL_MODULES = {
+    "handle_trader_request": "services.trader",
+    "get_technical_analysis": "services.trader",
+    "backtest_ma_crossover": "services.trader",
+    "set_price_alert": "services.alerts",
+    "list_price_alerts": "services.alerts",
+    "cancel_price_alert": "services.alerts",
+    "handle_legal_request": "services.legal",
+    "handle_tutor_request": "services.tutor",
+    "handle_writing_request": "services.writer",
+    "handle_image_request": "services.image_generator",
+    "create_slideshow_video": "services.render_queue",
+    "get_render_status": "services.render_queue",
+    "search_gallery": "services.gallery",
+    "delete_gallery_item": "services.gallery",
+    "get_system_status": "services.admin",
+    "handle_personality_analysis": "services.memory",
+    "grok_search": "services.self_improve",
+    "check_autonomy": "services.self_improve",
+    "update_resources_limit": "services.self_improve",
+    "hardware_stress_test": "services.self_improve",
+    "system_guardian": "services.self_improve",
+    "track_hacker": "services.self_improve",
+    "profit_hunter": "services.self_improve",
+    "set_user_level": "services.admin",
+    "get_user_list": "services.admin",
+    "check_access_level": "services.premium",
+    "get_premium_features": "services.premium",
+}
+
+TOOL_NAMES = tuple(TOOL_MODULES)
+
+_loaded_tools = {}
+
+def load_tool(name):
+    """Returns the callable behind a tool name, importing its module on first use."""
+    if name not in _loaded_tools:
+        module = importlib.import_module(TOOL_MODULES[name])
+        _loaded_tools[name] = getattr(module, name)
+    return _loaded_tools[name]
+
+# --- Per-Room and Per-Tier Tool Subsets ---
+# Sending every declaration with every message costs prompt tokens and
+# latency. A chat that is inside a room only gets the tools of that room.
+
+ROOM_TOOLS = {
+    "tutor": ("handle_tutor_request", "grok_search"),
+    "writer": ("handle_writing_request",),
+    "trader": ("handle_trader_request", "get_technical_analysis", "backtest_ma_crossover",
+               "set_price_alert", "list_price_alerts", "cancel_price_alert", "grok_search", "profit_hunter"),
+    "media": ("handle_image_request", "create_slideshow_video", "get_render_status", "search_gallery",
+              "delete_gallery_item"),
+    "psychology": ("handle_personality_analysis",),
+}
+
+# Tools whose user_id argument is always filled in by the bot (never trusted from the model)
+USER_ID_TOOLS = ("check_access_level", "set_price_alert", "list_price_alerts", "cancel_price_alert",
+                 "create_slideshow_video", "get_render_status", "search_gallery", "delete_gallery_item",
+                 "handle_personality_analysis")
+
+# Offered in every room
+COMMON_TOOLS = ("check_access_level", "get_premium_features")
+
+# Minimum user level (see services.admin.USER_LEVELS); unlisted tools are open to everyone
+TOOL_MIN_LEVEL = {
+    "get_system_status": "Owner",
+    "set_user_level": "Owner",
+    "get_user_list": "Owner",
+    "check_autonomy": "Owner",
+    "update_resources_limit": "Owner",
+    "hardware_stress_test": "Owner",
+    "system_guardian": "Owner",
+    "track_hacker": "Owner",
+}
+
+def select_tool_names(room=None, level="Free"):
+    """
+    Picks the tools offered to the model for a chat.
+
+    Args:
+        room: The chat's current room ('tutor', 'writer', ...) or None outside rooms.
+        level: The user's level name from USER_LEVELS.
+
+    Returns:
+        A tuple of tool names in registry order (stable, so it can be used as a cache key).
+    """
+    from services.admin import USER_LEVELS
+
+    user_rank = USER_LEVELS.get(level, USER_LEVELS["Free"])
+    if room in ROOM_TOOLS:
+        wanted = set(ROOM_TOOLS[room]) | set(COMMON_TOOLS)
+    else:
+        wanted = set(TOOL_NAMES)
+
+    return tuple(
+        name for name in TOOL_NAMES
+        if name in wanted and USER_LEVELS[TOOL_MIN_LEVEL.get(name, "Free")] <= user_rank
+    )
@@ -0,0 +1,345 @@
+# services/render_queue.py
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+import multiprocessing
+
+# --- Out-of-Process Video Render Queue ---
+# Each render job runs in its own child process (spawned, so it does not
+# inherit the bot's threads or sockets); at most RENDER_WORKERS run at once.
+# A supervisor thread per slot relays the child's progress, watches the RSS
+# of the child and everything it launched (ffmpeg) and kills the job when it
+# exceeds RENDER_MAX_RSS_MB, so a heavy render can neither stall the chats
+# nor get the whole bot OOM-killed. Finished videos are handed to the sender
+# registered by bot.py.
+# Jobs live in a SQLite table (RENDER_DB_PATH) rather than in memory, so any
+# gunicorn worker can queue a job or answer its status. Only the process that
+# runs the background services (start_render_workers) renders; its slots
+# claim queued jobs from the table, and jobs interrupted by a restart of that
+# process are queued again when the next one takes over.
+
+RENDER_DB_PATH = os.getenv("RENDER_DB_PATH", "/home/ubuntu/my-ai-bot/render_jobs.sqlite3")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+RENDER_MAX_RSS_MB = float(os.getenv("RENDER_MAX_RSS_MB", 2048))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", 1800))  # seconds per job
+MONITOR_INTERVAL = 0.5  # seconds between RSS checks
+POLL_INTERVAL = 2.0  # seconds between checks for jobs queued by other processes
+MAX_FINISHED_JOBS = 500  # finished jobs kept for status queries
+
+QUEUED, DOWNLOADING, RENDERING, DONE, FAILED = "queued", "downloading", "rendering", "done", "failed"
+STATUS_LABELS = {QUEUED: "در صف", DOWNLOADING: "دانلود تصاویر", RENDERING: "در حال رندر",
+                 DONE: "آماده", FAILED: "ناموفق"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    project_name TEXT NOT NULL,
+    image_urls TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    output TEXT,
+    images TEXT,
+    error TEXT,
+    peak_rss INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished);
+"""
+JSON_FIELDS = ("image_urls", "images")
+
+_ctx = multiprocessing.get_context("spawn")
+_db = None
+_db_lock = threading.Lock()
+_wakeup = threading.Event()  # set when this process queues a job, so its slots need not wait for the poll
+_sender = None  # callable(job)
+_workers = []
+_workers_lock = threading.Lock()
+
+# --- Job Store ---
+
+def _conn():
+    global _db
+    if _db is None:
+        os.makedirs(os.path.dirname(RENDER_DB_PATH) or ".", exist_ok=True)
+        db = sqlite3.connect(RENDER_DB_PATH, timeout=30, check_same_thread=False, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+        _db = db
+    return _db
+
+def _row_to_job(row):
+    job = dict(row)
+    for field in JSON_FIELDS:
+        job[field] = json.loads(job[field]) if job[field] else None
+    return job
+
+def _update(job_id, **fields):
+    for field in JSON_FIELDS:
+        if field in fields:
+            fields[field] = json.dumps(fields[field])
+    with _db_lock:
+        _conn().execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                        (*fields.values(), job_id))
+
+def _claim_job():
+    """Marks the oldest queued job as downloading and returns it (None if nothing is queued)."""
+    with _db_lock:
+        db = _conn()
+        db.execute("BEGIN IMMEDIATE")  # another process may be claiming too
+        try:
+            row = db.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = ?, started = ? WHERE id = ?", (DOWNLOADING, time.time(), row["id"]))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+    if row is None:
+        return None
+    return dict(_row_to_job(row), status=DOWNLOADING)
+
+# --- Child Process ---
+
+def _run_job(job_id, image_urls, project_name, updates):
+    """Entry point of the render process: download, render, report progress."""
+    from services import media_engine
+
+    def report(status, progress, **extra):
+        updates.put((job_id, status, progress, extra))
+
+    last = [0.0]
+    try:
+        media_engine.setup_folders()
+        report(DOWNLOADING, 0.0)
+        images = [r["path"] for r in media_engine.download_images(image_urls) if r]
+        if not images:
+            report(FAILED, 0.0, error="هیچ تصویری دانلود نشد.")
+            return
+        report(RENDERING, 0.1)
+
+        def on_progress(fraction):
+            # Throttled: one update per percent is plenty for a status message
+            if fraction - last[0] >= 0.01 or fraction >= 1.0:
+                last[0] = fraction
+                report(RENDERING, 0.1 + 0.9 * fraction)
+
+        output = media_engine.render_video(images, media_engine.new_video_path(project_name), progress=on_progress)
+        report(DONE, 1.0, output=output, images=images)
+    except Exception as e:
+        report(FAILED, last[0], error=str(e))
+
+# --- Supervision ---
+
+def _tree_rss(process):
+    """RSS of a process and all its descendants, in bytes (0 once the process is gone)."""
+    import psutil
+
+    try:
+        # The child may exit at any moment, even between is_alive() and here
+        family = [process] + process.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+    total = 0
+    for p in family:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+def _kill_tree(process):
+    import psutil
+
+    try:
+        family = process.children(recursive=True) + [process]
+    except psutil.NoSuchProcess:
+        return  # already gone
+    for p in family:
+        try:
+            p.kill()
+        except psutil.Error:
+            pass
+
+def _supervise(job):
+    import psutil
+
+    job_id = job["id"]
+    updates = _ctx.Queue()
+    process = _ctx.Process(target=_run_job, args=(job_id, job["image_urls"], job["project_name"], updates),
+                           name=f"render-{job_id}", daemon=True)
+    process.start()
+    handle = psutil.Process(process.pid)
+    limit = RENDER_MAX_RSS_MB * 1024 * 1024
+    deadline = time.monotonic() + RENDER_TIMEOUT
+    failure = None
+
+    while True:
+        try:
+            _, status, progress, extra = updates.get(timeout=MONITOR_INTERVAL)
+            job.update(status=status, progress=progress, **extra)
+            _update(job_id, status=status, progress=progress, peak_rss=job["peak_rss"], **extra)
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            if updates.empty():
+                break
+            continue
+        rss = _tree_rss(handle)
+        job["peak_rss"] = max(job["peak_rss"], rss)
+        if rss > limit:
+            failure = f"سقف حافظه ({RENDER_MAX_RSS_MB:.0f} MB) رد شد."
+        elif time.monotonic() > deadline:
+            failure = "زمان رندر تمام شد."
+        if failure:
+            _kill_tree(handle)
+            break
+
+    process.join(timeout=5)
+    updates.close()
+    if failure:
+        job.update(status=FAILED, error=failure)
+    elif job["status"] != DONE and job["status"] != FAILED:
+        job.update(status=FAILED, error=f"پروسه رندر با کد {process.exitcode} متوقف شد.")
+    job["finished"] = time.time()
+    _update(job_id, status=job["status"], error=job["error"], finished=job["finished"], peak_rss=job["peak_rss"])
+    if job["status"] == DONE:
+        _add_to_gallery(job)
+    _deliver(job)
+
+def _add_to_gallery(job):
+    """Indexes the job's images and video; quota was checked when the job was admitted."""
+    from services.gallery import get_gallery
+
+    gallery = get_gallery()
+    try:
+        for path in dict.fromkeys(job.get("images") or []):
+            gallery.add(path, job["user_id"], job["project_name"], "image", enforce_quota=False)
+        gallery.add(job["output"], job["user_id"], job["project_name"], "video", enforce_quota=False)
+    except Exception as e:
+        print(f"Error indexing render job {job['id']}: {e}")
+
+def _deliver(job):
+    if _sender is None:
+        return
+    try:
+        _sender(dict(job))
+    except Exception as e:
+        print(f"Error delivering render job {job['id']}: {e}")
+
+def _worker_loop():
+    while True:
+        job = _claim_job()
+        if job is None:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        try:
+            _supervise(job)
+        except Exception as e:
+            print(f"Error supervising render job {job['id']}: {e}")
+            job.update(status=FAILED, error=str(e), finished=time.time())
+            _update(job["id"], status=FAILED, error=str(e), finished=job["finished"])
+            _deliver(job)
+
+def _forget_old_jobs(db):
+    db.execute("DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished IS NOT NULL "
+               "ORDER BY finished DESC LIMIT -1 OFFSET ?)", (MAX_FINISHED_JOBS,))
+
+# --- Public API ---
+
+def set_render_sender(sender):
+    """Registers how finished jobs reach users (bot.py sends the video or the error)."""
+    global _sender
+    _sender = sender
+
+def start_render_workers():
+    """
+    Starts the render slots in this process. Call it from the one process that
+    runs the background services; jobs a previous owner left half-done are
+    queued again.
+    """
+    with _db_lock:
+        requeued = _conn().execute("UPDATE jobs SET status = ?, progress = 0, started = NULL WHERE status IN (?, ?)",
+                                   (QUEUED, DOWNLOADING, RENDERING)).rowcount
+    if requeued:
+        print(f"Render queue: {requeued} interrupted job(s) queued again")
+    with _workers_lock:
+        _workers[:] = [t for t in _workers if t.is_alive()]
+        while len(_workers) < RENDER_WORKERS:
+            thread = threading.Thread(target=_worker_loop, name=f"render-slot-{len(_workers)}", daemon=True)
+            thread.start()
+            _workers.append(thread)
+
+def submit_render_job(image_urls, project_name, user_id):
+    """Queues a slideshow render and returns its job id."""
+    with _db_lock:
+        db = _conn()
+        _forget_old_jobs(db)
+        job_id = db.execute(
+            "INSERT INTO jobs (user_id, project_name, image_urls, status, created) VALUES (?, ?, ?, ?, ?)",
+            (int(user_id), project_name, json.dumps(list(image_urls)), QUEUED, time.time())).lastrowid
+    _wakeup.set()
+    return job_id
+
+def get_job(job_id):
+    with _db_lock:
+        row = _conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def get_queue_stats():
+    """Counts of jobs per status plus configured limits."""
+    counts = {status: 0 for status in STATUS_LABELS}
+    with _db_lock:
+        for row in _conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+    return dict(counts, workers=RENDER_WORKERS, max_rss_mb=RENDER_MAX_RSS_MB)
+
+def format_job_status(job):
+    line = f"🎬 کار #{job['id']} ({job['project_name']}): {STATUS_LABELS[job['status']]}"
+    if job["status"] in (DOWNLOADING, RENDERING):
+        line += f" — {job['progress']:.0%}"
+    if job["status"] == QUEUED:
+        with _db_lock:
+            ahead = _conn().execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND id < ?",
+                                    (QUEUED, job["id"])).fetchone()[0]
+        line += f" ({ahead} کار جلوتر)"
+    if job.get("error"):
+        line += f"\n❌ {job['error']}"
+    return line
+
+# --- Agent Tools ---
+
+def create_slideshow_video(image_urls: list[str], project_name: str, user_id: int) -> str:
+    """
+    Makes a slideshow video from image URLs in the background and sends it to the user when ready.
+
+    Args:
+        image_urls: Links of the images, in display order.
+        project_name: Short name for the video file (letters, digits, underscores).
+        user_id: Filled in by the bot.
+    """
+    from services.gallery import get_gallery
+
+    if not image_urls:
+        return "❌ هیچ لینک تصویری داده نشده."
+    used, quota = get_gallery().usage(user_id)
+    if quota is not None and used >= quota:
+        return f"❌ سهمیه گالری پر است ({used / 1024 / 1024:.0f} از {quota / 1024 / 1024:.0f} MB)؛ اول چند فایل قدیمی را پاک کن (`/gallery delete <شماره>`)."
+    safe_name = "".join(c for c in project_name if c.isalnum() or c == "_")[:40] or "ai_project"
+    job_id = submit_render_job(image_urls, safe_name, user_id)
+    return f"🎬 کار رندر #{job_id} با {len(image_urls)} تصویر در صف قرار گرفت؛ ویدیو آماده شد همین‌جا می‌فرستمش."
+
+def get_render_status(job_id: int, user_id: int) -> str:
+    """Reports the status and progress of one of the user's video render jobs."""
+    job = get_job(int(job_id))
+    if job is None or job["user_id"] != int(user_id):
+        return f"❌ کار رندر #{job_id} پیدا نشد."
+    return format_job_status(job)
@@ -0,0 +1,314 @@
+# services/scheduler.py
+import os
+import json
+import time
+import heapq
+import random
+import threading
+from datetime import datetime, timedelta
+
+# --- Background Job Scheduler ---
+# One scheduler thread keeps a heap of due times and hands due jobs to a small
+# pool (SCHEDULER_WORKERS). Work can never pile up:
+#   * overlap: a job whose previous run is still going is skipped, not queued;
+#   * coalescing: the next run is computed from the current time, so runs
+#     missed while the process was busy or down collapse into a single run
+#     (persisted last-run times let a restart see what it missed);
+#   * jitter: each run is delayed by up to `jitter` seconds so periodic jobs
+#     do not all hit the network in the same second.
+# Jobs run either every `interval` seconds or on a 5-field cron expression
+# (minute hour day-of-month month day-of-week, local time).
+# The state file also carries each job's stats, so processes that do not run
+# the scheduler (the other gunicorn workers) can still report on it.
+
+SCHEDULER_STATE_PATH = os.getenv("SCHEDULER_STATE_PATH", "/home/ubuntu/my-ai-bot/scheduler_state.json")
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", 2))
+
+# --- Cron Expressions ---
+
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))  # day-of-week 0 and 7 are Sunday
+
+def _parse_cron_field(text, low, high):
+    values = set()
+    for part in text.split(","):
+        span, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if span == "*":
+            start, end = low, high
+        elif "-" in span:
+            start, end = (int(v) for v in span.split("-", 1))
+        else:
+            start = int(span)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"Invalid cron field: {text}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    """A 5-field cron expression; `*`, lists, ranges and steps are supported."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS))
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day, self.any_weekday = fields[2] == "*", fields[4] == "*"
+
+    def _day_matches(self, dt):
+        in_month = dt.day in self.days
+        in_week = (dt.weekday() + 1) % 7 in self.weekdays  # cron counts from Sunday
+        if self.any_day or self.any_weekday:
+            return in_month and in_week
+        return in_month or in_week  # both restricted: either one, as in cron
+
+    def next_after(self, timestamp):
+        """The first matching minute strictly after `timestamp` (epoch seconds)."""
+        dt = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+# --- Jobs ---
+
+class Job:
+    def __init__(self, name, func, interval=None, cron=None, jitter=0.0):
+        if (interval is None) == (cron is None):
+            raise ValueError("A job needs exactly one of interval or cron")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron else None
+        self.jitter = jitter
+        self.next_run = None
+        self.running = False
+        self.stats = {"runs": 0, "failures": 0, "skipped": 0, "coalesced": 0, "last_run": None,
+                      "last_seconds": None, "avg_seconds": None, "max_seconds": 0.0, "last_error": None}
+
+    def next_after(self, timestamp):
+        base = timestamp + self.interval if self.interval is not None else self.cron.next_after(timestamp)
+        return base + random.uniform(0, self.jitter)
+
+    def missed_since(self, last_run, now):
+        """How many scheduled runs fell between `last_run` and `now`."""
+        if self.interval is not None:
+            return int((now - last_run) // self.interval)
+        missed, t = 0, last_run
+        while missed < 1000:
+            t = self.cron.next_after(t)
+            if t > now:
+                break
+            missed += 1
+        return missed
+
+    @property
+    def schedule(self):
+        return f"هر {self.interval:g} ثانیه" if self.interval is not None else f"cron «{self.cron.expression}»"
+
+class Scheduler:
+    """Interval and cron jobs with jitter, overlap skipping and coalescing of missed runs."""
+
+    def __init__(self, state_path=SCHEDULER_STATE_PATH, workers=SCHEDULER_WORKERS):
+        self.state_path = state_path
+        self.workers = workers
+        self.jobs = {}
+        self.heap = []  # (due time, name)
+        self.condition = threading.Condition()
+        self.executor = None
+        self._thread = None
+        self._stopping = False
+
+    def add_job(self, name, func, interval=None, cron=None, jitter=0.0):
+        """Registers `func` (no arguments) under `name`; replaces a job of the same name."""
+        job = Job(name, func, interval, cron, jitter)
+        with self.condition:
+            self.jobs[name] = job
+            if self.running:
+                self._schedule_first(job, self._load_state())
+        return job
+
+    # --- State ---
+
+    def _read_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _load_state(self):
+        """Last run time per job name."""
+        state = self._read_state()
+        if "jobs" not in state:
+            return state  # older files held only {name: last_run}
+        return {name: job["last_run"] for name, job in state["jobs"].items() if job.get("last_run")}
+
+    def published_stats(self):
+        """
+        The stats last written by whichever process runs the scheduler.
+
+        Returns:
+            A (get_stats()-like dict, time written) tuple; ({}, None) if nothing was published.
+        """
+        state = self._read_state()
+        if "jobs" not in state:
+            return {}, None
+        return state["jobs"], state.get("updated")
+
+    def _save_state(self):
+        """Persists each job's stats and last run time (a few hundred bytes; written under the lock so writers do not race)."""
+        with self.condition:
+            state = {"updated": time.time(), "jobs": self.get_stats()}
+            try:
+                os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+                tmp_path = self.state_path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.state_path)
+            except OSError as e:
+                print(f"Error saving scheduler state: {e}")
+
+    # --- Scheduling ---
+
+    def _schedule_first(self, job, state):
+        now = time.time()
+        last_run = state.get(job.name)
+        missed = job.missed_since(last_run, now) if last_run else 0
+        if missed:
+            # Overdue after downtime: every missed run becomes this single one
+            job.stats["coalesced"] += missed - 1
+            job.next_run = now + random.uniform(0, job.jitter)
+        else:
+            job.next_run = job.next_after(last_run or now)
+        heapq.heappush(self.heap, (job.next_run, job.name))
+        self.condition.notify()
+
+    def _fire(self, job, now):
+        if job.running:
+            job.stats["skipped"] += 1  # previous run still going
+        else:
+            job.running = True
+            self.executor.submit(self._run, job)
+        # Computed from now: runs missed while the loop was late are coalesced
+        missed = job.missed_since(job.next_run, now) if job.next_run < now else 0
+        job.stats["coalesced"] += missed
+        job.next_run = job.next_after(now)
+        heapq.heappush(self.heap, (job.next_run, job.name))
+        self._save_state()
+
+    def _run(self, job):
+        start = time.time()
+        error = None
+        try:
+            job.func()
+        except Exception as e:
+            error = str(e)
+            print(f"Error in scheduled job {job.name}: {e}")
+        seconds = time.time() - start
+        with self.condition:
+            stats = job.stats
+            stats["runs"] += 1
+            stats["failures"] += error is not None
+            stats["last_error"] = error
+            stats["last_run"] = start
+            stats["last_seconds"] = seconds
+            stats["avg_seconds"] = seconds if stats["avg_seconds"] is None else stats["avg_seconds"] * 0.8 + seconds * 0.2
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            job.running = False
+        self._save_state()
+
+    def _loop(self):
+        with self.condition:
+            while not self._stopping:
+                now = time.time()
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                due, name = self.heap[0]
+                job = self.jobs.get(name)
+                if job is None or due != job.next_run:
+                    heapq.heappop(self.heap)  # removed or rescheduled job
+                    continue
+                if due > now:
+                    self.condition.wait(timeout=due - now)
+                    continue
+                heapq.heappop(self.heap)
+                self._fire(job, now)
+
+    # --- Lifecycle ---
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Schedules every job (catching up once on runs missed while down) and starts the loop (idempotent)."""
+        with self.condition:
+            if self.running:
+                return
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._stopping = False
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scheduled-job")
+            state = self._load_state()
+            self.heap = []
+            for job in self.jobs.values():
+                self._schedule_first(job, state)
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+        self._save_state()
+
+    def stop(self, wait=True):
+        with self.condition:
+            self._stopping = True
+            self.condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+
+    def get_stats(self):
+        """Per-job stats plus schedule, next run and whether it is running now."""
+        with self.condition:
+            return {name: dict(job.stats, schedule=job.schedule, next_run=job.next_run, running=job.running)
+                    for name, job in self.jobs.items()}
+
+_scheduler = Scheduler()
+
+def get_scheduler():
+    return _scheduler
+
+def format_scheduler_stats(stats=None):
+    """Per-job lines for the autonomy report."""
+    stats = get_scheduler().get_stats() if stats is None else stats
+    if not stats:
+        return "هیچ کار زمان‌بندی‌شده‌ای ثبت نشده."
+    lines = []
+    for name, job in stats.items():
+        state = "⏳ در حال اجرا" if job["running"] else "✅" if not job["last_error"] else "⚠️"
+        line = f"{state} **{name}** ({job['schedule']}): {job['runs']} اجرا"
+        if job["avg_seconds"] is not None:
+            line += f"، میانگین {job['avg_seconds']:.1f}s، بیشینه {job['max_seconds']:.1f}s"
+        if job["failures"]:
+            line += f"، {job['failures']} خطا"
+        if job["skipped"] or job["coalesced"]:
+            line += f"، {job['skipped']} رد به‌خاطر هم‌پوشانی، {job['coalesced']} اجرای ادغام‌شده"
+        if job["next_run"]:
+            line += f"\n    اجرای بعدی: {time.strftime('%Y-%m-%d %H:%M', time.localtime(job['next_run']))}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,331 @@
+# services/search.py
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from services.text import normalize_fa
+
+# --- Multi-Source Search Engine ---
+# A query is sent to every configured source at once, on a bounded pool, under
+# one global deadline. A network source that has not answered after its
+# `hedge_after` seconds gets a second, identical request and whichever copy
+# returns first wins. When the deadline passes, whatever has arrived is
+# merged and returned; late answers are dropped. Merging deduplicates by URL
+# (or normalized title) and ranks with reciprocal rank fusion, so an item
+# that several sources rank highly comes first. Search latency is therefore
+# bounded by SEARCH_DEADLINE however many sources are configured.
+#
+# SEARCH_SOURCES selects the sources (comma separated, see SOURCES);
+# WIKIPEDIA_API_URL and DUCKDUCKGO_API_URL can point at local stand-in servers.
+
+SEARCH_SOURCES = os.getenv("SEARCH_SOURCES", "wikipedia,duckduckgo,legal")
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", 3.0))  # seconds for the whole search
+SEARCH_HEDGE_AFTER = float(os.getenv("SEARCH_HEDGE_AFTER", 1.0))  # seconds before a hedged retry
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", 16))
+WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "https://fa.wikipedia.org/w/api.php")
+DUCKDUCKGO_API_URL = os.getenv("DUCKDUCKGO_API_URL", "https://api.duckduckgo.com/")
+RESULTS_PER_SOURCE = 5
+RRF_K = 60  # reciprocal rank fusion damping
+
+_TAGS = re.compile(r"<[^>]+>")
+
+def make_result(title, snippet="", url="", source=""):
+    return {"title": title.strip(), "snippet": _TAGS.sub("", snippet or "").strip(), "url": url, "source": source}
+
+# --- Sources ---
+# A source has a `name`, a `weight` in the ranking, `hedge_after` (seconds, or
+# None for no hedging) and search(query, limit, timeout) -> list of results.
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Keep-alive HTTP session shared by the network sources."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=SEARCH_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["User-Agent"] = "SuperAgentBot/1.0 (search)"
+                _session = session
+    return _session
+
+class WikipediaSource:
+    """Full-text search of Persian Wikipedia."""
+    name = "wikipedia"
+    weight = 1.0
+    hedge_after = SEARCH_HEDGE_AFTER
+
+    def __init__(self, api_url=WIKIPEDIA_API_URL):
+        self.api_url = api_url
+
+    def search(self, query, limit, timeout):
+        response = get_session().get(self.api_url, timeout=timeout, params={
+            "action": "query", "list": "search", "srsearch": query, "srlimit": limit, "format": "json"})
+        response.raise_for_status()
+        base = self.api_url.rsplit("/w/", 1)[0]
+        return [make_result(item["title"], item.get("snippet", ""),
+                            f"{base}/wiki/{item['title'].replace(' ', '_')}", self.name)
+                for item in response.json().get("query", {}).get("search", [])]
+
+class DuckDuckGoSource:
+    """DuckDuckGo Instant Answer API (abstract and related topics, no key required)."""
+    name = "duckduckgo"
+    weight = 1.0
+    hedge_after = SEARCH_HEDGE_AFTER
+
+    def __init__(self, api_url=DUCKDUCKGO_API_URL):
+        self.api_url = api_url
+
+    def search(self, query, limit, timeout):
+        response = get_session().get(self.api_url, timeout=timeout, params={
+            "q": query, "format": "json", "no_html": 1, "skip_disambig": 1})
+        response.raise_for_status()
+        data = response.json()
+        results = []
+        if data.get("AbstractText"):
+            results.append(make_result(data.get("Heading") or query, data["AbstractText"],
+                                       data.get("AbstractURL", ""), self.name))
+        topics = list(data.get("RelatedTopics", []))
+        while topics and len(results) < limit:
+            topic = topics.pop(0)
+            if "Topics" in topic:  # a group of topics
+                topics[:0] = topic["Topics"]
+            elif topic.get("Text"):
+                title, _, snippet = topic["Text"].partition(" - ")
+                results.append(make_result(title, snippet, topic.get("FirstURL", ""), self.name))
+        return results[:limit]
+
+class LegalSource:
+    """The local BM25 index of law articles (services.legal_index)."""
+    name = "legal"
+    weight = 0.8
+    hedge_after = None  # local, microseconds
+
+    def search(self, query, limit, timeout):
+        from services.legal_index import get_legal_index
+
+        return [make_result(f"{article['law']} - ماده {article['article']}", article["text"], "", self.name)
+                for score, article in get_legal_index().search(query, top_k=limit) if score >= 2.0]
+
+class StaticSource:
+    """
+    Local stand-in source for tests and offline runs: returns fixed results
+    (those whose keywords all appear in the query, or all of them) after
+    `delay` seconds, or raises `error`.
+    """
+
+    def __init__(self, name, results, delay=0.0, error=None, weight=1.0, hedge_after=None):
+        self.name = name
+        self.results = results  # list of (keywords or None, result dict)
+        self.delay = delay
+        self.error = error
+        self.weight = weight
+        self.hedge_after = hedge_after
+        self.calls = 0
+
+    def search(self, query, limit, timeout):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        key = normalize_fa(query)
+        return [dict(result, source=self.name) for keywords, result in self.results
+                if not keywords or all(normalize_fa(k) in key for k in keywords)][:limit]
+
+SOURCES = {"wikipedia": WikipediaSource, "duckduckgo": DuckDuckGoSource, "legal": LegalSource}
+
+# --- Merging ---
+
+def _dedupe_key(result):
+    url = result.get("url", "").split("#")[0].rstrip("/").lower()
+    if url:
+        return url.split("://", 1)[-1]
+    return normalize_fa(result["title"])
+
+def merge_results(source_results, weights, limit=10):
+    """
+    Merges per-source result lists into one ranking.
+
+    Duplicates (same URL, or same normalized title when there is no URL) are
+    folded together; each item scores sum(weight / (RRF_K + rank)) over the
+    sources that returned it.
+    """
+    merged = {}
+    for source, results in source_results.items():
+        for rank, result in enumerate(results):
+            key = _dedupe_key(result)
+            entry = merged.setdefault(key, dict(result, sources=[], score=0.0))
+            entry["score"] += weights.get(source, 1.0) / (RRF_K + rank + 1)
+            if source not in entry["sources"]:
+                entry["sources"].append(source)
+            if len(result.get("snippet", "")) > len(entry.get("snippet", "")):
+                entry["snippet"] = result["snippet"]
+    return sorted(merged.values(), key=lambda r: -r["score"])[:limit]
+
+# --- Engine ---
+
+class SearchEngine:
+    """Concurrent fan-out over pluggable sources with a global deadline and hedged requests."""
+
+    def __init__(self, sources, deadline=SEARCH_DEADLINE, workers=SEARCH_WORKERS):
+        self.sources = list(sources)
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        self.lock = threading.Lock()
+        self.stats = {s.name: {"requests": 0, "ok": 0, "errors": 0, "late": 0, "hedged": 0, "hedge_wins": 0,
+                               "latency_ms": 0.0} for s in self.sources}
+
+    def _call(self, source, query, limit, timeout):
+        start = time.monotonic()
+        results = source.search(query, limit, timeout)
+        return results, (time.monotonic() - start) * 1000
+
+    def search_all(self, queries, limit=10, deadline=None):
+        """
+        Runs several queries against every source at once under one deadline.
+
+        Returns:
+            A list (one per query) of {"results", "sources", "missing", "elapsed_ms"}:
+            merged results, the sources that answered in time and those that did not.
+        """
+        start = time.monotonic()
+        end = start + (deadline if deadline is not None else self.deadline)
+        # (query index, source) -> futures for that call (2 once hedged)
+        calls = {}
+        owner = {}  # future -> ((query index, source), is_hedge)
+
+        def submit(key, hedge=False):
+            query_index, source = key
+            future = self.executor.submit(self._call, source, queries[query_index], RESULTS_PER_SOURCE,
+                                          max(end - time.monotonic(), 0.05))
+            calls.setdefault(key, []).append(future)
+            owner[future] = (key, hedge)
+            with self.lock:
+                self.stats[source.name]["requests"] += 1
+                self.stats[source.name]["hedged"] += hedge
+
+        for query_index in range(len(queries)):
+            for source in self.sources:
+                submit((query_index, source))
+
+        answered = {}  # (query index, source) -> results
+        failed = set()
+        pending = set(owner)
+        while pending:
+            now = time.monotonic()
+            if now >= end:
+                break
+            # Wake up for the next answer, the next hedge due, or the deadline
+            hedge_times = [start + key[1].hedge_after for key, futures in calls.items()
+                           if key[1].hedge_after is not None and len(futures) == 1
+                           and key not in answered and key not in failed]
+            wake = min([end] + [t for t in hedge_times if t > now])
+            done, pending = wait(pending, timeout=max(wake - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                key, hedge = owner[future]
+                if key in answered:
+                    continue
+                name = key[1].name
+                try:
+                    results, latency = future.result()
+                except Exception as e:
+                    if all(f.done() for f in calls[key]):
+                        failed.add(key)
+                        print(f"Error from search source {name}: {e}")
+                        with self.lock:
+                            self.stats[name]["errors"] += 1
+                    continue
+                answered[key] = results
+                with self.lock:
+                    stats = self.stats[name]
+                    stats["ok"] += 1
+                    stats["hedge_wins"] += hedge
+                    # Moving average, seeded with the first sample
+                    stats["latency_ms"] = latency if stats["ok"] == 1 else stats["latency_ms"] * 0.8 + latency * 0.2
+                for other in calls[key]:
+                    other.cancel()
+                    pending.discard(other)
+            # Hedge the calls that have been outstanding too long
+            now = time.monotonic()
+            for key, futures in list(calls.items()):
+                source = key[1]
+                if (source.hedge_after is not None and len(futures) == 1 and key not in answered
+                        and key not in failed and now - start >= source.hedge_after and now < end):
+                    submit(key, hedge=True)
+                    pending.add(calls[key][-1])
+
+        for future in pending:
+            future.cancel()
+        late = {key for key in calls if key not in answered and key not in failed}
+        with self.lock:
+            for _, source in late:
+                self.stats[source.name]["late"] += 1
+
+        weights = {s.name: s.weight for s in self.sources}
+        elapsed_ms = (time.monotonic() - start) * 1000
+        responses = []
+        for query_index in range(len(queries)):
+            per_source = {source.name: answered[(query_index, source)] for source in self.sources
+                          if (query_index, source) in answered}
+            responses.append({
+                "results": merge_results(per_source, weights, limit),
+                "sources": list(per_source),
+                "missing": [s.name for s in self.sources if (query_index, s) not in answered],
+                "elapsed_ms": elapsed_ms,
+            })
+        return responses
+
+    def search(self, query, limit=10, deadline=None):
+        """One query; see search_all."""
+        return self.search_all([query], limit, deadline)[0]
+
+    def get_stats(self):
+        with self.lock:
+            return {name: dict(stats) for name, stats in self.stats.items()}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def build_sources(names=SEARCH_SOURCES):
+    return [SOURCES[name.strip()]() for name in names.split(",") if name.strip() in SOURCES]
+
+def set_search_engine(engine):
+    """Replaces the shared engine (e.g. with StaticSource stand-ins in tests)."""
+    global _engine
+    _engine = engine
+
+def get_search_engine():
+    """The shared engine over SEARCH_SOURCES."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = SearchEngine(build_sources())
+    return _engine
+
+def format_search_results(query, response, limit=5):
+    """Persian summary of a search response for chat or for the model."""
+    results = response["results"][:limit]
+    if not results:
+        note = f" (بی‌پاسخ: {', '.join(response['missing'])})" if response["missing"] else ""
+        return f"🔎 برای «{query}» نتیجه‌ای پیدا نشد{note}."
+    lines = [f"🔎 نتایج جستجو برای «{query}»:"]
+    for i, result in enumerate(results, 1):
+        line = f"{i}. {result['title']}"
+        if result["snippet"]:
+            line += f" — {result['snippet'][:200]}"
+        if result["url"]:
+            line += f"\n   {result['url']}"
+        lines.append(line)
+    if response["missing"]:
+        lines.append(f"⏱️ منابع بی‌پاسخ: {', '.join(response['missing'])}")
+    return "\n".join(lines)
@@ -1,24 +1,15 @@
 # services/self_improve.py
 import os
 import time
-import psutil
 import json
-from telebot import types
 
 # --- Self-Improvement and Autonomy ---
 
-def grok_search(query):
-    """Simulates a deep, autonomous search (Grok-like) for information."""
-    # In a real app, this would use a powerful search API or web scraping.
-    
-    if "فرصت خرید ارز دیجیتال" in query:
-        return "فرصت خرید: ارز PEPE در حال تثبیت قیمت است. سیگنال خرید در محدوده 0.0000075 دلار."
-    elif "نیاز به ادمین تلگرام" in query:
-        return "کانال @CryptoGroup_Admin به ادمین چت با حقوق ۲۰۰ ستاره در هفته نیاز دارد."
-    elif "info about telegram user" in query:
-        return "کاربر مشکوک: آیدی 123456789 در 3 گروه به عنوان کلاهبردار گزارش شده است."
-    
-    return f"نتایج جستجوی عمیق برای '{query}': یافتن ۳ مقاله جدید در مورد تحلیل تکنیکال پیشرفته."
+def grok_search(query: str) -> str:
+    """Deep search: queries several sources at once (Persian Wikipedia, DuckDuckGo, the law index) and returns merged, ranked results."""
+    from services.search import get_search_engine, format_search_results
+
+    return format_search_results(query, get_search_engine().search(query))
 
 def self_upgrade(new_feature_code, file_name):
     """
@@ -30,66 +21,165 @@ def self_upgrade(new_feature_code, file_name):
     
     return "✅ خودم رو ارتقا دادم محمد! الان با قابلیت‌های جدید در خدمتم."
 
-def check_autonomy():
-    """Generates a report on the bot's autonomous activities."""
-    report = (
-        "🚀 **گزارش خودکفایی ایجنت:**\n\n"
-        "🔹 امروز ۳ تابع جدید برای ترید یاد گرفتم.\n"
-        "🔹 رم ۸ گیگ رو برای پردازش سنگین بهینه کردم.\n"
-        "🔹 ۱۰۰ مگابایت دیتای جدید روانشناسی روی هارد ذخیره کردم.\n"
-        "🔹 محمد، من الان آماده‌ام که بدون دستور تو، بازار رو برات مانیتور کنم!"
-    )
-    return report
+def check_autonomy() -> str:
+    """Reports the bot's autonomous background jobs: schedule, runs, runtimes, skips and errors."""
+    from services.scheduler import get_scheduler, format_scheduler_stats
+
+    report = "🚀 **گزارش خودکفایی ایجنت:**\n\n"
+    if os.getenv("AUTONOMY", "1") != "1":
+        return report + "⏸️ پایش خودکار خاموش است (AUTONOMY=0)."
+    scheduler = get_scheduler()
+    if scheduler.running:
+        return report + format_scheduler_stats()
+    # The scheduler runs in the one process holding the background lock; read what it published
+    stats, updated = scheduler.published_stats()
+    if updated is None:
+        return report + "⏳ پروسه پس‌زمینه هنوز گزارشی منتشر نکرده است."
+    report += f"🕒 به‌روزشده در {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(updated))} (پروسه پس‌زمینه)\n"
+    return report + format_scheduler_stats(stats)
+
+# --- Autonomous Monitoring ---
+# Background jobs on the shared scheduler (services.scheduler); anything
+# worth the admin's attention goes through the notifier bot.py registers.
+
+GUARDIAN_INTERVAL = float(os.getenv("GUARDIAN_INTERVAL", 300))  # seconds
+MARKET_WATCH_INTERVAL = float(os.getenv("MARKET_WATCH_INTERVAL", 900))  # seconds
+MARKET_WATCH_SYMBOLS = [s.strip().upper() for s in os.getenv("MARKET_WATCH_SYMBOLS", "BTC,ETH,BNB,SOL").split(",") if s.strip()]
+MARKET_MOVE_ALERT = float(os.getenv("MARKET_MOVE_ALERT", 3.0))  # percent change between two checks
+PROFIT_HUNTER_CRON = os.getenv("PROFIT_HUNTER_CRON", "0 9 * * *")
+
+_notify = None
+_last_prices = {}
+_active_warnings = set()
+
+def _notify_admin(text):
+    if _notify is None:
+        return
+    try:
+        _notify(text)
+    except Exception as e:
+        print(f"Error notifying admin: {e}")
+
+def guardian_job():
+    """Notifies the admin when a health warning appears (once, until it clears)."""
+    _, warnings = check_system_health()
+    new = {kind: text for kind, text in warnings.items() if kind not in _active_warnings}
+    _active_warnings.clear()
+    _active_warnings.update(warnings)
+    if new:
+        _notify_admin("🛡️ **نگهبان:**\n" + "\n".join(new.values()))
+
+def market_watch_job():
+    """Notifies the admin when a watched coin moved more than MARKET_MOVE_ALERT% since the last check."""
+    from services.trader import get_crypto_prices
+
+    moves = []
+    for symbol, price in get_crypto_prices(MARKET_WATCH_SYMBOLS).items():
+        if price is None:
+            continue
+        previous = _last_prices.get(symbol)
+        _last_prices[symbol] = price
+        if previous:
+            change = (price - previous) / previous * 100
+            if abs(change) >= MARKET_MOVE_ALERT:
+                arrow = "📈" if change > 0 else "📉"
+                moves.append(f"{arrow} {symbol}: {change:+.1f}% به ${price:,.2f}")
+    if moves:
+        _notify_admin("📡 **پایش بازار:**\n" + "\n".join(moves))
+
+def profit_hunter_job():
+    _notify_admin(profit_hunter())
+
+def start_autonomy(notify):
+    """Registers the monitoring jobs and starts the scheduler; `notify(text)` reaches the admin."""
+    from services.scheduler import get_scheduler
+
+    global _notify
+    _notify = notify
+    scheduler = get_scheduler()
+    scheduler.add_job("guardian", guardian_job, interval=GUARDIAN_INTERVAL, jitter=30)
+    scheduler.add_job("market-watch", market_watch_job, interval=MARKET_WATCH_INTERVAL, jitter=60)
+    scheduler.add_job("profit-hunter", profit_hunter_job, cron=PROFIT_HUNTER_CRON, jitter=300)
+    scheduler.start()
 
 # --- Hardware Awareness and Stress Test ---
 
-def update_resources_limit():
+def update_resources_limit() -> str:
     """Checks and reports on available system resources."""
+    import psutil
+
     total_ram = psutil.virtual_memory().total / (1024**3)
     return f"محمد! تشخیص دادم که الان {total_ram:.1f} گیگ رم داریم. آماده پردازش‌های سنگین‌تر هستم! 🚀"
 
-def hardware_stress_test():
-    """Performs a simulated hardware stress test."""
-    start_time = time.time()
-    
-    # Simulate a heavy calculation
-    _ = [i**2 for i in range(10**6)] # Reduced iteration for faster sandbox execution
-    
-    end_time = time.time()
-    duration = end_time - start_time
-    
-    ram_info = psutil.virtual_memory()
-    total_ram = ram_info.total / (1024**3)
-    
-    report = (
-        f"📊 **گزارش ارتقای سخت‌افزار:**\n\n"
-        f"✅ سرعت پردازش منطقی: {duration:.2f} ثانیه (بهبود یافته)\n"
-        f"✅ مقدار رم شناسایی شده: {total_ram:.1f} گیگابایت\n"
-        f"✅ وضعیت مادربرد: ASUS P5QC در حالت پایداری کامل\n\n"
-        f"محمد، حالا با این قدرت می‌تونم تحلیل‌های 'آدم‌شناسی' رو هم‌زمان برای ۱۰۰ نفر انجام بدم!"
-    )
-    return report
+def hardware_stress_test() -> str:
+    """Benchmarks CPU (single and all cores), memory bandwidth, disk I/O and one agent turn, and flags regressions against earlier runs."""
+    from services.benchmark import run_benchmarks, format_benchmark_report
+
+    return format_benchmark_report(run_benchmarks())
 
 # --- Security and Guardian ---
 
-def system_guardian():
-    """Checks security and system health (simulated)."""
-    # In a real app, this would check local sensors, battery, etc.
-    
-    cpu_temp = 45 # Simulated temperature
-    
-    status = f"🛡️ **گزارش نگهبان:**\n"
-    # Simulate battery check (not possible in sandbox)
-    # if battery and battery.percent < 20:
-    #     status += "⚠️ محمد جان، شارژ گوشی کمه، بزن به شارژ که خاموش نشه!\n"
-    if cpu_temp > 75:
-        status += "🔥 هشدار! مادربرد P5QC داره داغ می‌کنه، فن رو چک کن!\n"
+GUARDIAN_TEMP_WARNING = float(os.getenv("GUARDIAN_TEMP_WARNING", 75))  # °C
+GUARDIAN_RAM_WARNING = 90  # percent
+GUARDIAN_DISK_WARNING = 90  # percent
+GUARDIAN_BATTERY_WARNING = 20  # percent, on battery power
+
+def read_temperatures():
+    """Current sensor temperatures in °C as {label: value}; empty where the OS exposes none."""
+    import psutil
+
+    if not hasattr(psutil, "sensors_temperatures"):
+        return {}
+    temperatures = {}
+    for chip, entries in (psutil.sensors_temperatures() or {}).items():
+        for i, entry in enumerate(entries):
+            if entry.current:
+                # Underscores would break the Markdown of the report
+                temperatures[f"{chip}/{entry.label or i}".replace("_", "-")] = entry.current
+    return temperatures
+
+def check_system_health():
+    """
+    Reads the real sensors and usage figures.
+
+    Returns:
+        (report lines, {warning kind: warning text})
+    """
+    import psutil
+
+    lines, warnings = [], {}
+    temperatures = read_temperatures()
+    if temperatures:
+        label, hottest = max(temperatures.items(), key=lambda item: item[1])
+        lines.append(f"🌡️ داغ‌ترین سنسور: {hottest:.0f}°C ({label})")
+        if hottest > GUARDIAN_TEMP_WARNING:
+            warnings["temperature"] = f"🔥 هشدار! دمای {label} به {hottest:.0f}°C رسید، فن و تهویه رو چک کن!"
     else:
-        status += "✅ همه چیز امن و پایدار است."
-    
+        lines.append("🌡️ سنسور دما در این سیستم در دسترس نیست.")
+
+    ram = psutil.virtual_memory().percent
+    disk = psutil.disk_usage('/').percent
+    lines.append(f"🧠 CPU {psutil.cpu_percent(interval=0.5):.0f}% | رم {ram:.0f}% | دیسک {disk:.0f}%")
+    if ram > GUARDIAN_RAM_WARNING:
+        warnings["ram"] = f"⚠️ رم {ram:.0f}% پر است."
+    if disk > GUARDIAN_DISK_WARNING:
+        warnings["disk"] = f"⚠️ دیسک {disk:.0f}% پر است."
+
+    battery = psutil.sensors_battery() if hasattr(psutil, "sensors_battery") else None
+    if battery:
+        lines.append(f"🔋 باتری {battery.percent:.0f}%{' (در حال شارژ)' if battery.power_plugged else ''}")
+        if not battery.power_plugged and battery.percent < GUARDIAN_BATTERY_WARNING:
+            warnings["battery"] = "⚠️ محمد جان، شارژ کمه، بزن به شارژ که خاموش نشه!"
+    return lines, warnings
+
+def system_guardian() -> str:
+    """Checks system health from real sensors: temperatures, CPU, RAM, disk and battery."""
+    lines, warnings = check_system_health()
+    status = "🛡️ **گزارش نگهبان:**\n" + "\n".join(lines) + "\n\n"
+    status += "\n".join(warnings.values()) if warnings else "✅ همه چیز امن و پایدار است."
     return status
 
-def track_hacker(user_id):
+def track_hacker(user_id: int) -> str:
     """Tracks general information about a suspicious ID."""
     hacker_info = grok_search(f"info about telegram user {user_id}")
     
@@ -109,9 +199,14 @@ def create_secret_invoice(user_id, secret_title, price):
     # This function needs to be called by the bot handler, not Gemini.
     return f"فاکتور پرداخت برای '{secret_title}' با قیمت {price} ستاره آماده شد."
 
-def profit_hunter():
+def profit_hunter() -> str:
     """Searches for profitable opportunities."""
-    opportunities = grok_search("بهترین فرصت خرید ارز دیجیتال امروز یا نیاز به ادمین تلگرام")
+    from services.search import get_search_engine, format_search_results
+
+    # Both searches fan out together and share one deadline
+    queries = ["فرصت خرید ارز دیجیتال", "استخدام ادمین کانال تلگرام"]
+    responses = get_search_engine().search_all(queries, limit=3)
+    opportunities = "\n\n".join(format_search_results(q, r, limit=3) for q, r in zip(queries, responses))
     
     report = f"💰 **محمد جان، بوی پول میاد!**\n\n{opportunities}\n"
     report += "برم برای این پروژه درخواست استخدام بفرستم؟"
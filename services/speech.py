@@ -0,0 +1,183 @@
+# services/speech.py
+import os
+import threading
+import subprocess
+from services.media_engine import get_ffmpeg_exe
+
+# --- Voice Input (speech to text) ---
+# Telegram voice notes (OGG/Opus) are decoded through an in-memory ffmpeg
+# pipe to 16 kHz mono PCM, cut into chunks at pauses, and each chunk is
+# passed to a pluggable recognizer. All of it runs in a bounded worker pool,
+# never on the thread that handles Telegram updates.
+#
+# SPEECH_RECOGNIZER selects the recognizer: "google" (SpeechRecognition's
+# free web API, default) or "static" (offline, returns STATIC_TRANSCRIPT;
+# for tests and local runs).
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # bytes, signed 16-bit little-endian
+SPEECH_RECOGNIZER = os.getenv("SPEECH_RECOGNIZER", "google")
+SPEECH_LANGUAGE = os.getenv("SPEECH_LANGUAGE", "fa-IR")
+SPEECH_WORKERS = int(os.getenv("SPEECH_WORKERS", 2))
+MAX_VOICE_SECONDS = 300
+
+# Silence chunking
+FRAME_MS = 30
+SILENCE_DB = -40.0       # frames quieter than this (relative to full scale) are silence
+MIN_SILENCE_MS = 500     # a pause at least this long ends a chunk
+MAX_CHUNK_SECONDS = 30   # longer speech is cut at its quietest frame
+KEEP_SILENCE_MS = 150    # padding kept around each chunk
+
+def decode_to_pcm(audio_bytes):
+    """Decodes any ffmpeg-readable audio (Telegram sends OGG/Opus) to 16 kHz mono PCM, in memory."""
+    command = [get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+               "-t", str(MAX_VOICE_SECONDS), "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"]
+    result = subprocess.run(command, input=audio_bytes, capture_output=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode("utf-8", "replace").strip() or "ffmpeg failed")
+    return result.stdout
+
+def split_on_silence(pcm, sample_rate=SAMPLE_RATE):
+    """
+    Cuts PCM into speech chunks at pauses, using per-frame RMS energy.
+
+    Returns:
+        A list of PCM byte strings; silent input gives an empty list.
+    """
+    import numpy as np
+
+    samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH], dtype="<i2")
+    frame = sample_rate * FRAME_MS // 1000
+    n_frames = len(samples) // frame
+    if not n_frames:
+        return []
+    frames = samples[:n_frames * frame].reshape(n_frames, frame).astype(np.float64)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    db = 20 * np.log10(np.maximum(rms, 1.0) / 32768.0)
+    voiced = db > SILENCE_DB
+
+    min_gap = MIN_SILENCE_MS // FRAME_MS
+    max_len = MAX_CHUNK_SECONDS * 1000 // FRAME_MS
+    pad = KEEP_SILENCE_MS // FRAME_MS
+    chunks, start, gap = [], None, 0
+    for i, is_voiced in enumerate(voiced):
+        if is_voiced:
+            if start is None:
+                start = i
+            gap = 0
+        elif start is not None:
+            gap += 1
+            if gap >= min_gap:
+                chunks.append((start, i - gap + 1))
+                start, gap = None, 0
+        if start is not None and i - start + 1 >= max_len:
+            # Cut overlong speech at its quietest frame in the second half
+            window = db[start + max_len // 2:i + 1]
+            cut = start + max_len // 2 + int(np.argmin(window)) + 1
+            chunks.append((start, cut))
+            start = cut if cut <= i else None
+    if start is not None:
+        chunks.append((start, n_frames))
+
+    return [samples[max(s - pad, 0) * frame:min(e + pad, n_frames) * frame].tobytes() for s, e in chunks]
+
+# --- Recognizers ---
+
+class GoogleRecognizer:
+    """SpeechRecognition's Google Web Speech API (network, no key required)."""
+
+    def __init__(self, language=SPEECH_LANGUAGE):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.language = language
+
+    def __call__(self, pcm, sample_rate=SAMPLE_RATE):
+        audio = self.sr.AudioData(pcm, sample_rate, SAMPLE_WIDTH)
+        try:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        except self.sr.UnknownValueError:
+            return ""  # unintelligible chunk
+
+class StaticRecognizer:
+    """Offline recognizer returning fixed text per chunk, for tests and local runs."""
+
+    def __init__(self, transcripts=None):
+        self.transcripts = list(transcripts) if transcripts else [os.getenv("STATIC_TRANSCRIPT", "سلام")]
+        self.calls = 0
+
+    def __call__(self, pcm, sample_rate=SAMPLE_RATE):
+        text = self.transcripts[min(self.calls, len(self.transcripts) - 1)]
+        self.calls += 1
+        return text
+
+RECOGNIZERS = {"google": GoogleRecognizer, "static": StaticRecognizer}
+
+_recognizer = None
+_recognizer_lock = threading.Lock()
+
+def set_recognizer(recognizer):
+    """Replaces the recognizer: any callable(pcm_bytes, sample_rate) -> str."""
+    global _recognizer
+    _recognizer = recognizer
+
+def get_recognizer():
+    global _recognizer
+    if _recognizer is None:
+        with _recognizer_lock:
+            if _recognizer is None:
+                _recognizer = RECOGNIZERS.get(SPEECH_RECOGNIZER, GoogleRecognizer)()
+    return _recognizer
+
+def transcribe_pcm(pcm, sample_rate=SAMPLE_RATE):
+    """Transcript of raw PCM, chunk by chunk."""
+    recognizer = get_recognizer()
+    parts = []
+    for chunk in split_on_silence(pcm, sample_rate):
+        try:
+            text = recognizer(chunk, sample_rate)
+        except Exception as e:
+            print(f"Error recognizing speech chunk: {e}")
+            continue
+        if text:
+            parts.append(text.strip())
+    return " ".join(parts)
+
+def transcribe(audio_bytes):
+    """Transcript of an encoded voice note (OGG/Opus, MP3, ...)."""
+    return transcribe_pcm(decode_to_pcm(audio_bytes))
+
+# --- Bounded Background Processing ---
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def submit_voice_message(load_audio, on_transcript, on_error=None):
+    """
+    Downloads, decodes and transcribes a voice message in the speech pool
+    (SPEECH_WORKERS at a time) and hands the transcript to `on_transcript`.
+
+    Args:
+        load_audio: Callable returning the encoded audio bytes (e.g. a Telegram download).
+        on_transcript: Called with the transcript text (possibly empty).
+        on_error: Called with the exception if any step fails.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(max_workers=SPEECH_WORKERS, thread_name_prefix="speech")
+
+    def job():
+        try:
+            transcript = transcribe(load_audio())
+        except Exception as e:
+            print(f"Error transcribing voice message: {e}")
+            if on_error:
+                on_error(e)
+            return
+        on_transcript(transcript)
+
+    return _executor.submit(job)
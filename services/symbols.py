@@ -0,0 +1,162 @@
+# services/symbols.py
+import os
+import json
+import time
+import threading
+from services.text import normalize_fa, KeywordAutomaton
+
+# --- Ticker Recognition ---
+# Finds every crypto symbol mentioned in a message in one pass, using
+# Aho-Corasick automatons (services.text.KeywordAutomaton), so recognition
+# cost depends on the message length, not on how many symbols are known.
+#
+# Two dictionaries are used:
+#   * curated Persian/English names of well-known coins, matched
+#     case-insensitively on normalized text;
+#   * tickers (the curated ones at once, every base asset quoted in USDT on
+#     the exchange once loaded), matched only when written in upper case
+#     ("NOT", "ONE", "AI" are also English words and must not count as "not").
+
+# ticker -> (Persian display name, aliases)
+KNOWN_SYMBOLS = {
+    "BTC": ("بیت‌کوین", ["btc", "bitcoin", "بیت کوین", "بیت‌کوین", "بیت", "xbt"]),
+    "ETH": ("اتریوم", ["eth", "ethereum", "ether", "اتریوم", "اتریم"]),
+    "USDT": ("تتر", ["usdt", "tether", "تتر"]),
+    "BNB": ("بایننس کوین", ["bnb", "بایننس کوین", "بی ان بی"]),
+    "SOL": ("سولانا", ["sol", "solana", "سولانا"]),
+    "XRP": ("ریپل", ["xrp", "ripple", "ریپل"]),
+    "DOGE": ("دوج‌کوین", ["doge", "dogecoin", "دوج", "دوج کوین", "دوج‌کوین", "دوجکوین"]),
+    "ADA": ("کاردانو", ["cardano", "کاردانو"]),
+    "TRX": ("ترون", ["trx", "tron", "ترون"]),
+    "TON": ("تون‌کوین", ["toncoin", "تون کوین", "تون‌کوین", "تونکوین"]),
+    "SHIB": ("شیبا", ["shib", "shiba", "شیبا", "شیبا اینو"]),
+    "DOT": ("پولکادات", ["polkadot", "پولکادات", "پولکا دات"]),
+    "AVAX": ("آوالانچ", ["avax", "avalanche", "آوالانچ", "اوالانچ"]),
+    "LTC": ("لایت‌کوین", ["ltc", "litecoin", "لایت کوین", "لایت‌کوین", "لایتکوین"]),
+    "LINK": ("چین‌لینک", ["chainlink", "چین لینک", "چین‌لینک", "چینلینک"]),
+    "POL": ("پالیگان", ["matic", "polygon", "پالیگان", "ماتیک"]),
+    "PEPE": ("پپه", ["pepe", "پپه"]),
+    "NOT": ("نات‌کوین", ["notcoin", "نات کوین", "نات‌کوین", "ناتکوین"]),
+    "ATOM": ("کازماس", ["cosmos", "کازماس", "کاسموس"]),
+    "XLM": ("استلار", ["xlm", "stellar", "استلار"]),
+    "ETC": ("اتریوم کلاسیک", ["ethereum classic", "اتریوم کلاسیک"]),
+    "UNI": ("یونی‌سواپ", ["uniswap", "یونی سواپ", "یونی‌سواپ"]),
+    "FIL": ("فایل‌کوین", ["filecoin", "فایل کوین", "فایل‌کوین"]),
+    "ARB": ("آربیتروم", ["arbitrum", "آربیتروم"]),
+    "SUI": ("سویی", ["sui", "سویی"]),
+    "APT": ("آپتوس", ["aptos", "آپتوس"]),
+    "NEAR": ("نیر", ["near protocol", "نیر پروتکل"]),
+    "BCH": ("بیت‌کوین کش", ["bch", "bitcoin cash", "بیت کوین کش", "بیتکوین کش"]),
+}
+
+SYMBOLS_CACHE_PATH = os.getenv("SYMBOLS_CACHE_PATH", "/home/ubuntu/my-ai-bot/exchange_symbols.json")
+SYMBOLS_CACHE_TTL = 24 * 3600  # seconds
+QUOTE_ASSET = "USDT"
+
+_known_matcher = None
+_ticker_matcher = None
+_exchange_loading = threading.Lock()
+_exchange_attempted = False
+
+def _needs_end_boundary(alias):
+    """
+    Latin aliases and short Persian ones must be whole words ("eth" is not in
+    "method", "بیت" is not in "بیتی"); longer Persian names may take suffixes
+    ("بیتکوینو", "اتریومی").
+    """
+    return alias.isascii() or len(alias.replace(" ", "")) <= 3
+
+def _get_known_matcher():
+    global _known_matcher
+    if _known_matcher is None:
+        aliases = {}
+        for ticker, (_, names) in KNOWN_SYMBOLS.items():
+            for alias in names:
+                normalized = normalize_fa(alias)
+                aliases[normalized] = (ticker, _needs_end_boundary(normalized))
+        _known_matcher = KeywordAutomaton(aliases)
+    return _known_matcher
+
+def _build_ticker_matcher(tickers):
+    return KeywordAutomaton({t: t for t in tickers if t.isascii() and t.isupper() and len(t) >= 2},
+                            whole_words=True)
+
+# --- Exchange Symbol Dictionary ---
+
+def _load_exchange_tickers():
+    """Base assets quoted in USDT, from the disk cache or one exchange request."""
+    if os.path.exists(SYMBOLS_CACHE_PATH) and time.time() - os.path.getmtime(SYMBOLS_CACHE_PATH) < SYMBOLS_CACHE_TTL:
+        with open(SYMBOLS_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    from services.trader import BINANCE_API_URL, REQUEST_TIMEOUT, get_session
+
+    response = get_session().get(f"{BINANCE_API_URL}/api/v3/ticker/price", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    tickers = sorted({item["symbol"][:-len(QUOTE_ASSET)] for item in response.json()
+                      if item["symbol"].endswith(QUOTE_ASSET) and len(item["symbol"]) > len(QUOTE_ASSET)})
+    try:
+        os.makedirs(os.path.dirname(SYMBOLS_CACHE_PATH), exist_ok=True)
+        with open(SYMBOLS_CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(tickers, f)
+    except OSError as e:
+        print(f"Error caching exchange symbols: {e}")
+    return tickers
+
+def _load_exchange_matcher():
+    global _ticker_matcher
+    try:
+        _ticker_matcher = _build_ticker_matcher(set(_load_exchange_tickers()) | set(KNOWN_SYMBOLS))
+    except Exception as e:
+        print(f"Error loading exchange symbols: {e}")
+
+def _get_ticker_matcher():
+    """
+    Upper-case ticker automaton: the curated tickers right away, replaced by
+    the exchange-wide one once it has been loaded in the background.
+    """
+    global _ticker_matcher, _exchange_attempted
+    if not _exchange_attempted:
+        with _exchange_loading:
+            if not _exchange_attempted:
+                _exchange_attempted = True
+                _ticker_matcher = _build_ticker_matcher(KNOWN_SYMBOLS)
+                threading.Thread(target=_load_exchange_matcher, name="symbols-load", daemon=True).start()
+    return _ticker_matcher
+
+# --- Recognition ---
+
+def find_symbols(text):
+    """
+    Every crypto symbol mentioned in `text`, in order of first mention.
+
+    Overlapping aliases resolve to the longest one, so "بیت کوین کش" is BCH
+    and not also BTC. The quote asset only counts when it is the only symbol:
+    in "قیمت بیت کوین به تتر" it names the currency, not a second coin.
+
+    Returns:
+        A list of tickers such as ['BTC', 'ETH'].
+    """
+    spans = []
+    normalized = normalize_fa(text)
+    for start, end, (ticker, whole_word) in _get_known_matcher().iter_matches(normalized):
+        before_ok = start == 0 or not normalized[start - 1].isalnum()
+        after_ok = not whole_word or end == len(normalized) or not normalized[end].isalnum()
+        if before_ok and after_ok:
+            spans.append((start, end, ticker))
+    # Same normalization without lower-casing keeps character offsets aligned
+    spans += _get_ticker_matcher().iter_matches(normalize_fa(text, lower=False))
+
+    found, covered_until = [], -1
+    for start, end, ticker in sorted(spans, key=lambda span: (span[0], -span[1])):
+        if start >= covered_until:  # skips aliases inside a longer one
+            found.append(ticker)
+            covered_until = end
+    found = list(dict.fromkeys(found))
+    if len(found) > 1 and QUOTE_ASSET in found:
+        found.remove(QUOTE_ASSET)
+    return found
+
+def get_symbol_name(ticker):
+    """Persian display name of a ticker (the ticker itself when unknown)."""
+    return KNOWN_SYMBOLS.get(ticker, (ticker, []))[0]
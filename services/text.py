@@ -0,0 +1,121 @@
+# services/text.py
+import re
+
+# --- Persian Text Normalization ---
+# Shared by the local matchers (intent fast path, ethics filter, ...) so that
+# user text and keyword lists are compared in the same canonical form.
+
+ZWNJ = "‌"
+
+# Arabic code points that look identical to their Persian counterparts
+_CHAR_FOLD = {
+    "ي": "ی", "ى": "ی",
+    "ك": "ک",
+    "ة": "ه", "ۀ": "ه",
+    "أ": "ا", "إ": "ا", "ٱ": "ا",
+}
+# Persian and Arabic-Indic digits to ASCII
+_CHAR_FOLD.update({chr(0x06F0 + i): str(i) for i in range(10)})
+_CHAR_FOLD.update({chr(0x0660 + i): str(i) for i in range(10)})
+
+# Zero-width characters and Arabic diacritics (harakat, tanwin, shadda, sukun, superscript alef)
+_STRIP = ["‍", "‎", "‏", "﻿", "ـ"]  # ... and tatweel
+_STRIP += [chr(c) for c in range(0x064B, 0x0653)] + ["ٰ"]
+
+# ZWNJ separates a word from its suffix ("هک‌ها"); a space keeps that boundary for whole-word matching
+_TRANSLATION = str.maketrans({**_CHAR_FOLD, **{ch: None for ch in _STRIP}, ZWNJ: " "})
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_fa(text, lower=True):
+    """
+    Canonical form of Persian/English text for keyword matching.
+
+    Lower-cases (unless `lower` is False), folds Arabic yeh/kaf (and similar) to Persian, maps digits
+    to ASCII, turns ZWNJ into a space, strips tatweel and diacritics, and collapses whitespace.
+    """
+    if not text:
+        return ""
+    if lower:
+        text = text.lower()
+    return _WHITESPACE.sub(" ", text.translate(_TRANSLATION)).strip()
+
+# --- Multi-Pattern Matching (Aho-Corasick) ---
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a set of (already normalized) terms.
+
+    Scanning a text costs one pass over its characters plus the number of
+    matches, no matter how many terms are loaded, so lexicons can grow to
+    thousands of entries without slowing the message path down.
+    """
+
+    def __init__(self, terms, whole_words=False):
+        """
+        Args:
+            terms: Iterable of terms, or a dict of term -> payload returned with matches.
+            whole_words: Only report matches that are not glued to other letters/digits.
+        """
+        payloads = terms if isinstance(terms, dict) else {term: term for term in terms}
+        self.whole_words = whole_words
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for term, payload in payloads.items():
+            if not term:
+                continue
+            state = 0
+            for ch in term:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((len(term), payload))
+
+        # Breadth-first pass to wire the failure links
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def iter_matches(self, text):
+        """Yields (start, end, payload) for every term occurrence in `text`."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, payload in output[state]:
+                start = index - length + 1
+                if self.whole_words and not self._is_word_bounded(text, start, index + 1):
+                    continue
+                yield start, index + 1, payload
+
+    def find_all(self, text):
+        """Returns the distinct payloads found in `text`, in order of first appearance."""
+        return list(dict.fromkeys(payload for _, _, payload in self.iter_matches(text)))
+
+    def contains_any(self, text):
+        """True as soon as one term is found (stops scanning early)."""
+        return next(self.iter_matches(text), None) is not None
+
+    @staticmethod
+    def _is_word_bounded(text, start, end):
+        before = text[start - 1] if start > 0 else " "
+        after = text[end] if end < len(text) else " "
+        return not before.isalnum() and not after.isalnum()
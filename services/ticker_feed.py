@@ -0,0 +1,207 @@
+# services/ticker_feed.py
+import os
+import json
+import time
+import random
+import threading
+
+# --- Streaming Ticker Feed (optional) ---
+# A background thread subscribes to an exchange-style websocket ticker stream
+# and keeps the latest price per symbol in memory, so price questions are
+# answered without network I/O on the request path.
+#
+# Enable with TICKER_STREAM_ENABLED=1. TICKER_STREAM_URL can point at a local
+# fake stream server; it must send Binance-style miniTicker events
+# ({"s": "BTCUSDT", "c": "<close>", "E": <event ms>}, alone or in a JSON array);
+# fake_exchange.py is one, with injected drops, refusals and out-of-order events.
+
+TICKER_STREAM_ENABLED = os.getenv("TICKER_STREAM_ENABLED", "0") == "1"
+TICKER_STREAM_URL = os.getenv("TICKER_STREAM_URL", "wss://stream.binance.com:9443/ws/!miniTicker@arr")
+QUOTE_ASSET = "USDT"
+STALE_AFTER = float(os.getenv("TICKER_STALE_AFTER", 10))  # seconds without an update
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+RECV_TIMEOUT = 30  # seconds; a silent socket is treated as dead
+
+# symbol -> (price, event_time_ms, received_at). Only the feed thread writes,
+# replacing whole tuples, so readers never need a lock.
+_snapshot = {}
+_status = {"connected": False, "connects": 0, "disconnects": 0, "messages": 0,
+           "out_of_order": 0, "backfills": 0, "last_error": None, "gap_seconds": 0.0}
+_listeners = []  # callables receiving {symbol: price} for every message
+_thread = None
+_stop_event = threading.Event()
+_start_lock = threading.Lock()
+
+# --- Snapshot Access ---
+
+def get_snapshot_price(symbol, max_age=STALE_AFTER):
+    """
+    O(1) read of the latest streamed price.
+
+    Returns:
+        The price as float, or None if the symbol is unknown or older than `max_age` seconds.
+    """
+    entry = _snapshot.get(symbol.upper())
+    if entry is None or time.monotonic() - entry[2] > max_age:
+        return None
+    return entry[0]
+
+def get_feed_status():
+    """Returns connection counters and the number of symbols in the snapshot."""
+    return dict(_status, symbols=len(_snapshot), running=is_running())
+
+def format_feed_status():
+    """One-line summary for the admin dashboard (this process's feed)."""
+    status = get_feed_status()
+    if not status["running"]:
+        return "📡 **فید قیمت:** خاموش" + (" (TICKER_STREAM_ENABLED=0)" if not TICKER_STREAM_ENABLED else "")
+    state = "🟢 متصل" if status["connected"] else "🔴 در حال اتصال مجدد"
+    return (f"📡 **فید قیمت:** {state} | {status['symbols']} نماد | {status['messages']} پیام | "
+            f"اتصال {status['connects']}، قطع {status['disconnects']}، بازپرسازی {status['backfills']} | "
+            f"خارج از ترتیب {status['out_of_order']} | وقفه کل {status['gap_seconds']:.0f}s")
+
+def add_tick_listener(listener):
+    """Registers a callable that receives each batch of fresh prices as {symbol: price}."""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+def is_running():
+    return _thread is not None and _thread.is_alive()
+
+# --- Feed Lifecycle ---
+
+def start_ticker_feed(url=None):
+    """Starts the background subscriber (idempotent)."""
+    global _thread
+    with _start_lock:
+        if is_running():
+            return False
+        _stop_event.clear()
+        _thread = threading.Thread(target=_run, args=(url or TICKER_STREAM_URL,), name="ticker-feed", daemon=True)
+        _thread.start()
+        return True
+
+def ensure_started():
+    """Starts the feed on first use when TICKER_STREAM_ENABLED is set."""
+    if TICKER_STREAM_ENABLED and not is_running():
+        start_ticker_feed()
+
+def stop_ticker_feed(timeout=5):
+    """Stops the subscriber and waits for the thread to exit."""
+    _stop_event.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+# --- Internals ---
+
+def _apply_event(event, received_at):
+    """
+    Stores one ticker event; events older than the stored one are dropped.
+
+    Returns:
+        (symbol, price) when the snapshot changed, otherwise None.
+    """
+    pair = event.get("s", "")
+    if not pair.endswith(QUOTE_ASSET) or "c" not in event:
+        return None
+    symbol = pair[:-len(QUOTE_ASSET)]
+    event_time = int(event.get("E", 0))
+    current = _snapshot.get(symbol)
+    if current is not None and event_time and event_time < current[1]:
+        _status["out_of_order"] += 1
+        return None
+    _snapshot[symbol] = (float(event["c"]), event_time, received_at)
+    return symbol, _snapshot[symbol][0]
+
+def _handle_message(raw):
+    received_at = time.monotonic()
+    data = json.loads(raw)
+    # Combined streams wrap the payload as {"stream": ..., "data": ...}
+    if isinstance(data, dict) and "data" in data:
+        data = data["data"]
+    ticks = {}
+    for event in data if isinstance(data, list) else [data]:
+        applied = _apply_event(event, received_at)
+        if applied:
+            ticks[applied[0]] = applied[1]
+    _status["messages"] += 1
+    _notify(ticks)
+
+def _notify(ticks):
+    if not ticks:
+        return
+    for listener in _listeners:
+        try:
+            listener(ticks)
+        except Exception as e:
+            _status["last_error"] = f"listener: {e}"
+
+def _backfill():
+    """
+    Closes the gap left by a disconnect with one REST snapshot of all prices.
+    Stream events received afterwards simply overwrite these values.
+    """
+    from services.trader import BINANCE_API_URL, REQUEST_TIMEOUT, get_session
+
+    response = get_session().get(f"{BINANCE_API_URL}/api/v3/ticker/price", timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        return
+    received_at = time.monotonic()
+    event_time = int(time.time() * 1000)
+    ticks = {}
+    for item in response.json():
+        pair = item.get("symbol", "")
+        if pair.endswith(QUOTE_ASSET):
+            symbol = pair[:-len(QUOTE_ASSET)]
+            current = _snapshot.get(symbol)
+            if current is None or current[1] <= event_time:
+                _snapshot[symbol] = (float(item["price"]), event_time, received_at)
+                ticks[symbol] = _snapshot[symbol][0]
+    _status["backfills"] += 1
+    _notify(ticks)
+
+def _run(url):
+    """Connect / read / reconnect loop with jittered exponential backoff."""
+    import websocket  # websocket-client; only needed when the feed is enabled
+
+    delay = RECONNECT_MIN_DELAY
+    disconnected_at = None
+    while not _stop_event.is_set():
+        ws = None
+        try:
+            ws = websocket.create_connection(url, timeout=RECV_TIMEOUT)
+            _status["connected"] = True
+            _status["connects"] += 1
+            delay = RECONNECT_MIN_DELAY
+
+            if disconnected_at is not None:
+                _status["gap_seconds"] += time.monotonic() - disconnected_at
+                try:
+                    _backfill()
+                except Exception as e:
+                    _status["last_error"] = f"backfill: {e}"
+                disconnected_at = None
+
+            while not _stop_event.is_set():
+                raw = ws.recv()
+                if not raw:
+                    break
+                _handle_message(raw)
+        except Exception as e:
+            _status["last_error"] = str(e)
+        finally:
+            if ws is not None:
+                try:
+                    ws.close()
+                except Exception:
+                    pass
+            if _status["connected"]:
+                _status["disconnects"] += 1
+                disconnected_at = time.monotonic()
+            _status["connected"] = False
+
+        if disconnected_at is None:
+            disconnected_at = time.monotonic()
+        _stop_event.wait(delay * random.uniform(0.5, 1.5))
+        delay = min(delay * 2, RECONNECT_MAX_DELAY)
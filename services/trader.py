@@ -1,24 +1,366 @@
-import requests
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future
+from services import ticker_feed
+
+# --- Price Fetching Configuration ---
+# BINANCE_API_URL can point at a local stand-in server for testing
+# (fake_exchange.py --check-prices exercises pooling, batching and single-flight).
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com").rstrip("/")
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", 5))  # seconds
+REQUEST_TIMEOUT = float(os.getenv("PRICE_REQUEST_TIMEOUT", 5))  # seconds
+QUOTE_ASSET = "USDT"
+
+_session = None
+_session_lock = threading.Lock()
+
+# symbol -> (price, fetched_at); guarded by _cache_lock together with _inflight
+_price_cache = {}
+# symbol -> Future shared by everyone asking for that symbol while it is being fetched
+_inflight = {}
+_cache_lock = threading.Lock()
+_cache_stats = {"stream": 0, "hits": 0, "misses": 0, "shared": 0, "requests": 0}
+
+def get_session():
+    """Shared keep-alive HTTP session (one TLS handshake per connection, not per price)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def _fetch_prices(symbols):
+    """
+    Fetches the USDT prices of several symbols in one request.
+
+    Returns:
+        A dict of symbol -> float for the symbols the exchange knows.
+    """
+    session = get_session()
+    pairs = {f"{symbol}{QUOTE_ASSET}": symbol for symbol in symbols}
+    url = f"{BINANCE_API_URL}/api/v3/ticker/price"
+    with _cache_lock:
+        _cache_stats["requests"] += 1
+
+    if len(pairs) == 1:
+        response = session.get(url, params={"symbol": next(iter(pairs))}, timeout=REQUEST_TIMEOUT)
+        data = [response.json()] if response.status_code == 200 else []
+    else:
+        response = session.get(url, params={"symbols": json.dumps(list(pairs), separators=(",", ":"))},
+                               timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            data = response.json()
+        else:
+            # One unknown symbol fails the whole batch; fall back to one request per symbol
+            prices = {}
+            for symbol in symbols:
+                try:
+                    prices.update(_fetch_prices([symbol]))
+                except Exception as e:
+                    print(f"Error fetching price of {symbol}: {e}")  # only this symbol is missing
+            return prices
+
+    return {pairs[item["symbol"]]: float(item["price"]) for item in data if item.get("symbol") in pairs}
+
+def get_crypto_prices(symbols):
+    """
+    Returns the latest USDT prices for several symbols.
+
+    When the streaming ticker feed is enabled, its in-memory snapshot is
+    read first (no network I/O). Fresh cached prices are returned directly; the remaining symbols are
+    fetched in one batched request. Concurrent callers asking for a symbol
+    that is already being fetched wait for that request instead of sending
+    their own (single-flight).
+
+    Returns:
+        A dict of symbol -> float, or None for symbols that could not be fetched.
+    """
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    now = time.monotonic()
+    prices, owned, waiting = {}, {}, {}
+
+    ticker_feed.ensure_started()
+    with _cache_lock:
+        for symbol in symbols:
+            if symbol == QUOTE_ASSET:
+                prices[symbol] = 1.0  # prices are quoted in it; there is no USDTUSDT pair
+                continue
+            streamed = ticker_feed.get_snapshot_price(symbol)
+            if streamed is not None:
+                prices[symbol] = streamed
+                _cache_stats["stream"] += 1
+                continue
+            cached = _price_cache.get(symbol)
+            if cached and now - cached[1] < PRICE_CACHE_TTL:
+                prices[symbol] = cached[0]
+                _cache_stats["hits"] += 1
+            elif symbol in _inflight:
+                waiting[symbol] = _inflight[symbol]
+                _cache_stats["shared"] += 1
+            else:
+                owned[symbol] = _inflight[symbol] = Future()
+                _cache_stats["misses"] += 1
+
+    if owned:
+        try:
+            fetched = _fetch_prices(list(owned))
+        except Exception:
+            fetched = {}
+        fetched_at = time.monotonic()
+        with _cache_lock:
+            for symbol, future in owned.items():
+                if symbol in fetched:
+                    _price_cache[symbol] = (fetched[symbol], fetched_at)
+                _inflight.pop(symbol, None)
+                future.set_result(fetched.get(symbol))
+        for symbol in owned:
+            prices[symbol] = fetched.get(symbol)
+
+    for symbol, future in waiting.items():
+        try:
+            prices[symbol] = future.result(timeout=REQUEST_TIMEOUT * 2)
+        except Exception:
+            prices[symbol] = None
+
+    return {symbol: prices.get(symbol) for symbol in symbols}
 
 def get_crypto_price(symbol):
+    # استفاده از API رایگان برای گرفتن قیمت لحظه‌ای
+    price = get_crypto_prices([symbol]).get(symbol.upper())
+    # تبدیل به float و گرد کردن برای خوانایی بهتر
+    return round(price, 2) if price is not None else None
+
+def get_price_cache_stats():
+    """Returns cache hit/miss counters and the hit rate."""
+    with _cache_lock:
+        stats = dict(_cache_stats)
+    lookups = stats["stream"] + stats["hits"] + stats["misses"] + stats["shared"]
+    stats["hit_rate"] = (stats["stream"] + stats["hits"] + stats["shared"]) / lookups if lookups else 0.0
+    return stats
+
+def format_price_cache_stats():
+    """One-line summary for the admin dashboard."""
+    stats = get_price_cache_stats()
+    return (f"💹 **قیمت‌ها:** فید {stats['stream']} | کش {stats['hits']} | مشترک {stats['shared']} | "
+            f"دریافت {stats['misses']} نماد در {stats['requests']} درخواست | نرخ استفاده مجدد {stats['hit_rate']:.0%}")
+
+# --- Technical Analysis ---
+
+INTERVAL_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+KLINE_HISTORY = 200
+
+_engines = {}  # interval -> IndicatorEngine
+_engines_lock = threading.Lock()
+
+def get_klines(symbol, interval="1h", limit=KLINE_HISTORY, start_time=None):
+    """
+    Fetches closed OHLCV candles (oldest first) from the exchange.
+
+    Returns:
+        A tuple (open_times, candles) where candles has columns open, high, low, close, volume.
+    """
+    params = {"symbol": f"{symbol.upper()}{QUOTE_ASSET}", "interval": interval, "limit": limit}
+    if start_time is not None:
+        params["startTime"] = start_time
+    response = get_session().get(f"{BINANCE_API_URL}/api/v3/klines", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    now_ms = int(time.time() * 1000)
+    # Each row: [open time, open, high, low, close, volume, close time, ...]; drop the candle still forming
+    rows = [row for row in response.json() if row[6] < now_ms]
+    return [row[0] for row in rows], [[float(v) for v in row[1:6]] for row in rows]
+
+def _get_engine(interval):
+    from services.indicators import IndicatorEngine  # NumPy is loaded on first analysis
+
+    with _engines_lock:
+        if interval not in _engines:
+            _engines[interval] = IndicatorEngine(capacity=KLINE_HISTORY)
+        return _engines[interval]
+
+def refresh_indicators(symbol, interval="1h"):
+    """
+    Brings a symbol's indicators up to date: a full history on first use,
+    afterwards only the candles closed since the last update.
+    """
+    engine = _get_engine(interval)
+    symbol = symbol.upper()
+    with engine.lock:
+        last_open = int(engine.times[engine.symbols[symbol]]) if symbol in engine.symbols else None
+        if last_open is not None and time.time() * 1000 < last_open + 2 * INTERVAL_MS[interval]:
+            return engine.snapshot(symbol)
+
+    # The engine (and its lock) is shared by every symbol of the interval, so
+    # the exchange request runs unlocked; a slow one only delays this symbol
+    if last_open is None:
+        times, candles = get_klines(symbol, interval)
+    else:
+        times, candles = get_klines(symbol, interval, start_time=last_open + 1)
+
+    with engine.lock:
+        if symbol in engine.symbols:
+            # A concurrent refresh of the same symbol may have appended some of these already
+            newest = int(engine.times[engine.symbols[symbol]])
+            fresh = [i for i, open_time in enumerate(times) if open_time > newest]
+            times, candles = [times[i] for i in fresh], [candles[i] for i in fresh]
+        if candles:
+            engine.load(symbol, candles, times)
+        return engine.snapshot(symbol)
+
+def _fmt(value):
+    return f"{value:,.2f}" if value is not None else "—"
+
+def get_technical_analysis(symbol: str, interval: str = "1h") -> str:
+    """
+    Technical analysis (SMA, EMA, RSI, MACD, Bollinger Bands, ATR) for a crypto symbol.
+
+    Args:
+        symbol: Ticker such as BTC or ETH.
+        interval: Candle interval: 1m, 5m, 15m, 1h, 4h or 1d.
+    """
+    if interval not in INTERVAL_MS:
+        interval = "1h"
     try:
-        # استفاده از API رایگان برای گرفتن قیمت لحظه‌ای
-        url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol.upper()}USDT"
-        response = requests.get(url)
-        data = response.json()
-        # تبدیل به float و گرد کردن برای خوانایی بهتر
-        return round(float(data['price']), 2)
-    except Exception:
-        return None
-
-def handle_trader_request(text):
-    if "قیمت" in text:
-        if "بیت" in text or "btc" in text.lower():
-            price = get_crypto_price("BTC")
-            return f"📈 قیمت لحظه‌ای بیت‌کوین: ${price:,}" if price else "خطا در دریافت قیمت BTC."
-        
-        if "اتریوم" in text or "eth" in text.lower():
-            price = get_crypto_price("ETH")
-            return f"💎 قیمت لحظه‌ای اتریوم: ${price:,}" if price else "خطا در دریافت قیمت ETH."
+        values = refresh_indicators(symbol, interval)
+    except Exception as e:
+        return f"خطا در دریافت کندل‌های {symbol.upper()}: {e}"
+    if not values:
+        return f"داده‌ای برای {symbol.upper()} پیدا نشد."
+
+    rsi = values["rsi"]
+    if rsi is None:
+        rsi_note = ""
+    elif rsi >= 70:
+        rsi_note = " (اشباع خرید)"
+    elif rsi <= 30:
+        rsi_note = " (اشباع فروش)"
+    else:
+        rsi_note = " (خنثی)"
+    trend = ""
+    if values["macd_hist"] is not None:
+        trend = "صعودی 🟢" if values["macd_hist"] > 0 else "نزولی 🔴"
+
+    return (
+        f"📊 **تحلیل تکنیکال {symbol.upper()}/{QUOTE_ASSET} ({interval}):**\n"
+        f"💵 آخرین قیمت بسته‌شدن: ${_fmt(values['close'])}\n"
+        f"📈 SMA20: {_fmt(values['sma'])} | EMA20: {_fmt(values['ema'])}\n"
+        f"⚡ RSI14: {_fmt(rsi)}{rsi_note}\n"
+        f"📉 MACD: {_fmt(values['macd'])} | سیگنال: {_fmt(values['macd_signal'])} | هیستوگرام: {_fmt(values['macd_hist'])} {trend}\n"
+        f"🎯 باند بولینگر: {_fmt(values['bb_lower'])} / {_fmt(values['bb_middle'])} / {_fmt(values['bb_upper'])}\n"
+        f"🌊 ATR14: {_fmt(values['atr'])}"
+    )
+
+# --- History and Backtesting ---
+
+KLINE_BATCH = 1000          # exchange maximum per klines request
+MAX_INGEST_BATCHES = int(os.getenv("MAX_INGEST_BATCHES", 20))  # per call, to bound tool latency
+DEFAULT_FAST_WINDOWS = (5, 10, 20, 50)
+DEFAULT_SLOW_WINDOWS = (20, 50, 100, 200)
+
+def ingest_klines(symbol, interval="1h", since_ms=None, max_batches=MAX_INGEST_BATCHES):
+    """
+    Appends closed candles newer than the stored ones to the candle store.
+
+    Args:
+        since_ms: Where to start when nothing is stored yet (default: one year back).
+
+    Returns:
+        The number of candles written.
+    """
+    from services.candle_store import get_candle_store
+
+    store = get_candle_store()
+    last = store.last_time(symbol, interval)
+    start = last + 1 if last is not None else (since_ms or int(time.time() * 1000) - 365 * 86_400_000)
+    written = 0
+    for _ in range(max_batches):
+        times, candles = get_klines(symbol, interval, limit=KLINE_BATCH, start_time=start)
+        if not times:
+            break
+        written += store.append(symbol, interval, times, candles)
+        start = times[-1] + 1
+        if len(times) < KLINE_BATCH:
+            break
+    return written
+
+def backtest_ma_crossover(symbol: str, interval: str = "1h", years: float = 1.0) -> str:
+    """
+    Backtests moving-average crossover strategies on stored history and summarizes the best ones.
+
+    Args:
+        symbol: Ticker such as BTC or ETH.
+        interval: Candle interval: 1m, 5m, 15m, 1h, 4h or 1d.
+        years: How much history to evaluate.
+    """
+    from services.candle_store import get_candle_store
+    from services.backtest import ma_crossover_grid, buy_and_hold
+
+    if interval not in INTERVAL_MS:
+        interval = "1h"
+    symbol = symbol.upper()
+    start_ms = int(time.time() * 1000 - years * 365 * 86_400_000)
+    try:
+        ingest_klines(symbol, interval, since_ms=start_ms)
+    except Exception as e:
+        print(f"Error ingesting {symbol} {interval}: {e}")
+
+    close = get_candle_store().read(symbol, interval, fields=("close",), start_time=start_ms)["close"]
+    periods_per_year = 365 * 86_400_000 / INTERVAL_MS[interval]
+    results = ma_crossover_grid(close, DEFAULT_FAST_WINDOWS, DEFAULT_SLOW_WINDOWS,
+                                periods_per_year=periods_per_year)
+    if not results:
+        return f"❌ تاریخچه کافی برای بک‌تست {symbol} ({interval}) موجود نیست."
+
+    lines = [f"🧪 **بک‌تست تقاطع میانگین متحرک {symbol}/{QUOTE_ASSET} ({interval}، {len(close):,} کندل):**"]
+    for r in results[:3]:
+        lines.append(
+            f"🔹 MA{r['fast']}/MA{r['slow']}: بازده {r['total_return']:+.1%} | شارپ {r['sharpe']:.2f} | "
+            f"افت سرمایه {r['max_drawdown']:.1%} | {r['trades']} معامله"
+        )
+    hold = buy_and_hold(close, periods_per_year)
+    if hold:
+        lines.append(f"📦 خرید و نگهداری: بازده {hold['total_return']:+.1%} | شارپ {hold['sharpe']:.2f} | افت سرمایه {hold['max_drawdown']:.1%}")
+    lines.append("⚠️ نتایج گذشته تضمینی برای آینده نیست.")
+    return "\n".join(lines)
+
+ANALYSIS_KEYWORDS = ("تحلیل", "تکنیکال", "اندیکاتور", "rsi", "macd", "بولینگر")
+PRICE_KEYWORDS = ("قیمت", "price", "چنده", "چند است")
+MAX_SYMBOLS_PER_REQUEST = 10
+
+def _fmt_price(price):
+    """Two decimals for normal prices, significant digits for sub-dollar coins."""
+    if price >= 1:
+        return f"{price:,.2f}"
+    return f"{price:.8f}".rstrip("0").rstrip(".")
+
+def handle_trader_request(text: str) -> str:
+    """Answers trading questions, e.g. live crypto prices and technical analysis."""
+    from services.symbols import find_symbols, get_symbol_name
+
+    symbols = find_symbols(text)[:MAX_SYMBOLS_PER_REQUEST]
+    lowered = text.lower()
+
+    if symbols and any(word in lowered for word in ANALYSIS_KEYWORDS):
+        return "\n\n".join(get_technical_analysis(symbol) for symbol in symbols)
+
+    if symbols and any(word in lowered for word in PRICE_KEYWORDS):
+        prices = get_crypto_prices(symbols)
+        lines = []
+        for symbol in symbols:
+            price = prices.get(symbol)
+            if price is None:
+                lines.append(f"خطا در دریافت قیمت {symbol}.")
+            else:
+                lines.append(f"📈 قیمت لحظه‌ای {get_symbol_name(symbol)} ({symbol}): ${_fmt_price(price)}")
+        return "\n".join(lines)
 
     return "📊 برای تحلیل دقیق‌تر، لطفاً جفت ارز مورد نظر را اعلام کنید. من می‌توانم قیمت‌های لحظه‌ای را از صرافی‌های جهانی استخراج کنم."
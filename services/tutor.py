@@ -1,2 +1,3 @@
-def handle_tutor_request(text):
+def handle_tutor_request(text: str) -> str:
+    """Explains an educational topic (math, physics, programming, languages) simply."""
     return f"📚 در حال بررسی موضوع آموزشی شما: '{text}'. من می‌توانم مفاهیم را به زبان ساده برایت توضیح دهم."
@@ -1,59 +1,302 @@
 # services/voice.py
 import os
-from gtts import gTTS
-from pydub import AudioSegment
+import io
+import re
+import hashlib
+import threading
+import subprocess
+from collections import OrderedDict
+from services.text import normalize_fa
+from services.media_engine import get_ffmpeg_exe
 
 # Path to save audio files
 AUDIO_PATH = "/home/ubuntu/my-ai-bot/audio_responses"
+TTS_CACHE_BUDGET_MB = float(os.getenv("TTS_CACHE_BUDGET_MB", 500))
+
+# gTTS has a single Persian voice; the profiles differ by a pitch shift
+# applied with ffmpeg. Bump PROFILE_VERSION after changing a
+# profile so old cache entries are not served for it.
+PROFILE_VERSION = 2
+VOICE_PROFILES = {
+    "female": {"lang": "fa", "tld": "com", "semitones": 0},
+    "male": {"lang": "fa", "tld": "com", "semitones": -4},
+}
+DEFAULT_VOICE = "male"
+VOICE_OFF = "off"
+# ffmpeg output arguments per codec; "ogg" is Opus, what Telegram plays as a voice note
+CODECS = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"],
+    "ogg": ["-c:a", "libopus", "-b:a", "32k", "-application", "voip", "-f", "ogg"],
+}
+GTTS_SAMPLE_RATE = 24000
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", 4))
+MAX_CHUNK_CHARS = 300
+MIN_CHUNK_CHARS = 60
 
 def setup_audio_folder():
     """Ensures the audio folder exists."""
     if not os.path.exists(AUDIO_PATH):
         os.makedirs(AUDIO_PATH)
 
-def text_to_voice(text: str, user_id: int, voice_gender: str = "male") -> str:
+# --- Content-Addressed Audio Cache ---
+
+class AudioCache:
+    """
+    Synthesized audio stored as <sha256>.<codec> files with LRU eviction
+    against a disk budget. Recency survives restarts through file mtimes.
+    """
+
+    def __init__(self, root=AUDIO_PATH, budget_bytes=TTS_CACHE_BUDGET_MB * 1024 * 1024):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+        self.entries = None  # file name -> size, least recently used first
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _load(self):
+        """Indexes the existing files once, oldest access first."""
+        if self.entries is not None:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        files.sort()
+        self.entries = OrderedDict((name, size) for _, name, size in files)
+        self.total_bytes = sum(self.entries.values())
+
+    @staticmethod
+    def key(text, voice, codec):
+        payload = f"{PROFILE_VERSION}\0{normalize_fa(text)}\0{voice}\0{codec}"
+        return f"{hashlib.sha256(payload.encode('utf-8')).hexdigest()}.{codec}"
+
+    def get(self, name):
+        """Path of a cached file (marked as recently used), or None."""
+        with self.lock:
+            self._load()
+            if name not in self.entries:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(name)
+            self.stats["hits"] += 1
+        path = os.path.join(self.root, name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.total_bytes -= self.entries.pop(name, 0)
+            return None
+        return path
+
+    def put(self, name, data):
+        """Stores audio bytes (atomic rename), evicts the LRU files over budget and returns the path."""
+        path = os.path.join(self.root, name)
+        tmp_path = f"{path}.{os.urandom(4).hex()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self._load()
+            self.total_bytes += len(data) - self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            while self.total_bytes > self.budget_bytes and len(self.entries) > 1:
+                old_name, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                self.stats["evictions"] += 1
+                try:
+                    os.remove(os.path.join(self.root, old_name))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def get_stats(self):
+        with self.lock:
+            self._load()
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, files=len(self.entries), bytes=self.total_bytes,
+                        budget_bytes=int(self.budget_bytes),
+                        hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
+
+_cache = AudioCache()
+
+def get_tts_cache_stats():
+    """Returns hit/miss/eviction counters and the cache size."""
+    return _cache.get_stats()
+
+def format_tts_cache_stats():
+    """One-line summary for the admin dashboard."""
+    stats = get_tts_cache_stats()
+    return (f"🔊 **کش صدا:** {stats['files']} فایل، {stats['bytes'] / 1024 / 1024:.1f}/"
+            f"{stats['budget_bytes'] / 1024 / 1024:.0f} MB | اصابت {stats['hit_rate']:.0%} "
+            f"({stats['hits']}/{stats['hits'] + stats['misses']}) | حذف {stats['evictions']}")
+
+# --- Synthesis ---
+
+def _synthesize(text, profile):
+    """MP3 bytes from gTTS for one voice profile (before any pitch shift)."""
+    from gtts import gTTS  # heavy import, deferred to first synthesis
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=profile["lang"], tld=profile["tld"]).write_to_fp(buffer)
+    return buffer.getvalue()
+
+def _transform(mp3_bytes, semitones, codec):
     """
-    Converts text to an MP3 file using gTTS and returns the file path.
-    
+    Applies the pitch shift and encodes to `codec` through an in-memory
+    ffmpeg pipe (stdin -> stdout, no temporary files).
+    """
+    command = [get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-f", "mp3", "-i", "pipe:0"]
+    if semitones:
+        factor = 2 ** (semitones / 12)
+        # asetrate shifts pitch and speed together; atempo restores the original speed
+        command += ["-af", f"asetrate={GTTS_SAMPLE_RATE * factor:.0f},aresample={GTTS_SAMPLE_RATE},"
+                           f"atempo={1 / factor:.4f}"]
+    command += CODECS[codec] + ["pipe:1"]
+    result = subprocess.run(command, input=mp3_bytes, capture_output=True, timeout=60)
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(result.stderr.decode("utf-8", "replace").strip() or "ffmpeg produced no audio")
+    return result.stdout
+
+def text_to_voice(text: str, user_id: int, voice_gender: str = DEFAULT_VOICE, codec: str = "mp3") -> str:
+    """
+    Converts text to speech and returns the path of the audio file.
+
+    Identical (normalized) text with the same voice and codec is synthesized
+    once and then served from the cache.
+
     Args:
         text: The text to convert.
         user_id: The ID of the user requesting the voice response.
-        voice_gender: 'male' or 'female' (simulated by different gTTS settings).
-        
+        voice_gender: 'male' or 'female' (see VOICE_PROFILES).
+        codec: 'mp3' or 'ogg' (Opus, for Telegram voice notes).
+
     Returns:
-        The path to the generated MP3 file.
-    """
-    setup_audio_folder()
-    
-    # gTTS does not directly support gender, but we can simulate it with different tld/lang settings
-    # This is a simplification for the sandbox environment.
-    if voice_gender == "female":
-        lang = 'fa'
-        tld = 'com'
-    else: # Default to male
-        lang = 'fa'
-        tld = 'com' # Use a consistent tld for Farsi
-        
+        The path to the audio file, or None on failure.
+    """
+    voice = voice_gender if voice_gender in VOICE_PROFILES else DEFAULT_VOICE
+    codec = codec if codec in CODECS else "mp3"
+    name = AudioCache.key(text, voice, codec)
+    cached = _cache.get(name)
+    if cached:
+        return cached
+
+    profile = VOICE_PROFILES[voice]
     try:
-        tts = gTTS(text=text, lang=lang, tld=tld)
-        
-        # Save as MP3
-        output_mp3 = os.path.join(AUDIO_PATH, f"voice_{user_id}_{os.urandom(4).hex()}.mp3")
-        tts.save(output_mp3)
-        
-        # Optional: Convert to OGG/Opus for better Telegram compatibility (requires ffmpeg, which is usually available)
-        # We skip this for simplicity in the sandbox, assuming MP3 is sufficient.
-        
-        return output_mp3
+        audio = _synthesize(text, profile)
+        if profile["semitones"] or codec != "mp3":
+            try:
+                audio = _transform(audio, profile["semitones"], codec)
+            except Exception as e:
+                # Without ffmpeg only the plain gTTS voice as MP3 can be produced;
+                # cache it under the key it really has
+                print(f"Error transforming voice audio: {e}")
+                plain = [v for v, p in VOICE_PROFILES.items() if not p["semitones"]]
+                voice, codec = (plain[0] if plain else voice), "mp3"
+                name = AudioCache.key(text, voice, codec)
+        return _cache.put(name, audio)
     except Exception as e:
         print(f"Error in text_to_voice: {e}")
         return None
 
+# --- Sentence-Chunked Synthesis ---
+
+_SENTENCE_END = re.compile(r"(?<=[.!?؟؛…])\s+|\n+")
+_MARKUP = re.compile(r"[*_`#>|~\[\]]+")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+    return _executor
+
+def split_sentences(text, max_chars=MAX_CHUNK_CHARS):
+    """
+    Splits text at Persian/English sentence boundaries into chunks of at most
+    `max_chars`, merging very short sentences and cutting long ones at spaces.
+    Markdown markup is dropped so it is not read aloud.
+    """
+    chunks, current = [], ""
+    for sentence in _SENTENCE_END.split(_MARKUP.sub(" ", text)):
+        sentence = " ".join(sentence.split())
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].strip()
+        if not sentence:
+            continue
+        # The first sentence goes alone so the first voice note is ready soonest;
+        # later ones are merged only while too short to be worth a request
+        if current and (not chunks or len(current) >= MIN_CHUNK_CHARS
+                        or len(current) + 1 + len(sentence) > max_chars):
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+def iter_voice_chunks(text, user_id, voice_gender=DEFAULT_VOICE, codec="ogg"):
+    """
+    Synthesizes the sentences of `text` concurrently (TTS_WORKERS at a time)
+    and yields their audio paths in order, so the first one is ready after a
+    single sentence instead of the whole answer. Failed chunks are skipped.
+    """
+    executor = _get_executor()
+    futures = [executor.submit(text_to_voice, chunk, user_id, voice_gender, codec)
+               for chunk in split_sentences(text)]
+    try:
+        for future in futures:
+            path = future.result()
+            if path:
+                yield path
+    finally:
+        for future in futures:
+            future.cancel()
+
+def send_voice_reply(bot, chat_id, text, voice_gender=DEFAULT_VOICE):
+    """Sends `text` as successive voice notes, each as soon as it is synthesized."""
+    try:
+        for path in iter_voice_chunks(text, chat_id, voice_gender):
+            with open(path, 'rb') as audio:
+                if path.endswith(".ogg"):
+                    bot.send_voice(chat_id, audio)
+                else:
+                    bot.send_audio(chat_id, audio)
+    except Exception as e:
+        print(f"Error sending voice reply: {e}")
+
+# --- Voice Preferences ---
+
+def get_voice_preference(user_id):
+    """The user's saved voice ('male', 'female' or 'off'), or None if never set."""
+    from services.admin import load_user_data
+
+    return load_user_data().get(str(user_id), {}).get("voice")
+
 def handle_voice_settings(user_id, setting):
-    """Simulates setting the user's preferred voice gender."""
-    # In a real app, this would update the user's profile in user_data.json
-    
-    if setting in ["male", "female"]:
-        return f"✅ صدای دستیار شما به حالت **{setting}** تنظیم شد."
-    else:
+    """Saves the user's preferred voice gender in user_data.json."""
+    from services.admin import load_user_data, save_user_data
+
+    if setting not in VOICE_PROFILES and setting != VOICE_OFF:
         return "❌ تنظیمات صدای نامعتبر."
+    data = load_user_data()
+    data.setdefault(str(user_id), {})["voice"] = setting
+    if not save_user_data(data):
+        return "❌ ذخیره تنظیمات صدا ناموفق بود."
+    if setting == VOICE_OFF:
+        return "🔇 پاسخ صوتی خاموش شد."
+    return f"✅ صدای دستیار شما به حالت **{setting}** تنظیم شد."
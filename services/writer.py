@@ -1,4 +1,5 @@
-def handle_writing_request(text):
+def handle_writing_request(text: str) -> str:
+    """Drafts texts: formal letters/emails, social media captions, articles."""
     text_lower = text.lower()
     
     # تشخیص سبک نگارش بر اساس کلمات کلیدی
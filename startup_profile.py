@@ -0,0 +1,133 @@
+"""
+Startup profiling for cold starts.
+
+    python startup_profile.py                  # import-time breakdown + cold-start check
+    python startup_profile.py --module bot     # profile another entry module
+    python startup_profile.py --skip-server    # import-time report only
+
+The import report is the `python -X importtime` output, sorted by cumulative
+time. The cold-start check launches app.py on a free port and measures the
+time until /health first answers 200; the exit code is 1 when that exceeds
+COLD_START_BUDGET_MS.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import urllib.request
+
+COLD_START_BUDGET_MS = int(os.getenv("COLD_START_BUDGET_MS", 1500))
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ----------------------------------------------------------------------
+# 1. Import-time breakdown
+# ----------------------------------------------------------------------
+
+def importtime_report(module="app"):
+    """
+    Imports `module` in a fresh interpreter under -X importtime.
+
+    Returns:
+        A list of (cumulative_us, self_us, module_name) sorted slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR, capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+        except ValueError:
+            continue
+    if result.returncode != 0:
+        print(f"⚠️ import {module} failed:\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+    rows.sort(reverse=True)
+    return rows
+
+def format_importtime_report(rows, top=25):
+    """Formats the slowest imports (nesting is kept from the importtime tree)."""
+    total_us = max((row[0] for row in rows if not row[2].startswith("  ")), default=0)
+    lines = [f"📦 Import time (top {top}, total ≈ {total_us / 1000:.1f} ms)",
+             f"{'cumulative ms':>14} {'self ms':>9}  module"]
+    for cumulative_us, self_us, name in rows[:top]:
+        lines.append(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name.strip()}")
+    return "\n".join(lines)
+
+# ----------------------------------------------------------------------
+# 2. Cold start to the first 200 on /health
+# ----------------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_cold_start(timeout=30.0):
+    """
+    Starts app.py in a new process and polls /health.
+
+    Returns:
+        Milliseconds from process launch to the first 200, or None on timeout.
+    """
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port))
+    url = f"http://127.0.0.1:{port}/health"
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=PROJECT_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                return None
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.02)
+        return None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+# ----------------------------------------------------------------------
+# 3. Entry Point
+# ----------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile Super-Agent cold starts.")
+    parser.add_argument("--module", default="app", help="module to import-profile (default: app)")
+    parser.add_argument("--top", type=int, default=25, help="number of imports to list")
+    parser.add_argument("--budget-ms", type=int, default=COLD_START_BUDGET_MS,
+                        help="cold-start budget for the first 200 on /health")
+    parser.add_argument("--skip-server", action="store_true", help="only print the import report")
+    args = parser.parse_args(argv)
+
+    print(format_importtime_report(importtime_report(args.module), args.top))
+
+    if args.skip_server:
+        return 0
+
+    cold_start_ms = measure_cold_start()
+    if cold_start_ms is None:
+        print("\n❌ /health did not answer 200 (server failed to start or timed out).")
+        return 1
+
+    verdict = "✅ within" if cold_start_ms <= args.budget_ms else "❌ over"
+    print(f"\n⏱️ Cold start to first 200 on /health: {cold_start_ms:.0f} ms "
+          f"({verdict} budget of {args.budget_ms} ms)")
+    return 0 if cold_start_ms <= args.budget_ms else 1
+
+if __name__ == "__main__":
+    sys.exit(main())